@@ -0,0 +1,266 @@
+import argparse
+import os
+import re
+import sqlite3
+import threading
+import time
+import numpy as np
+import pandas as pd
+from data_loader import CACHE_DIR, DEFAULT_BATCH_SIZE, iter_financial_batches
+
+STORE_PATH = os.getenv("FINSAFE_STORE", os.path.join(CACHE_DIR, "transactions.sqlite"))
+
+# Candidate column names for the real dataset and the synthetic (PaySim-style) schema
+ID_CANDIDATES = ['transaction_id']
+SENDER_CANDIDATES = ['sender_account', 'nameOrig']
+RECEIVER_CANDIDATES = ['receiver_account', 'nameDest']
+MERCHANT_CANDIDATES = ['merchant_category']
+TIME_CANDIDATES = ['timestamp', 'step']
+CACHE_MB = 256
+# Primary key for data without a transaction ID: a hash of the row's stored values
+ROW_KEY = 'row_key'
+ROLES = {'id': ID_CANDIDATES, 'sender': SENDER_CANDIDATES, 'receiver': RECEIVER_CANDIDATES,
+         'merchant': MERCHANT_CANDIDATES, 'time': TIME_CANDIDATES}
+
+def store_path(source=None):
+    """
+    Store file for a data source. Sources with different schemas need their own file,
+    since a store keeps the columns of the first batch it was given.
+    """
+    if source is None:
+        return STORE_PATH
+    base, ext = os.path.splitext(STORE_PATH)
+    return f"{base}-{re.sub(r'[^A-Za-z0-9_.-]+', '_', source)}{ext}"
+
+def _quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+def _sql_type(dtype):
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+        return 'INTEGER'
+    if pd.api.types.is_float_dtype(dtype):
+        return 'REAL'
+    return 'TEXT'
+
+def _column_values(values):
+    """A column as a list of Python values with None for missing (what sqlite3 binds)."""
+    if pd.api.types.is_bool_dtype(values.dtype):
+        return values.astype('int8').tolist()
+    if pd.api.types.is_float_dtype(values.dtype):
+        array = values.to_numpy(dtype='float64', na_value=np.nan)
+        missing = np.isnan(array)
+        return np.where(missing, None, array).tolist() if missing.any() else array.tolist()
+    missing = values.isna()
+    if not missing.any():
+        return values.tolist()
+    return values.astype(object).where(~missing, None).tolist()
+
+class AccountStore:
+    """
+    Embedded, indexed copy of loaded transactions for investigator drill-down.
+
+    One SQLite table holds every column of the first batch appended. B-tree indexes on
+    (sender, time), (receiver, time) and (merchant, time) turn "last N transactions of
+    account X" and "merchant Y between two times" into index range scans, so both stay
+    in the milliseconds however many rows the table holds. The transaction ID (or, for
+    data without one, a hash of the row) is the primary key, so re-appending a batch
+    is a no-op.
+    The file is in WAL mode: the dashboard can query while the loader appends.
+    """
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        self.roles = {}
+        self.columns = []
+        self.types = {}
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # One connection shared across threads (Streamlit reruns); the lock serializes use
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # Index inserts land on random pages; a larger page cache keeps them off the disk
+        self._conn.execute(f"PRAGMA cache_size=-{CACHE_MB * 1024}")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS store_meta (role TEXT PRIMARY KEY, col TEXT)")
+        self._load_schema()
+
+    def _load_schema(self):
+        self.roles = dict(self._conn.execute("SELECT role, col FROM store_meta").fetchall())
+        info = self._conn.execute("PRAGMA table_info(transactions)").fetchall()
+        self.columns = [row[1] for row in info]
+        self.types = {row[1]: row[2] for row in info}
+
+    def _create(self, batch):
+        roles = {role: next((col for col in candidates if col in batch.columns), None)
+                 for role, candidates in ROLES.items()}
+        roles = {role: col for role, col in roles.items() if col is not None}
+        columns = []
+        for col, dtype in batch.dtypes.items():
+            key = " PRIMARY KEY" if col == roles.get('id') else ""
+            columns.append(f"{_quote(col)} {_sql_type(dtype)}{key}")
+        if 'id' not in roles:
+            roles['id'] = ROW_KEY
+            columns.append(f"{_quote(ROW_KEY)} INTEGER PRIMARY KEY")
+        with self._conn:
+            self._conn.execute(f"CREATE TABLE transactions ({', '.join(columns)})")
+            time_col = _quote(roles['time']) if 'time' in roles else None
+            for role in ('sender', 'receiver', 'merchant'):
+                if role in roles:
+                    keys = _quote(roles[role]) + (f", {time_col}" if time_col else "")
+                    self._conn.execute(f"CREATE INDEX idx_{role} ON transactions ({keys})")
+            self._conn.executemany("INSERT INTO store_meta VALUES (?, ?)", roles.items())
+        self._load_schema()
+
+    def _row_keys(self, batch):
+        """Hash of each row's values as the table stores them (stable across batch dtypes)."""
+        data = {}
+        for col in self.columns:
+            if col == ROW_KEY:
+                continue
+            values = batch[col] if col in batch.columns else pd.Series(None, index=batch.index, dtype=object)
+            kind = self.types.get(col)
+            if kind in ('INTEGER', 'REAL'):
+                values = pd.to_numeric(values, errors='coerce').astype('float64')
+            else:
+                values = values.astype(object).where(values.notna(), None).astype(str)
+            data[col] = values
+        return pd.util.hash_pandas_object(pd.DataFrame(data), index=False).to_numpy().view(np.int64)
+
+    def append(self, batch):
+        """
+        Appends one batch of raw transactions (pandas or Arrow). Columns the table does not
+        have are ignored and missing ones are stored as NULL; a batch with none of the
+        table's columns is skipped. Returns the rows inserted.
+        """
+        if not isinstance(batch, pd.DataFrame):
+            batch = batch.to_pandas()
+        if len(batch) == 0:
+            return 0
+        with self._lock:
+            if not self.columns:
+                self._create(batch)
+            columns = [col for col in self.columns if col in batch.columns]
+            if not columns:
+                print(f"Skipping batch: none of its columns are in the store {self.path} "
+                      f"(use a separate store per data source)")
+                return 0
+            values = [_column_values(batch[col]) for col in columns]
+            if self.roles.get('id') == ROW_KEY:
+                columns.append(ROW_KEY)
+                values.append(self._row_keys(batch).tolist())
+            rows = zip(*values)
+            placeholders = ", ".join("?" * len(columns))
+            verb = "INSERT OR IGNORE" if 'id' in self.roles else "INSERT"
+            with self._conn:
+                before = self._conn.total_changes
+                self._conn.executemany(f"{verb} INTO transactions ({', '.join(map(_quote, columns))}) "
+                                       f"VALUES ({placeholders})", rows)
+                return self._conn.total_changes - before
+
+    def ingest(self, batches):
+        """
+        Appends a stream of batches, printing progress. Returns the rows inserted.
+        """
+        inserted, seen, start = 0, 0, time.perf_counter()
+        for batch in batches:
+            inserted += self.append(batch)
+            seen += len(batch)
+            print(f"Stored {inserted:,} of {seen:,} rows ({seen / (time.perf_counter() - start):,.0f} rows/s)")
+        return inserted
+
+    def _query(self, sql, params):
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            names = [description[0] for description in cursor.description]
+            frame = pd.DataFrame(cursor.fetchall(), columns=names)
+        return frame.drop(columns=[ROW_KEY], errors='ignore')
+
+    def _require(self, role):
+        if role not in self.roles:
+            raise ValueError(f"The store has no {role} column (expected one of {ROLES[role]}).")
+        return _quote(self.roles[role])
+
+    def _order(self):
+        return f" ORDER BY {_quote(self.roles['time'])} DESC" if 'time' in self.roles else ""
+
+    def last_transactions(self, account, n=50, include_received=False):
+        """
+        The `n` most recent transactions sent by `account` (and received by it, with
+        `include_received`), newest first.
+        """
+        if not self.columns:
+            return pd.DataFrame()
+        sql = f"SELECT * FROM transactions WHERE {self._require('sender')} = ?{self._order()} LIMIT ?"
+        if not include_received or 'receiver' not in self.roles:
+            return self._query(sql, (account, n))
+        # Each side is its own index range scan; merge the two top-n lists
+        received = f"SELECT * FROM transactions WHERE {self._require('receiver')} = ?{self._order()} LIMIT ?"
+        frame = self._query(f"SELECT * FROM ({sql}) UNION ALL SELECT * FROM ({received})", (account, n, account, n))
+        if 'time' in self.roles:
+            frame = frame.sort_values(self.roles['time'], ascending=False, kind='stable')
+        return frame.head(n).reset_index(drop=True)
+
+    def merchant_transactions(self, merchant, start=None, end=None, limit=10000):
+        """
+        Transactions for merchant category `merchant` with start <= time < end (either bound
+        optional: ISO strings such as '2024-01-10' for timestamps, numbers for steps),
+        newest first, at most `limit` rows.
+        """
+        if not self.columns:
+            return pd.DataFrame()
+        sql = f"SELECT * FROM transactions WHERE {self._require('merchant')} = ?"
+        params = [merchant]
+        for bound, op in ((start, '>='), (end, '<')):
+            if bound is not None:
+                time_col = self._require('time')
+                # SQLite orders every number before every string, so match the column's type
+                numeric = self.types.get(self.roles['time']) in ('INTEGER', 'REAL')
+                sql += f" AND {time_col} {op} ?"
+                params.append(float(bound) if numeric else str(bound))
+        return self._query(sql + self._order() + " LIMIT ?", params + [limit])
+
+    def distinct(self, role):
+        """
+        Distinct values of an indexed role column (e.g. 'merchant'), in order. Hops from
+        each value to the next through the index, so the cost is per value, not per row.
+        """
+        if not self.columns or role not in self.roles:
+            return []
+        col = _quote(self.roles[role])
+        sql = (f"WITH RECURSIVE hop(value) AS (SELECT MIN({col}) FROM transactions UNION ALL "
+               f"SELECT (SELECT MIN({col}) FROM transactions WHERE {col} > value) FROM hop WHERE value IS NOT NULL) "
+               f"SELECT value FROM hop WHERE value IS NOT NULL")
+        with self._lock:
+            return [row[0] for row in self._conn.execute(sql)]
+
+    def count(self):
+        if not self.columns:
+            return 0
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load transactions into the drill-down store or query it")
+    parser.add_argument("--source", type=str, default=None, help="Parquet/CSV file to load (default: the Hub dataset)")
+    parser.add_argument("--limit", type=int, default=None, help="Rows to load")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Rows per insert batch")
+    parser.add_argument("--store", type=str, default=STORE_PATH, help="SQLite file")
+    parser.add_argument("--account", type=str, default=None, help="Show this account's last transactions instead of loading")
+    parser.add_argument("--merchant", type=str, default=None, help="Show this merchant category's transactions instead of loading")
+    parser.add_argument("-n", type=int, default=20, help="Rows to show")
+    args = parser.parse_args()
+
+    store = AccountStore(args.store)
+    if args.account or args.merchant:
+        start = time.perf_counter()
+        result = store.last_transactions(args.account, args.n) if args.account \
+            else store.merchant_transactions(args.merchant, limit=args.n)
+        print(result.to_string())
+        print(f"{len(result)} rows in {(time.perf_counter() - start) * 1000:.1f} ms ({store.count():,} rows stored)")
+    else:
+        store.ingest(iter_financial_batches(batch_size=args.batch_size, limit=args.limit, source_path=args.source))
@@ -0,0 +1,118 @@
+import pandas as pd
+import numpy as np
+from risk_rules import RiskRules
+
+# Cube dimensions (same as the ffinance.sql breakdowns) and the source columns
+# they are read from, in order of preference (real schema first, synthetic second)
+DIMENSIONS = {
+    'merchant_category': ['merchant_category'],
+    'transaction_type': ['transaction_type', 'type'],
+    'sender_persona': ['sender_persona'],
+    'is_night_txn': ['is_night_txn'],
+    'is_salary_week': ['is_salary_week'],
+    'risk_segment': [],
+}
+FRAUD_CANDIDATES = ['is_fraud', 'isFraud']
+AMOUNT_CANDIDATES = ['amount_ngn', 'amount']
+MEASURES = ['txn_count', 'fraud_count', 'amount_sum']
+MISSING = 'N/A'
+
+class AggregateCube:
+    """
+    Pre-aggregated transaction counts, fraud counts and volume for every
+    combination of the dashboard dimensions. Built incrementally from batches;
+    its size depends on dimension cardinality, not on the number of rows,
+    so queries stay fast however many transactions were loaded.
+    """
+    def __init__(self, rules=None):
+        self.rules = rules or RiskRules()
+        self.cube = pd.DataFrame(columns=list(DIMENSIONS) + MEASURES)
+        self.rows = 0
+
+    def _dimension_frame(self, batch):
+        dims = {}
+        for dim, candidates in DIMENSIONS.items():
+            if dim == 'risk_segment':
+                if any(col in batch.columns for col in self.rules.columns):
+                    dims[dim] = np.asarray(self.rules.assign(batch), dtype=object)
+                else:
+                    dims[dim] = MISSING
+                continue
+            col = next((c for c in candidates if c in batch.columns), None)
+            dims[dim] = batch[col].astype(str).to_numpy() if col else MISSING
+        return pd.DataFrame(dims, index=batch.index)
+
+    def update(self, batch):
+        """
+        Folds one batch of raw transactions into the cube.
+        """
+        if len(batch) == 0:
+            return self
+        fraud_col = next((c for c in FRAUD_CANDIDATES if c in batch.columns), None)
+        amount_col = next((c for c in AMOUNT_CANDIDATES if c in batch.columns), None)
+
+        frame = self._dimension_frame(batch)
+        frame['txn_count'] = 1
+        frame['fraud_count'] = batch[fraud_col].astype(int).to_numpy() if fraud_col else 0
+        frame['amount_sum'] = pd.to_numeric(batch[amount_col], errors='coerce').fillna(0).to_numpy() if amount_col else 0.0
+        partial = frame.groupby(list(DIMENSIONS), sort=False)[MEASURES].sum().reset_index()
+
+        combined = pd.concat([self.cube, partial], ignore_index=True) if len(self.cube) else partial
+        self.cube = combined.groupby(list(DIMENSIONS), sort=False)[MEASURES].sum().reset_index()
+        self.rows += len(batch)
+        return self
+
+    def query(self, by=None, filters=None):
+        """
+        Rolls the cube up to the `by` dimensions, optionally filtered with
+        {dimension: value or list of values}. Adds a fraud_rate_pct column.
+        """
+        cube = self.cube
+        for dim, value in (filters or {}).items():
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            cube = cube[cube[dim].isin([str(v) for v in values])]
+        if by:
+            result = cube.groupby(list(by), sort=True)[MEASURES].sum().reset_index()
+        else:
+            result = cube[MEASURES].sum().to_frame().T
+        result['fraud_rate_pct'] = np.where(result['txn_count'] > 0,
+                                            result['fraud_count'] * 100.0 / result['txn_count'].clip(lower=1), 0.0)
+        return result
+
+    def totals(self):
+        """
+        Overall transaction count, fraud count, fraud rate and volume.
+        """
+        return self.query().iloc[0].to_dict()
+
+    def available(self, dim):
+        """
+        True if the dimension was present in the loaded data.
+        """
+        return bool(len(self.cube)) and (self.cube[dim] != MISSING).any()
+
+    def save(self, path):
+        self.cube.to_parquet(path, index=False)
+
+    @classmethod
+    def load(cls, path, rules=None):
+        cube = cls(rules)
+        cube.cube = pd.read_parquet(path)
+        cube.rows = int(cube.cube['txn_count'].sum())
+        return cube
+
+def build_cube(batches, rules=None):
+    """
+    Builds an AggregateCube from an iterable of DataFrame batches.
+    """
+    cube = AggregateCube(rules)
+    for batch in batches:
+        cube.update(batch)
+    return cube
+
+if __name__ == "__main__":
+    from data_loader import iter_financial_batches
+    cube = build_cube(iter_financial_batches(batch_size=50000, limit=200000, use_synthetic=True))
+    print(f"Cube cells: {len(cube.cube)} for {cube.rows:,} rows")
+    print(cube.totals())
+    print(cube.query(by=['transaction_type']))
@@ -0,0 +1,280 @@
+import argparse
+import os
+import sqlite3
+import time
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from risk_rules import RiskRules, SQL_PATH
+
+# ffinance.sql queries, in file order, each identified by a marker in its text
+QUERY_MARKERS = {
+    'fraud_distribution': 'GROUP BY is_fraud',
+    'risk_bucketing': 'risk_segment',
+    'merchant_risk': 'GROUP BY merchant_category',
+    'night_salary_trends': 'GROUP BY is_night_txn',
+    'persona_risk': 'GROUP BY sender_persona',
+}
+SCAN_BATCH_ROWS = 1000000
+# Low-cardinality text columns read dictionary-encoded: grouping on the small integer
+# codes is an order of magnitude faster than hashing every string
+CATEGORY_COLUMNS = ['merchant_category', 'sender_persona']
+
+def load_queries(sql_path=SQL_PATH):
+    """
+    Returns {name: statement} for the ffinance.sql queries, comment lines removed.
+    """
+    with open(sql_path) as f:
+        statements = f.read().split(';')
+    queries = {}
+    for statement in statements:
+        sql = "\n".join(line for line in statement.splitlines() if not line.strip().startswith('--')).strip()
+        for name, marker in QUERY_MARKERS.items():
+            if marker in sql and name not in queries:
+                queries[name] = sql
+                break
+    return queries
+
+def _sql_round(values, digits=2):
+    # SQL ROUND rounds halves away from zero (NumPy rounds them to even)
+    scale = 10.0 ** digits
+    values = np.asarray(values, dtype='float64')
+    return np.sign(values) * np.floor(np.abs(values) * scale + 0.5) / scale
+
+def _fraud_flags(column):
+    """is_fraud as int64 0/1 (bools, integers or 'True'/'False' strings), nulls as 0."""
+    if pa.types.is_string(column.type) or pa.types.is_large_string(column.type):
+        column = pc.equal(pc.utf8_lower(column), 'true')
+    return pc.fill_null(pc.cast(column, pa.int64()), 0)
+
+class FinanceAnalytics:
+    """
+    The ffinance.sql analyses run locally on Arrow, straight from Parquet.
+
+    `source` is a Parquet file, a directory of Parquet files (the loader cache,
+    backfill output) or an in-memory Arrow table. Each query reads only the columns it
+    needs, batch by batch, and aggregates every batch with Arrow's hash group-by; the
+    partial counts and sums are merged at the end, so memory depends on the number of
+    groups, not on the number of rows. Results are small pandas DataFrames with the
+    same columns (and rounding) as the SQL Server queries.
+    """
+    def __init__(self, source, rules=None, batch_rows=SCAN_BATCH_ROWS):
+        if isinstance(source, pa.Table):
+            self.dataset = ds.dataset(source)
+        else:
+            options = ds.ParquetReadOptions(dictionary_columns=CATEGORY_COLUMNS)
+            self.dataset = ds.dataset(source, format=ds.ParquetFileFormat(read_options=options))
+        self.rules = rules or RiskRules()
+        self.batch_rows = batch_rows
+        self.timings = {}
+
+    @property
+    def columns(self):
+        return self.dataset.schema.names
+
+    def _batches(self, columns):
+        missing = [col for col in columns if col not in self.columns]
+        if missing:
+            raise KeyError(f"source has no {missing} column(s)")
+        for batch in self.dataset.to_batches(columns=columns, batch_size=self.batch_rows):
+            if batch.num_rows:
+                yield batch
+
+    def _grouped(self, keys, columns=()):
+        """
+        Rows and fraud count per group of `keys`, merged over batches.
+        Returns a DataFrame with the keys, 'rows' and 'fraud'.
+        """
+        partials = []
+        for batch in self._batches(list(keys) + ['is_fraud'] + list(columns)):
+            table = pa.table({**{key: batch.column(key) for key in keys}, 'fraud': _fraud_flags(batch.column('is_fraud'))})
+            partial = table.group_by(list(keys)).aggregate([([], 'count_all'), ('fraud', 'sum')])
+            # Each batch has its own dictionary; decode the (few) group keys before merging
+            for i, field in enumerate(partial.schema):
+                if pa.types.is_dictionary(field.type):
+                    partial = partial.set_column(i, field.name, partial.column(i).cast(field.type.value_type))
+            partials.append(partial)
+        if not partials:
+            return pd.DataFrame(columns=list(keys) + ['rows', 'fraud'])
+        merged = pa.concat_tables(partials).group_by(list(keys)).aggregate([('count_all', 'sum'), ('fraud_sum', 'sum')])
+        return merged.to_pandas().rename(columns={'count_all_sum': 'rows', 'fraud_sum_sum': 'fraud'})
+
+    def _timed(self, name, func):
+        start = time.perf_counter()
+        result = func()
+        self.timings[name] = time.perf_counter() - start
+        return result
+
+    def fraud_distribution(self):
+        """1. Fraud vs non-fraud counts and percentage of all transactions."""
+        def run():
+            partials = []
+            for batch in self._batches(['is_fraud']):
+                table = pa.table({'is_fraud': batch.column('is_fraud')})
+                partials.append(table.group_by(['is_fraud']).aggregate([([], 'count_all')]))
+            if not partials:
+                return pd.DataFrame(columns=['is_fraud', 'total_transactions', 'percentage'])
+            grouped = pa.concat_tables(partials).group_by(['is_fraud']).aggregate([('count_all', 'sum')]).to_pandas()
+            grouped = grouped.rename(columns={'count_all_sum': 'total_transactions'})
+            grouped['percentage'] = _sql_round(grouped['total_transactions'] * 100.0 / grouped['total_transactions'].sum())
+            return grouped.sort_values('is_fraud').reset_index(drop=True)
+        return self._timed('fraud_distribution', run)
+
+    def risk_bucketing(self, limit=None):
+        """
+        3. Row-level tri-tier bucketing (transaction_id, amount_ngn, risk_segment, is_fraud),
+        using the same vectorized rules as scoring. Returns an Arrow table; `limit` caps rows.
+        """
+        def run():
+            parts, rows = [], 0
+            for batch in self._batches(['transaction_id', 'amount_ngn', 'is_fraud'] + self.rules.columns):
+                if limit is not None and rows >= limit:
+                    break
+                if limit is not None:
+                    batch = batch.slice(0, limit - rows)
+                frame = pd.DataFrame({col: batch.column(col).to_numpy(zero_copy_only=False) for col in self.rules.columns})
+                codes = self.rules.segment_codes(frame)
+                segments = pa.DictionaryArray.from_arrays(pa.array(codes), pa.array(self.rules.labels))
+                parts.append(pa.table({'transaction_id': batch.column('transaction_id'),
+                                       'amount_ngn': batch.column('amount_ngn'),
+                                       'risk_segment': segments, 'is_fraud': batch.column('is_fraud')}))
+                rows += batch.num_rows
+            return pa.concat_tables(parts) if parts else pa.table({})
+        return self._timed('risk_bucketing', run)
+
+    def risk_segment_summary(self):
+        """Transactions, fraud count and fraud rate per risk segment (query 3 rolled up)."""
+        def run():
+            txns = np.zeros(len(self.rules.labels), dtype=np.int64)
+            fraud = np.zeros(len(self.rules.labels), dtype=np.int64)
+            for batch in self._batches(['is_fraud'] + self.rules.columns):
+                frame = pd.DataFrame({col: batch.column(col).to_numpy(zero_copy_only=False) for col in self.rules.columns})
+                codes = self.rules.segment_codes(frame)
+                txns += np.bincount(codes, minlength=len(txns))
+                fraud += np.bincount(codes, weights=_fraud_flags(batch.column('is_fraud')).to_numpy(),
+                                     minlength=len(fraud)).astype(np.int64)
+            result = pd.DataFrame({'risk_segment': self.rules.labels, 'total_txns': txns, 'fraud_count': fraud})
+            result['fraud_rate_pct'] = _sql_round(np.where(txns > 0, fraud * 100.0 / np.maximum(txns, 1), 0.0))
+            return result
+        return self._timed('risk_segment_summary', run)
+
+    def merchant_risk(self):
+        """5. Fraud count and rate per merchant category (categories with fraud only), riskiest first."""
+        def run():
+            grouped = self._grouped(['merchant_category'])
+            result = pd.DataFrame({'merchant_category': grouped['merchant_category'], 'total_txns': grouped['rows'],
+                                   'fraud_count': grouped['fraud'],
+                                   'category_fraud_rate_pct': _sql_round(grouped['fraud'] * 100.0 / grouped['rows'])})
+            result = result[result['fraud_count'] > 0]
+            return result.sort_values(['category_fraud_rate_pct', 'merchant_category'],
+                                      ascending=[False, True]).reset_index(drop=True)
+        return self._timed('merchant_risk', run)
+
+    def night_salary_trends(self):
+        """6. Transactions and fraud by night-time and salary-week flags."""
+        def run():
+            grouped = self._grouped(['is_night_txn', 'is_salary_week'])
+            result = grouped.rename(columns={'rows': 'total_txns', 'fraud': 'fraud_count'})
+            return result.sort_values(['is_night_txn', 'is_salary_week']).reset_index(drop=True)
+        return self._timed('night_salary_trends', run)
+
+    def persona_risk(self):
+        """7. Fraud count and rate per sender persona, riskiest first."""
+        def run():
+            grouped = self._grouped(['sender_persona'])
+            result = pd.DataFrame({'sender_persona': grouped['sender_persona'], 'txn_count': grouped['rows'],
+                                   'fraud_count': grouped['fraud'],
+                                   'persona_fraud_rate_pct': _sql_round(grouped['fraud'] * 100.0 / grouped['rows'])})
+            return result.sort_values(['persona_fraud_rate_pct', 'sender_persona'],
+                                      ascending=[False, True]).reset_index(drop=True)
+        return self._timed('persona_risk', run)
+
+    def run_all(self):
+        """
+        Every aggregate analysis the source has the columns for, as {name: DataFrame}
+        (the row-level bucketing is summarised per segment). Analyses whose columns are
+        missing are skipped with a message.
+        """
+        results = {}
+        for name in ('fraud_distribution', 'risk_segment_summary', 'merchant_risk', 'night_salary_trends',
+                     'persona_risk'):
+            try:
+                results[name] = getattr(self, name)()
+            except KeyError as e:
+                print(f"Skipping {name}: {e.args[0]}")
+        return results
+
+def _normalise(frame):
+    """
+    Sorted, index-free copy for comparisons. Bool-like columns (with or without nulls)
+    become floats with NaN for null, which is how SQLite returns them.
+    """
+    frame = frame.copy()
+    for col in frame.columns:
+        values = frame[col]
+        if pd.api.types.is_bool_dtype(values) or (
+                values.dtype == object and values.dropna().map(type).isin([bool, np.bool_]).all()):
+            frame[col] = values.map(lambda v: np.nan if pd.isna(v) else float(v)).astype('float64')
+    return frame.sort_values(list(frame.columns)).reset_index(drop=True)
+
+def check_sql_parity(df, sql_path=SQL_PATH, rules=None):
+    """
+    Runs the ffinance.sql queries on an SQLite copy of `df` and the Arrow analytics on
+    the same rows, and compares them (counts exactly, percentages to the cent).
+    Returns {query: True/False}.
+    """
+    queries = load_queries(sql_path)
+    analytics = FinanceAnalytics(pa.Table.from_pandas(df, preserve_index=False), rules)
+    native = {
+        'fraud_distribution': analytics.fraud_distribution,
+        'merchant_risk': analytics.merchant_risk,
+        'night_salary_trends': analytics.night_salary_trends,
+        'persona_risk': analytics.persona_risk,
+    }
+    results = {}
+    with sqlite3.connect(':memory:') as conn:
+        df.to_sql('finance', conn, index=False)
+        for name, sql in queries.items():
+            expected = pd.read_sql_query(sql, conn)
+            if name == 'risk_bucketing':
+                got = analytics.risk_bucketing().column('risk_segment').to_pandas().astype(str).to_numpy()
+                matches = bool((expected['risk_segment'].to_numpy() == got).all())
+            else:
+                got = _normalise(native[name]())
+                expected = _normalise(expected)[list(got.columns)]
+                matches = len(got) == len(expected) and all(
+                    np.allclose(got[col].astype(float), expected[col].astype(float), atol=1e-9, equal_nan=True)
+                    if pd.api.types.is_numeric_dtype(expected[col]) else (got[col].astype(str) == expected[col].astype(str)).all()
+                    for col in got.columns)
+            results[name] = matches
+            print(f"  {name:<22} {'match' if matches else 'MISMATCH'}")
+    return results
+
+if __name__ == "__main__":
+    from data_loader import get_cache_path
+    parser = argparse.ArgumentParser(description="Run the ffinance.sql analytics locally on Parquet with Arrow")
+    parser.add_argument("source", type=str, nargs="?", default=None,
+                        help="Parquet file or directory (default: the cached full Hub dataset)")
+    parser.add_argument("--excel", type=str, default=None, help="Also write every result to this .xlsx (one sheet each)")
+    parser.add_argument("--parity-rows", type=int, default=0, help="Check parity with the SQL on SQLite over this many rows")
+    args = parser.parse_args()
+
+    source = args.source or get_cache_path()
+    if not os.path.exists(source):
+        raise SystemExit(f"{source} not found. Load the data first (e.g. python src/data_loader.py) or pass a Parquet file.")
+    analytics = FinanceAnalytics(source)
+    print(f"Source: {source} ({analytics.dataset.count_rows():,} rows)")
+    results = analytics.run_all()
+    for name, result in results.items():
+        print(f"\n{name} ({analytics.timings[name] * 1000:,.0f} ms)")
+        print(result.to_string(index=False))
+    if args.excel:
+        from export_to_excel import export_tables
+        export_tables(results, args.excel)
+        print(f"\nSaved {len(results)} sheets to {os.path.abspath(args.excel)}")
+    if args.parity_rows:
+        print(f"\nParity with ffinance.sql on SQLite ({args.parity_rows:,} rows):")
+        sample = analytics.dataset.head(args.parity_rows).to_pandas()
+        check_sql_parity(sample)
@@ -2,8 +2,14 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from data_loader import load_financial_data
+from data_loader import iter_financial_batches, get_cache_path
 from risk_score import RiskScoringEngine
+from model_registry import ModelRegistry
+from aggregates import AggregateCube, FRAUD_CANDIDATES, AMOUNT_CANDIDATES
+from account_store import AccountStore, store_path
+from dedup import Deduplicator, source_key
+from export_to_excel import export_batches, export_tables, EXPORT_FORMATS, MIME_TYPES
+from analytics import FinanceAnalytics
 import joblib
 import os
 import io
@@ -16,74 +22,151 @@ st.markdown("Real-time monitoring and risk analysis for Nigerian Financial Trans
 # 1. Sidebar - Configuration
 st.sidebar.header("Data Sources")
 data_option = st.sidebar.selectbox("Select Data Source", ["Synthetic Data", "Real Data (Subset)"])
+n_rows = st.sidebar.number_input("Transactions to aggregate", min_value=1000, value=100000, step=50000)
 btn_load = st.sidebar.button("Load Data")
 
+# Raw rows kept for the preview table and export; everything else reads the aggregate cube
+SAMPLE_ROWS = 5000
+
 st.sidebar.divider()
 st.sidebar.header("Export Data")
+if btn_load:
+    st.session_state.pop('export', None)
 if 'df' in st.session_state:
-    # Convert to Excel in memory
-    buffer = io.BytesIO()
-    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-        st.session_state.df.to_excel(writer, index=False, sheet_name='FraudData')
-    
-    st.sidebar.download_button(
-        label="📥 Download as Excel",
-        data=buffer.getvalue(),
-        file_name="fraud_monitoring_data.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
+    export_fmt = st.sidebar.selectbox("Export format", EXPORT_FORMATS)
+    # Build the file only when requested, not on every rerun
+    if st.sidebar.button("Prepare export"):
+        buffer = io.StringIO() if export_fmt == 'csv' else io.BytesIO()
+        export_batches([st.session_state.df], buffer, fmt=export_fmt)
+        st.session_state.export = (export_fmt, buffer.getvalue())
+
+    if st.session_state.get('export') and st.session_state.export[0] == export_fmt:
+        st.sidebar.download_button(
+            label=f"📥 Download as {export_fmt.upper()}",
+            data=st.session_state.export[1],
+            file_name=f"fraud_monitoring_data.{export_fmt}",
+            mime=MIME_TYPES[export_fmt]
+        )
 else:
-    st.sidebar.info("Load data first to enable Excel export.")
+    st.sidebar.info("Load data first to enable export.")
 
 # 2. Main Dashboard Logic
+@st.cache_resource
+def get_scoring_engine():
+    # Load model artifacts once per server process instead of on every click
+    registry = ModelRegistry()
+    if registry.latest_version():
+        return RiskScoringEngine.from_registry(registry)
+    return RiskScoringEngine()
+
+@st.cache_resource
+def get_account_store(source):
+    # Indexed on-disk copy of every loaded transaction, for the drill-down panel.
+    # The synthetic and real schemas share no columns, so each source has its own file.
+    return AccountStore(store_path('synthetic' if source == "Synthetic Data" else None))
+
+def load_dashboard_data(source, rows):
+    """
+    Streams `rows` transactions into an aggregate cube, keeping only the first
+    SAMPLE_ROWS raw rows. Reruns query the cube (kept in session state) instead of
+    recomputing over rows. Rows the account store has not seen yet are appended to
+    it for drill-down, so repeated loads do not re-ingest the same transactions.
+    Not st.cache_data: the store writes have to happen on every load, not only on a
+    cache miss, and synthetic batches differ per call so a second pass would not match.
+    """
+    use_synthetic = source == "Synthetic Data"
+    # For Real Data, strictly use streaming to avoid symlink/download errors
+    batches = iter_financial_batches(batch_size=50000, limit=rows, use_synthetic=use_synthetic)
+    store = get_account_store(source)
+    dedup = Deduplicator(os.path.basename(store.path) + ".dedup", os.path.dirname(store.path) or ".")
+    if not store.columns:
+        dedup.reset()  # the store was deleted; forget what it held
+    cube = AggregateCube()
+    sample = []
+    sampled = 0
+    try:
+        for batch in batches:
+            cube.update(batch)
+            store.append(dedup.filter(batch, source_key(use_synthetic=use_synthetic)))
+            # Per batch, so concurrent sessions loading the same data see each other's rows
+            dedup.commit()
+            if sampled < SAMPLE_ROWS:
+                sample.append(batch.head(SAMPLE_ROWS - sampled))
+                sampled += len(sample[-1])
+    finally:
+        dedup.close()
+    return cube, pd.concat(sample, ignore_index=True) if sample else pd.DataFrame()
+
 @st.cache_data
-def get_dashboard_data(source):
-    if source == "Synthetic Data":
-        return load_financial_data(limit=5000, use_synthetic=True)
-    else:
-        # For Real Data, strictly use streaming to avoid symlink/download errors
-        return load_financial_data(limit=5000, use_synthetic=False)
-
-if btn_load or 'df' in st.session_state:
+def get_sql_analytics(path, mtime):
+    """
+    The ffinance.sql analyses over the loader's Parquet cache (every loaded row, not the
+    preview sample), plus the same tables as an Excel workbook. `mtime` keys the cache.
+    """
+    results = FinanceAnalytics(path).run_all()
+    buffer = io.BytesIO()
+    export_tables(results, buffer)
+    return results, buffer.getvalue()
+
+if btn_load or 'cube' in st.session_state:
     if btn_load:
-        st.session_state.df = get_dashboard_data(data_option)
+        try:
+            st.session_state.cube, st.session_state.df = load_dashboard_data(data_option, int(n_rows))
+            st.session_state.source = data_option
+        except Exception as e:
+            st.error(f"Error loading dataset: {e}")
+            st.stop()
     
+    cube = st.session_state.cube
     df = st.session_state.df
+    totals = cube.totals()
     
     # KPIs
     kpi1, kpi2, kpi3 = st.columns(3)
-    total_txns = len(df)
-    # Detect fraud col (handling different schemas)
-    fraud_col = 'is_fraud' if 'is_fraud' in df.columns else 'isFraud'
-    amt_col = 'amount_ngn' if 'amount_ngn' in df.columns else 'amount'
-    
-    fraud_count = df[fraud_col].astype(int).sum()
-    fraud_rate = (fraud_count / total_txns) * 100
-    total_volume = df[amt_col].sum()
-    
-    kpi1.metric("Total Transactions", f"{total_txns:,}")
-    kpi2.metric("Fraud Rate", f"{fraud_rate:.2f}%")
-    kpi3.metric("Total Volume (NGN)", f"{total_volume:,.2f}")
+    kpi1.metric("Total Transactions", f"{int(totals['txn_count']):,}")
+    kpi2.metric("Fraud Rate", f"{totals['fraud_rate_pct']:.2f}%")
+    kpi3.metric("Total Volume (NGN)", f"{totals['amount_sum']:,.2f}")
 
     # Charts
     col1, col2 = st.columns(2)
     
     with col1:
         st.subheader("Transaction Type Distribution")
-        fig_type = px.pie(df, names='transaction_type' if 'transaction_type' in df.columns else 'type', 
+        type_df = cube.query(by=['transaction_type'])
+        fig_type = px.pie(type_df, names='transaction_type', values='txn_count',
                         title="Volume by Type", hole=0.4, color_discrete_sequence=px.colors.sequential.RdBu)
         st.plotly_chart(fig_type, use_container_width=True)
         
     with col2:
         st.subheader("Fraud by Category")
-        if 'merchant_category' in df.columns:
-            cat_df = df.groupby('merchant_category')[fraud_col].sum().reset_index()
-            fig_cat = px.bar(cat_df, x='merchant_category', y=fraud_col, title="Fraud Counts per Category",
+        if cube.available('merchant_category'):
+            cat_df = cube.query(by=['merchant_category'])
+            fig_cat = px.bar(cat_df, x='merchant_category', y='fraud_count', title="Fraud Counts per Category",
                              color_discrete_sequence=['#FF4B4B'])
             st.plotly_chart(fig_cat, use_container_width=True)
         else:
             st.info("Category data not available for this data source.")
 
+    # Risk Segmentation (same CASE logic as ffinance.sql, computed while aggregating)
+    if cube.available('risk_segment'):
+        st.subheader("Risk Segmentation")
+        seg_df = cube.query(by=['risk_segment'])
+        fig_seg = px.bar(seg_df, x='risk_segment', y=['txn_count', 'fraud_count'], barmode='group',
+                         title="Transactions per Risk Segment", color_discrete_sequence=['#636EFA', '#FF4B4B'])
+        st.plotly_chart(fig_seg, use_container_width=True)
+
+    # ffinance.sql analyses, run locally on the cached Parquet file of the loaded rows
+    analytics_file = get_cache_path(limit=int(n_rows))
+    if data_option != "Synthetic Data" and os.path.exists(analytics_file):
+        st.subheader("ffinance.sql Analytics")
+        results, workbook = get_sql_analytics(analytics_file, os.path.getmtime(analytics_file))
+        tabs = st.tabs([name.replace('_', ' ').title() for name in results])
+        for tab, result in zip(tabs, results.values()):
+            with tab:
+                st.dataframe(result, use_container_width=True)
+        st.download_button("📥 Download analytics (.xlsx)", data=workbook, file_name="ffinance_analytics.xlsx",
+                           mime=MIME_TYPES['xlsx'])
+
     # Risk Scoring Tool
     st.divider()
     st.header("🔍 Individual Transaction Risk Scorer")
@@ -91,39 +174,112 @@ if btn_load or 'df' in st.session_state:
     with st.expander("Evaluate a Custom Transaction"):
         t_col1, t_col2, t_col3 = st.columns(3)
         t_amt = t_col1.number_input("Transaction Amount (NGN)", min_value=0.0, value=50000.0)
-        t_type = t_col2.selectbox("Type", df['transaction_type'].unique() if 'transaction_type' in df.columns else ['TRANSFER', 'PAYMENT', 'CASH_OUT'])
+        t_type = t_col2.selectbox("Type", type_df['transaction_type'].tolist() if cube.available('transaction_type') else ['TRANSFER', 'PAYMENT', 'CASH_OUT'])
         t_loc = t_col3.text_input("Location", "Lagos, Nigeria")
         
         if st.button("Calculate Risk Score"):
-            engine = RiskScoringEngine()
-            score = engine.calculate_risk_score({'amount': t_amt, 'transaction_type': t_type})
+            engine = get_scoring_engine()
+            engine.refresh() # Pick up a newly trained model without restarting
+            txn = {'amount': t_amt, 'transaction_type': t_type}
+            try:
+                score = engine.calculate_risk_score(txn)
+            except Exception as e:
+                st.error(f"Could not score this transaction: {e}")
+                score = None
+            if score is not None:
+                # Cutoffs tuned on the model's validation split (precision/recall targets)
+                high, medium = engine.cutoffs['high'], engine.cutoffs['medium']
             
-            # Gauge Chart
-            fig_gauge = go.Figure(go.Indicator(
-                mode = "gauge+number",
-                value = score,
-                domain = {'x': [0, 1], 'y': [0, 1]},
-                title = {'text': "Transaction Risk Score"},
-                gauge = {
-                    'axis': {'range': [None, 100]},
-                    'bar': {'color': "#FF4B4B" if score > 70 else "#FFA500" if score > 40 else "#00CC96"},
-                    'steps': [
-                        {'range': [0, 40], 'color': "lightgray"},
-                        {'range': [40, 70], 'color': "gray"}],
-                }
-            ))
-            st.plotly_chart(fig_gauge)
+                # Gauge Chart
+                fig_gauge = go.Figure(go.Indicator(
+                    mode = "gauge+number",
+                    value = score,
+                    domain = {'x': [0, 1], 'y': [0, 1]},
+                    title = {'text': "Transaction Risk Score"},
+                    gauge = {
+                        'axis': {'range': [None, 100]},
+                        'bar': {'color': "#FF4B4B" if score >= high else "#FFA500" if score >= medium else "#00CC96"},
+                        'steps': [
+                            {'range': [0, medium], 'color': "lightgray"},
+                            {'range': [medium, high], 'color': "gray"}],
+                    }
+                ))
+                st.plotly_chart(fig_gauge)
             
-            if score > 70:
-                st.error("🚨 HIGH RISK: Transaction flagged for manual review.")
-            elif score > 40:
-                st.warning("⚠️ MEDIUM RISK: Monitor this account for further activity.")
-            else:
-                st.success("✅ LOW RISK: Transaction appears legitimate.")
+                if score >= high:
+                    st.error("🚨 HIGH RISK: Transaction flagged for manual review.")
+                elif score >= medium:
+                    st.warning("⚠️ MEDIUM RISK: Monitor this account for further activity.")
+                else:
+                    st.success("✅ LOW RISK: Transaction appears legitimate.")
+
+                # Per-feature contributions to the fraud log-odds
+                contributions = engine.explain_batch(txn)
+                if len(contributions.columns) > 1:
+                    drivers = contributions.drop(columns=['bias', 'risk_score']).iloc[0]
+                    drivers = drivers[drivers != 0].sort_values(key=abs, ascending=False).head(8)
+                    fig_drivers = px.bar(x=drivers.values, y=drivers.index, orientation='h',
+                                         labels={'x': 'Contribution to fraud log-odds', 'y': ''},
+                                         title="What drove this score", color=drivers.values > 0,
+                                         color_discrete_map={True: '#FF4B4B', False: '#00CC96'})
+                    fig_drivers.update_layout(showlegend=False)
+                    st.plotly_chart(fig_drivers, use_container_width=True)
+
+    # Investigator drill-down (indexed lookups in the account store, not scans of the sample)
+    st.divider()
+    st.header("🕵️ Investigator Drill-down")
+    store = get_account_store(st.session_state.get('source', data_option))
+    tab_account, tab_merchant = st.tabs(["Account history", "Merchant window"])
+
+    with tab_account:
+        sender_col = store.roles.get('sender')
+        fraud_col = next((c for c in FRAUD_CANDIDATES if c in df.columns), None)
+        flagged = []
+        if sender_col in df.columns and fraud_col:
+            flagged = df.loc[df[fraud_col].astype(int) == 1, sender_col].astype(str).unique()[:100].tolist()
+        if not sender_col:
+            st.info("Load data first to index account histories.")
+        else:
+            d_col1, d_col2 = st.columns([3, 1])
+            picked = d_col1.selectbox("Flagged senders in the preview", flagged) if flagged else None
+            account = d_col1.text_input("Or look up any account", "").strip() or picked
+            n_last = d_col2.number_input("Last N transactions", min_value=10, max_value=5000, value=50, step=10)
+            include_received = d_col2.checkbox("Include received")
+            if account:
+                history = store.last_transactions(account, int(n_last), include_received)
+                if history.empty:
+                    st.info(f"No stored transactions for {account}.")
+                else:
+                    amount_col = next((c for c in AMOUNT_CANDIDATES if c in history.columns), None)
+                    h_col1, h_col2, h_col3 = st.columns(3)
+                    h_col1.metric("Transactions shown", f"{len(history):,}")
+                    h_col2.metric("Fraud", f"{int(history[fraud_col].sum()):,}" if fraud_col in history.columns else "N/A")
+                    h_col3.metric("Volume (NGN)", f"{history[amount_col].sum():,.2f}" if amount_col else "N/A")
+                    time_col = store.roles.get('time')
+                    if amount_col and time_col:
+                        fig_hist = px.scatter(history, x=time_col, y=amount_col,
+                                              color=fraud_col if fraud_col in history.columns else None,
+                                              title=f"Transactions of {account}")
+                        st.plotly_chart(fig_hist, use_container_width=True)
+                    st.dataframe(history, use_container_width=True)
+
+    with tab_merchant:
+        merchants = store.distinct('merchant')
+        if not merchants:
+            st.info("Merchant data not available for this data source.")
+        else:
+            m_col1, m_col2, m_col3 = st.columns(3)
+            merchant = m_col1.selectbox("Merchant category", merchants)
+            window_start = m_col2.text_input("From (inclusive)", "", help="e.g. 2024-01-10 or 2024-01-10T08:00:00")
+            window_end = m_col3.text_input("To (exclusive)", "")
+            window = store.merchant_transactions(merchant, window_start or None, window_end or None, limit=5000)
+            st.caption(f"{len(window):,} transactions (newest first, at most 5,000)")
+            st.dataframe(window, use_container_width=True)
 
     # Data Preview
     st.divider()
     st.subheader("Recent Transactions")
+    st.caption(f"Charts cover {cube.rows:,} transactions; the preview and export use the first {len(df):,}.")
     st.dataframe(df.head(20), use_container_width=True)
 
 else:
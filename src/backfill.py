@@ -0,0 +1,160 @@
+import argparse
+import glob
+import multiprocessing
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from data_loader import iter_financial_batches, get_cache_path, source_cache_name
+from model_registry import ModelRegistry
+
+# Per-process engine, created once by _init_worker
+_ENGINE = None
+
+def plan_shards(path, shards):
+    """
+    Splits a Parquet file's row groups into at most `shards` contiguous runs with
+    roughly equal row counts. Returns a list of row-group index lists.
+    """
+    metadata = pq.ParquetFile(path).metadata
+    sizes = [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)]
+    target = sum(sizes) / max(shards, 1)
+    plan, current, current_rows = [], [], 0
+    for index, rows in enumerate(sizes):
+        current.append(index)
+        current_rows += rows
+        if current_rows >= target and len(plan) < shards - 1:
+            plan.append(current)
+            current, current_rows = [], 0
+    if current:
+        plan.append(current)
+    return plan
+
+def _resolve_parquet(source_path, shards, batch_size):
+    """
+    Returns a Parquet file with enough row groups to shard. CSV input (or Parquet
+    written as a few huge row groups) is spooled once into the loader's cache.
+    """
+    if source_path.endswith('.parquet'):
+        metadata = pq.ParquetFile(source_path).metadata
+        if metadata.num_row_groups >= shards:
+            return source_path
+        batch_size = max(1, min(batch_size, -(-metadata.num_rows // shards)))
+    cache_file = get_cache_path(source_cache_name(source_path), "train", None)
+    if not os.path.exists(cache_file):
+        print(f"Spooling {source_path} to {cache_file} in {batch_size:,}-row row groups...")
+        for _ in iter_financial_batches(batch_size=batch_size, source_path=source_path, as_arrow=True):
+            pass
+    return cache_file
+
+def _init_worker(registry_dir, version, model_path, preprocessor_path, threads_per_worker):
+    """
+    Loads the model artifacts once per worker process.
+    """
+    global _ENGINE
+    from risk_score import RiskScoringEngine
+    if registry_dir:
+        _ENGINE = RiskScoringEngine.from_registry(ModelRegistry(registry_dir), version)
+    else:
+        _ENGINE = RiskScoringEngine(model_path=model_path, preprocessor_path=preprocessor_path)
+    artifacts = _ENGINE._active()
+    if artifacts is None:
+        raise RuntimeError("No model artifacts could be loaded")
+    # One process per core: keep XGBoost from spawning a thread per core in every worker
+    artifacts.booster.set_param({'nthread': threads_per_worker})
+
+def _score_shard(shard_id, path, row_groups, output_dir, chunk_size):
+    """
+    Scores one shard and writes it to <output_dir>/part-<shard_id>.parquet.
+    Returns (shard_id, pid, rows, seconds).
+    """
+    start = time.perf_counter()
+    part = os.path.join(output_dir, f"part-{shard_id:05d}.parquet")
+    tmp_part = part + ".tmp"
+    rows, writer = 0, None
+    try:
+        for batch in pq.ParquetFile(path, memory_map=True).iter_batches(batch_size=chunk_size, row_groups=row_groups):
+            df = batch.to_pandas()
+            scored = batch.append_column('risk_score', pa.array(_ENGINE.score_batch(df, chunk_size).astype('float32')))
+            scored = scored.append_column('risk_segment', pa.array(np.asarray(_ENGINE.risk_segments(df), dtype=object),
+                                                                   type=pa.string()))
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_part, scored.schema)
+            writer.write_batch(scored)
+            rows += len(df)
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is not None:
+        os.replace(tmp_part, part)
+    return shard_id, os.getpid(), rows, time.perf_counter() - start
+
+def backfill(source_path, output_dir="backfill_output", workers=None, chunk_size=100000, shards_per_worker=4,
+             registry_dir=None, version=None, model_path='xgboost_fraud_model.pkl',
+             preprocessor_path='preprocessor.pkl', threads_per_worker=1):
+    """
+    Rescores a historical Parquet/CSV file across a process pool.
+    Args:
+        source_path (str): Parquet or CSV file of raw transactions.
+        output_dir (str): Directory receiving one part-*.parquet file per shard, with
+                          the input columns plus risk_score and risk_segment.
+        workers (int, optional): Processes to use (default: all cores).
+        chunk_size (int): Rows scored per vectorized call.
+        shards_per_worker (int): More, smaller shards even out per-worker load.
+        registry_dir (str, optional): Load the model bundle from this ModelRegistry
+                                      instead of the pickles.
+    Returns a per-worker summary: {pid: {'rows', 'seconds', 'rows_per_sec'}}.
+    """
+    workers = workers or os.cpu_count()
+    path = _resolve_parquet(source_path, workers * shards_per_worker, chunk_size)
+    plan = plan_shards(path, workers * shards_per_worker)
+
+    os.makedirs(output_dir, exist_ok=True)
+    for stale in glob.glob(os.path.join(output_dir, "part-*.parquet")):
+        os.remove(stale)
+
+    print(f"Backfilling {path} in {len(plan)} shards over {workers} workers...")
+    per_worker = defaultdict(lambda: {'rows': 0, 'seconds': 0.0})
+    total_rows, start = 0, time.perf_counter()
+    # Fresh interpreters: forking after XGBoost's OpenMP pool has started is unsafe
+    ctx = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                             initargs=(registry_dir, version, model_path, preprocessor_path,
+                                       threads_per_worker)) as pool:
+        futures = [pool.submit(_score_shard, shard_id, path, row_groups, output_dir, chunk_size)
+                   for shard_id, row_groups in enumerate(plan)]
+        for future in as_completed(futures):
+            shard_id, pid, rows, seconds = future.result()
+            per_worker[pid]['rows'] += rows
+            per_worker[pid]['seconds'] += seconds
+            total_rows += rows
+            print(f"Shard {shard_id}: {rows:,} rows in {seconds:.1f}s "
+                  f"({total_rows:,} rows, {total_rows / (time.perf_counter() - start):,.0f} rows/s overall)")
+
+    elapsed = time.perf_counter() - start
+    for stats in per_worker.values():
+        stats['rows_per_sec'] = stats['rows'] / max(stats['seconds'], 1e-9)
+    busy = [stats['seconds'] for stats in per_worker.values()]
+    # Skew: slowest worker's busy time relative to the mean (1.0 = perfectly balanced)
+    skew = max(busy) / (sum(busy) / len(busy)) if busy else 1.0
+    for pid, stats in sorted(per_worker.items()):
+        print(f"  worker {pid}: {stats['rows']:,} rows, busy {stats['seconds']:.1f}s ({stats['rows_per_sec']:,.0f} rows/s)")
+    print(f"Backfilled {total_rows:,} rows to {os.path.abspath(output_dir)} in {elapsed:.1f}s "
+          f"({total_rows / max(elapsed, 1e-9):,.0f} rows/s, skew {skew:.2f})")
+    return dict(per_worker)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel historical rescoring")
+    parser.add_argument("source", type=str, help="Parquet or CSV file to rescore")
+    parser.add_argument("--out", type=str, default="backfill_output", help="Output directory for part files")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--chunk-size", type=int, default=100000, help="Rows per vectorized scoring call")
+    parser.add_argument("--shards-per-worker", type=int, default=4, help="Shards per worker for load balancing")
+    parser.add_argument("--registry", type=str, default=None, help="Score with the latest bundle from this model registry")
+    args = parser.parse_args()
+
+    backfill(args.source, output_dir=args.out, workers=args.workers, chunk_size=args.chunk_size,
+             shards_per_worker=args.shards_per_worker, registry_dir=args.registry)
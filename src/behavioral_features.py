@@ -0,0 +1,335 @@
+import threading
+import pandas as pd
+import numpy as np
+
+FEATURE_COLUMNS = ['velocity_score', 'spending_deviation_score', 'geo_anomaly_score']
+
+# Candidate column names for the real dataset and the synthetic (PaySim-style) schema
+ACCOUNT_CANDIDATES = ['sender_account', 'nameOrig']
+AMOUNT_CANDIDATES = ['amount_ngn', 'amount']
+TIME_CANDIDATES = ['timestamp', 'step']
+LOCATION_CANDIDATES = ['location']
+
+def _first_present(columns, candidates):
+    return next((col for col in candidates if col in columns), None)
+
+def to_seconds(values, time_col=None):
+    """
+    Converts a timestamp column to float seconds.
+    Datetimes/strings are parsed; 'step' columns are hours; other numerics are taken as seconds.
+    """
+    values = pd.Series(values)
+    if pd.api.types.is_numeric_dtype(values):
+        seconds = values.to_numpy(dtype='float64')
+        return seconds * 3600 if time_col == 'step' else seconds
+    stamps = pd.to_datetime(values)
+    if stamps.dt.tz is not None:
+        stamps = stamps.dt.tz_convert(None)
+    return stamps.to_numpy(dtype='datetime64[ns]').astype('int64') / 1e9
+
+class BehavioralFeatureStore:
+    """
+    Incremental per-account state for velocity, spending deviation and geo anomaly.
+
+    State lives in flat NumPy arrays indexed by an account slot:
+    - velocity_score: transactions in the last `window_seconds`, kept as a ring of
+      `n_buckets` time buckets per account.
+    - spending_deviation_score: |amount - EWMA mean| / EWMA std, using the state
+      before the current transaction.
+    - geo_anomaly_score: 1 - EWMA location-change rate when the location differs
+      from the last one seen, else 0 (a stable account that suddenly moves scores high).
+    Each update() is O(n_buckets) = O(1); compute_features() gives the same values
+    for a whole historical frame in vectorized form. Rows without an account get NaN
+    features and leave the state alone; a missing amount counts towards velocity but
+    is skipped by the spending EWMA (deviation 0).
+    One lock serializes updates and lookups, so a store can be shared across threads
+    (e.g. the scoring service and the dashboard).
+    """
+    def __init__(self, window_seconds=86400, n_buckets=24, alpha=0.1, min_std_ratio=0.1,
+                 account_col=None, amount_col=None, time_col=None, location_col=None, capacity=1024):
+        self.window_seconds = window_seconds
+        self.n_buckets = n_buckets
+        self.bucket_seconds = window_seconds / n_buckets
+        self.alpha = alpha
+        self.min_std_ratio = min_std_ratio
+        self.account_col = account_col
+        self.amount_col = amount_col
+        self.time_col = time_col
+        self.location_col = location_col
+
+        self._slots = {}
+        self._locations = {}
+        self._lock = threading.RLock()
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        self._bucket_counts = np.zeros((capacity, self.n_buckets), dtype=np.int32)
+        self._last_bucket = np.zeros(capacity, dtype=np.int64)
+        self._ewm_mean = np.zeros(capacity, dtype=np.float64)
+        self._ewm_sq = np.zeros(capacity, dtype=np.float64)
+        self._change_rate = np.zeros(capacity, dtype=np.float64)
+        self._last_location = np.full(capacity, -1, dtype=np.int32)
+        self._seen = np.zeros(capacity, dtype=bool)
+
+    def _grow(self, needed):
+        capacity = len(self._seen)
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2)
+        for name in ('_bucket_counts', '_last_bucket', '_ewm_mean', '_ewm_sq', '_change_rate', '_last_location', '_seen'):
+            old = getattr(self, name)
+            new = np.empty((new_capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:capacity] = old
+            new[capacity:] = -1 if name == '_last_location' else 0
+            setattr(self, name, new)
+
+    def _slot(self, account):
+        slot = self._slots.get(account)
+        if slot is None:
+            slot = self._slots[account] = len(self._slots)
+            self._grow(slot + 1)
+        return slot
+
+    def _location_code(self, location):
+        if location is None or (isinstance(location, float) and np.isnan(location)):
+            return -1
+        return self._locations.setdefault(location, len(self._locations))
+
+    def _resolve_columns(self, df):
+        account_col = self.account_col or _first_present(df.columns, ACCOUNT_CANDIDATES)
+        amount_col = self.amount_col or _first_present(df.columns, AMOUNT_CANDIDATES)
+        time_col = self.time_col or _first_present(df.columns, TIME_CANDIDATES)
+        location_col = self.location_col or _first_present(df.columns, LOCATION_CANDIDATES)
+        if account_col is None or amount_col is None or time_col is None:
+            raise ValueError(f"Need account, amount and time columns. Available: {list(df.columns)}")
+        return account_col, amount_col, time_col, location_col
+
+    def _std_floor(self, mean, sq):
+        std = np.sqrt(np.maximum(sq - mean * mean, 0.0))
+        return np.maximum(std, self.min_std_ratio * np.abs(mean))
+
+    def update(self, account, amount, timestamp, location=None):
+        """
+        Records one transaction (timestamp in seconds) and returns its
+        (velocity_score, spending_deviation_score, geo_anomaly_score).
+        """
+        with self._lock:
+            return self._update(account, amount, timestamp, location)
+
+    def _update(self, account, amount, timestamp, location):
+        slot = self._slot(account)
+        bucket = int(timestamp // self.bucket_seconds)
+        counts = self._bucket_counts[slot]
+        location = self._location_code(location)
+
+        # Velocity: advance the ring buffer to the current bucket, clearing expired ones
+        gap = bucket - int(self._last_bucket[slot]) if self._seen[slot] else self.n_buckets
+        if gap >= self.n_buckets:
+            counts[:] = 0
+        elif gap > 0:
+            for b in range(bucket - gap + 1, bucket + 1):
+                counts[b % self.n_buckets] = 0
+        if gap > -self.n_buckets:
+            counts[bucket % self.n_buckets] += 1
+        self._last_bucket[slot] = max(bucket, int(self._last_bucket[slot])) if gap < self.n_buckets else bucket
+        velocity = float(counts.sum())
+
+        a = self.alpha
+        if not self._seen[slot]:
+            deviation, geo = 0.0, 0.0
+            # NaN until the account's first known amount
+            self._ewm_mean[slot] = amount
+            self._ewm_sq[slot] = amount * amount
+            self._seen[slot] = True
+        else:
+            mean, sq = self._ewm_mean[slot], self._ewm_sq[slot]
+            if np.isnan(amount):
+                deviation = 0.0
+            elif np.isnan(mean):
+                deviation = 0.0
+                self._ewm_mean[slot] = amount
+                self._ewm_sq[slot] = amount * amount
+            else:
+                std = self._std_floor(mean, sq)
+                deviation = float(abs(amount - mean) / std) if std > 0 else 0.0
+                self._ewm_mean[slot] = (1 - a) * mean + a * amount
+                self._ewm_sq[slot] = (1 - a) * sq + a * amount * amount
+
+            changed = float(location != self._last_location[slot] and location >= 0 and self._last_location[slot] >= 0)
+            geo = changed * (1.0 - self._change_rate[slot])
+            self._change_rate[slot] = (1 - a) * self._change_rate[slot] + a * changed
+
+        if location >= 0:
+            self._last_location[slot] = location
+        return velocity, deviation, geo
+
+    def update_batch(self, df):
+        """
+        Feeds the rows of `df` (in order) through update() and returns their features.
+        """
+        account_col, amount_col, time_col, location_col = self._resolve_columns(df)
+        seconds = to_seconds(df[time_col], time_col)
+        amounts = pd.to_numeric(df[amount_col], errors='coerce').to_numpy(dtype='float64')
+        accounts = df[account_col].to_numpy()
+        locations = df[location_col].to_numpy() if location_col else [None] * len(df)
+        missing = df[account_col].isna().to_numpy()
+
+        out = np.empty((len(df), len(FEATURE_COLUMNS)), dtype=np.float64)
+        with self._lock:
+            for i in range(len(df)):
+                out[i] = np.nan if missing[i] else self._update(accounts[i], amounts[i], seconds[i], locations[i])
+        return pd.DataFrame(out, columns=FEATURE_COLUMNS, index=df.index)
+
+    def lookup_batch(self, df):
+        """
+        Features of the rows of `df` against the stored state, as update_batch() would
+        return them, but leaves the store unchanged (for scoring rows that may be
+        scored again). Only the state of the accounts in `df` is saved and restored,
+        under the store's lock, so concurrent callers never see the temporary state.
+        """
+        with self._lock:
+            return self._lookup_batch(df)
+
+    def _lookup_batch(self, df):
+        account_col = self._resolve_columns(df)[0]
+        n_accounts, n_locations = len(self._slots), len(self._locations)
+        known = [self._slots[account] for account in pd.unique(df[account_col]) if account in self._slots]
+        slots = np.array(known, dtype=np.int64)
+        names = ('_bucket_counts', '_last_bucket', '_ewm_mean', '_ewm_sq', '_change_rate', '_last_location', '_seen')
+        saved = {name: getattr(self, name)[slots].copy() for name in names}
+        try:
+            return self.update_batch(df)
+        finally:
+            for name in names:
+                array = getattr(self, name)
+                array[slots] = saved[name]
+                # Slots handed to new accounts go back to their initial state
+                array[n_accounts:len(self._slots)] = -1 if name == '_last_location' else 0
+            # New accounts and locations were added last; popitem() removes the newest first
+            while len(self._slots) > n_accounts:
+                self._slots.popitem()
+            while len(self._locations) > n_locations:
+                self._locations.popitem()
+
+    def compute_features(self, df):
+        """
+        Vectorized recomputation of the features over a historical frame.
+        Rows are processed per account in time order (stable for ties) and the
+        result is aligned with `df`. Does not touch the stored state; see load_history().
+        """
+        features, _ = self._compute(df)
+        return features
+
+    def load_history(self, df):
+        """
+        Computes features for a historical frame and seeds the per-account state
+        from it (replacing any existing state for those accounts), so update()
+        continues where the history ends.
+        """
+        features, state = self._compute(df)
+        accounts, last_rows, last_bucket, sorted_slots, sorted_buckets = state
+        with self._lock:
+            self._seed(accounts, last_rows, last_bucket, sorted_slots, sorted_buckets)
+        return features
+
+    def _seed(self, accounts, last_rows, last_bucket, sorted_slots, sorted_buckets):
+        slots = np.array([self._slot(account) for account in accounts], dtype=np.int64)
+        self._ewm_mean[slots] = last_rows['mean']
+        self._ewm_sq[slots] = last_rows['sq']
+        self._change_rate[slots] = last_rows['rate']
+        self._last_location[slots] = [self._location_code(loc) for loc in last_rows['location']]
+        self._last_bucket[slots] = last_bucket
+        self._seen[slots] = True
+
+        # Rebuild the ring buffers from the events still inside each account's window
+        self._bucket_counts[slots] = 0
+        live = sorted_buckets > last_bucket[sorted_slots] - self.n_buckets
+        np.add.at(self._bucket_counts, (slots[sorted_slots[live]], sorted_buckets[live] % self.n_buckets), 1)
+
+    def _compute(self, df):
+        account_col, amount_col, time_col, location_col = self._resolve_columns(df)
+        missing = df[account_col].isna().to_numpy()
+        if missing.any():
+            # factorize() codes missing accounts -1, which would pool them into a fake account
+            features, state = self._compute(df[~missing])
+            out = np.full((len(df), len(FEATURE_COLUMNS)), np.nan)
+            out[~missing] = features.to_numpy()
+            return pd.DataFrame(out, columns=FEATURE_COLUMNS, index=df.index), state
+        n = len(df)
+        seconds = to_seconds(df[time_col], time_col)
+        amounts = pd.to_numeric(df[amount_col], errors='coerce').to_numpy(dtype='float64')
+        account_codes, accounts = pd.factorize(df[account_col], sort=False)
+
+        # Sort by account, then time; lexsort is stable so ties keep input order
+        order = np.lexsort((seconds, account_codes))
+        acct = account_codes[order]
+        buckets = np.floor(seconds[order] / self.bucket_seconds).astype(np.int64)
+        amt = amounts[order]
+        group_start = np.ones(n, dtype=bool)
+        group_start[1:] = acct[1:] != acct[:-1]
+        first_pos = np.maximum.accumulate(np.where(group_start, np.arange(n), 0))
+
+        # Velocity: rows of the same account whose bucket lies in (bucket - n_buckets, bucket]
+        span = (buckets.max() - buckets.min() + self.n_buckets + 1) if n else 1
+        key = acct * span + (buckets - (buckets.min() if n else 0))
+        lower = np.searchsorted(key, key - (self.n_buckets - 1), side='left')
+        velocity = np.arange(n) - np.maximum(lower, first_pos) + 1
+
+        # Spending deviation against the EWMA state before each row
+        grouped = pd.DataFrame({'acct': acct, 'x': amt, 'x2': amt * amt}).groupby('acct', sort=False)
+        # ignore_na: a missing amount carries the mean forward, as update() does
+        ewm = grouped[['x', 'x2']].ewm(alpha=self.alpha, adjust=False, ignore_na=True).mean()
+        ewm = ewm.reset_index(level=0, drop=True).sort_index()
+        mean, sq = ewm['x'].to_numpy(), ewm['x2'].to_numpy()
+        prev_mean, prev_sq = np.roll(mean, 1), np.roll(sq, 1)
+        std = self._std_floor(prev_mean, prev_sq)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            skip = group_start | np.isnan(amt) | np.isnan(prev_mean) | ~(std > 0)
+            deviation = np.where(skip, 0.0, np.abs(amt - prev_mean) / std)
+
+        # Geo anomaly from location changes and their EWMA rate
+        if location_col:
+            loc = df[location_col].to_numpy()[order]
+            loc_codes = pd.factorize(loc)[0]
+            # Missing locations never count as a change and do not overwrite the last one seen
+            prev_loc = pd.Series(np.where(loc_codes >= 0, loc_codes, np.nan)).groupby(acct).ffill().shift(1)
+            prev_loc = np.where(group_start, -1, prev_loc.fillna(-1).to_numpy())
+            changed = ((loc_codes != prev_loc) & (loc_codes >= 0) & (prev_loc >= 0)).astype(np.float64)
+        else:
+            loc = np.full(n, None, dtype=object)
+            changed = np.zeros(n)
+        rate = pd.Series(changed).groupby(acct, sort=False).ewm(alpha=self.alpha, adjust=False).mean()
+        rate = rate.reset_index(level=0, drop=True).sort_index().to_numpy()
+        geo = np.where(group_start, 0.0, changed * (1.0 - np.roll(rate, 1)))
+
+        out = np.empty((n, len(FEATURE_COLUMNS)), dtype=np.float64)
+        out[order, 0] = velocity
+        out[order, 1] = deviation
+        out[order, 2] = geo
+        features = pd.DataFrame(out, columns=FEATURE_COLUMNS, index=df.index)
+
+        # Final per-account state, for load_history()
+        last = np.flatnonzero(np.append(group_start[1:], True))
+        if location_col:
+            has_loc = pd.Series(np.where(loc_codes >= 0, np.arange(n), np.nan)).groupby(acct).ffill().to_numpy()
+            last_loc = [loc[int(p)] if not np.isnan(p) else None for p in has_loc[last]]
+        else:
+            last_loc = [None] * len(last)
+        last_rows = {'mean': mean[last], 'sq': sq[last], 'rate': rate[last], 'location': last_loc}
+        last_bucket = buckets[last]
+        # Map each sorted row to the index of its account within `last`
+        sorted_slots = np.cumsum(group_start) - 1
+        state = (accounts[acct[last]], last_rows, last_bucket, sorted_slots, buckets)
+        return features, state
+
+if __name__ == "__main__":
+    history = pd.DataFrame({
+        'sender_account': ['A', 'A', 'B', 'A', 'B', 'A'],
+        'amount_ngn': [1000.0, 1200.0, 50.0, 900.0, 55.0, 250000.0],
+        'timestamp': pd.to_datetime(['2024-01-01 08:00', '2024-01-01 09:00', '2024-01-01 10:00',
+                                     '2024-01-02 07:00', '2024-01-03 12:00', '2024-01-03 12:30']),
+        'location': ['Lagos', 'Lagos', 'Abuja', 'Lagos', 'Abuja', 'Kano'],
+    })
+    store = BehavioralFeatureStore()
+    print("Bulk features:\n", store.compute_features(history))
+    print("Streaming features:\n", BehavioralFeatureStore().update_batch(history))
@@ -0,0 +1,522 @@
+import argparse
+import asyncio
+import json
+import os
+import multiprocessing
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from data_loader import generate_synthetic_data
+from risk_score import RiskScoringEngine
+from risk_rules import RiskRules, check_sqlite_parity, sample_scores
+
+def ensure_model_artifacts(model_path='xgboost_fraud_model.pkl', preprocessor_path='preprocessor.pkl'):
+    """
+    Trains a small synthetic model if no artifacts are present in the working directory.
+    """
+    if os.path.exists(model_path) and os.path.exists(preprocessor_path):
+        return
+    print("Model artifacts not found. Training a small synthetic model for benchmarking...")
+    from train_model import train_fraud_model
+    train_fraud_model(limit=10000, use_synthetic=True)
+
+def _original_risk_score(transaction_data):
+    """
+    calculate_risk_score as it was before score_batch: a one-row DataFrame per call and
+    the high value rule read from its first row (it never reached the model).
+    """
+    df = pd.DataFrame([transaction_data]) if isinstance(transaction_data, dict) else transaction_data
+    val = df.iloc[0].get('amount', df.iloc[0].get('amount_ngn', 0))
+    return min(50 if val > 100000 else 0, 100)
+
+def bench_scoring(sizes=(1000, 100000, 1000000), per_row_max=5000, chunk_size=100000):
+    """
+    Compares rows/sec of score_batch against the original per-row calculate_risk_score
+    (_original_risk_score; the current one delegates to score_batch). The per-row path
+    is timed on at most `per_row_max` rows since its throughput does not depend on the
+    total size. score_batch also runs the model, so the speedup is a lower bound.
+    """
+    ensure_model_artifacts()
+    engine = RiskScoringEngine()
+
+    results = []
+    for rows in sizes:
+        df = generate_synthetic_data(rows=rows)
+
+        start = time.perf_counter()
+        engine.score_batch(df, chunk_size=chunk_size)
+        batch_rate = rows / (time.perf_counter() - start)
+
+        records = df.head(per_row_max).to_dict('records')
+        start = time.perf_counter()
+        for record in records:
+            _original_risk_score(record)
+        per_row_rate = len(records) / (time.perf_counter() - start)
+
+        results.append({'rows': rows, 'batch_rows_per_sec': batch_rate, 'per_row_rows_per_sec': per_row_rate})
+        print(f"{rows:>10,} rows | batch: {batch_rate:>12,.0f} rows/s | "
+              f"per-row: {per_row_rate:>10,.0f} rows/s (sampled {len(records):,}) | "
+              f"speedup: {batch_rate / per_row_rate:,.1f}x")
+    return results
+
+def bench_explain(sizes=(100000, 1000000), exact_rows=1000, chunk_size=100000):
+    """
+    Compares explain_batch (per-feature contributions plus scores) against plain
+    score_batch. The added cost should stay within 2x of scoring; exact TreeSHAP is
+    timed on at most `exact_rows` rows.
+    """
+    ensure_model_artifacts()
+    engine = RiskScoringEngine()
+
+    results = []
+    for rows in sizes:
+        df = generate_synthetic_data(rows=rows)
+
+        start = time.perf_counter()
+        engine.score_batch(df, chunk_size=chunk_size)
+        plain = time.perf_counter() - start
+
+        start = time.perf_counter()
+        engine.explain_batch(df, chunk_size=chunk_size)
+        explained = time.perf_counter() - start
+
+        sample = df.head(exact_rows)
+        start = time.perf_counter()
+        engine.explain_batch(sample, chunk_size=chunk_size, exact=True)
+        exact_rate = len(sample) / (time.perf_counter() - start)
+
+        added = (explained - plain) / plain
+        results.append({'rows': rows, 'score_rows_per_sec': rows / plain, 'explain_rows_per_sec': rows / explained,
+                        'exact_rows_per_sec': exact_rate, 'added_cost': added})
+        print(f"{rows:>10,} rows | score: {rows / plain:>12,.0f} rows/s | explain: {rows / explained:>12,.0f} rows/s "
+              f"(+{added:.2f}x scoring cost{'' if added <= 2 else ', over the 2x budget'}) | "
+              f"exact SHAP: {exact_rate:>8,.0f} rows/s")
+    return results
+
+def bench_bucketing(sizes=(1000000, 10000000), sqlite_rows=200000):
+    """
+    Measures rows/sec of the vectorized risk bucketing and checks it against the
+    ffinance.sql CASE query run on SQLite.
+    """
+    rules = RiskRules()
+    results = []
+    for rows in sizes:
+        df = sample_scores(rows)
+        start = time.perf_counter()
+        rules.assign(df)
+        rate = rows / (time.perf_counter() - start)
+        results.append({'rows': rows, 'rows_per_sec': rate})
+        print(f"{rows:>12,} rows | vectorized bucketing: {rate:>14,.0f} rows/s")
+
+    df = sample_scores(sqlite_rows)
+    start = time.perf_counter()
+    mismatches = check_sqlite_parity(df, rules)
+    print(f"SQLite round trip on {sqlite_rows:,} rows: {sqlite_rows / (time.perf_counter() - start):,.0f} rows/s")
+    if mismatches:
+        raise SystemExit(f"Parity check failed: {mismatches} mismatching rows")
+    return results
+
+def bench_analytics(rows=10000000, source=None, sqlite_rows=200000, seed=42, batch_size=100000):
+    """
+    Times the ffinance.sql analyses on Arrow (analytics.py) over a Parquet file of
+    `rows` seeded realistic transactions (or `source`), against the same SQL on an
+    in-memory SQLite copy of the first `sqlite_rows` rows, and checks their parity.
+    """
+    import sqlite3
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from analytics import FinanceAnalytics, check_sql_parity, load_queries
+    from synthetic_data import SyntheticTransactionGenerator
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if source is None:
+            source = os.path.join(tmp, "transactions.parquet")
+            writer = None
+            for df in SyntheticTransactionGenerator(rows, seed=seed, chunk_rows=batch_size).iter_batches():
+                table = pa.Table.from_pandas(df, schema=writer.schema if writer else None, preserve_index=False)
+                writer = writer or pq.ParquetWriter(source, table.schema)
+                writer.write_table(table)
+            writer.close()
+
+        analytics = FinanceAnalytics(source)
+        rows = analytics.dataset.count_rows()
+        start = time.perf_counter()
+        analytics.run_all()
+        total = time.perf_counter() - start
+
+        sample = analytics.dataset.head(sqlite_rows).to_pandas()
+        sql_seconds = {}
+        with sqlite3.connect(':memory:') as conn:
+            sample.to_sql('finance', conn, index=False)
+            for name, sql in load_queries().items():
+                start = time.perf_counter()
+                conn.execute(sql).fetchall()
+                sql_seconds[name] = time.perf_counter() - start
+
+    results = []
+    print(f"{'query':<22} {'arrow rows/s':>14} {'sqlite rows/s':>14}")
+    for name, seconds in analytics.timings.items():
+        # The segment rollup is timed against the row-level bucketing query it summarises
+        sql_name = 'risk_bucketing' if name == 'risk_segment_summary' else name
+        sql_rate = len(sample) / sql_seconds[sql_name] if sql_name in sql_seconds else float('nan')
+        results.append({'query': name, 'arrow_rows_per_sec': rows / seconds, 'sqlite_rows_per_sec': sql_rate})
+        print(f"{name:<22} {rows / seconds:>14,.0f} {sql_rate:>14,.0f}")
+    print(f"All analyses on {rows:,} rows: {total:.2f}s (SQLite timed on {len(sample):,} rows)")
+    print(f"Parity with ffinance.sql on {len(sample):,} rows:")
+    if not all(check_sql_parity(sample).values()):
+        raise SystemExit("Parity check failed")
+    return results
+
+async def _http_request(reader, writer, host, method, path, body=None):
+    payload = json.dumps(body).encode() if body is not None else b''
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(payload)}\r\n\r\n".encode() + payload)
+    await writer.drain()
+    await reader.readline()
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        key, _, value = line.decode().partition(':')
+        if key.strip().lower() == 'content-length':
+            length = int(value)
+    return json.loads(await reader.readexactly(length))
+
+async def _load_client(host, port, transactions, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+    for txn in transactions:
+        start = time.perf_counter()
+        await _http_request(reader, writer, host, 'POST', '/score', txn)
+        latencies.append(time.perf_counter() - start)
+    writer.close()
+
+async def _run_load(host, port, concurrency, requests_per_client):
+    df = generate_synthetic_data(rows=concurrency * requests_per_client)
+    records = json.loads(df.to_json(orient='records'))
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        _load_client(host, port, records[i * requests_per_client:(i + 1) * requests_per_client], latencies)
+        for i in range(concurrency)
+    ))
+    elapsed = time.perf_counter() - start
+
+    reader, writer = await asyncio.open_connection(host, port)
+    server_stats = await _http_request(reader, writer, host, 'GET', '/metrics')
+    writer.close()
+
+    latencies = np.array(latencies) * 1000
+    print(f"{len(latencies):,} requests from {concurrency} clients in {elapsed:.2f}s "
+          f"-> {len(latencies) / elapsed:,.0f} req/s")
+    print(f"Client latency p50: {np.percentile(latencies, 50):.2f} ms | p99: {np.percentile(latencies, 99):.2f} ms")
+    print(f"Server stats: {json.dumps(server_stats, indent=2)}")
+    return server_stats
+
+def bench_service(url=None, concurrency=64, requests_per_client=200, max_batch_size=256, max_latency_ms=5.0):
+    """
+    Load generator for the micro-batching scoring service. Targets `url`
+    (host:port) if given, otherwise starts the service in-process.
+    """
+    from scoring_service import MicroBatcher, ScoringServer
+
+    async def main():
+        if url:
+            host, port = url.rsplit(':', 1)
+            return await _run_load(host, int(port), concurrency, requests_per_client)
+        ensure_model_artifacts()
+        server = ScoringServer(MicroBatcher(RiskScoringEngine(), max_batch_size, max_latency_ms), port=0)
+        await server.start()
+        try:
+            return await _run_load(server.host, server.port, concurrency, requests_per_client)
+        finally:
+            await server.stop()
+
+    return asyncio.run(main())
+
+def _export_worker(rows, fmt, path, batch_size):
+    from data_loader import iter_financial_batches
+    from export_to_excel import export_batches
+    from instrumentation import peak_rss_mb
+
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    written = export_batches(iter_financial_batches(batch_size=batch_size, limit=rows, use_synthetic=True), path, fmt=fmt)
+    return written, time.perf_counter() - start, baseline, peak_rss_mb()
+
+def bench_export(rows=3000000, formats=('parquet', 'csv', 'xlsx'), batch_size=50000):
+    """
+    Streams `rows` synthetic rows into each export format and reports wall time and
+    peak RSS. Each format runs in a fresh process so peaks do not carry over.
+    """
+    results = []
+    ctx = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in formats:
+            path = os.path.join(tmp, f"export.{fmt}")
+            with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                written, elapsed, baseline, peak = pool.submit(_export_worker, rows, fmt, path, batch_size).result()
+            size = os.path.getsize(path) / 1024**2
+            results.append({'format': fmt, 'rows': written, 'seconds': elapsed, 'peak_rss_mb': peak})
+            print(f"{fmt:>8} | {written:,} rows in {elapsed:.1f}s ({written / elapsed:,.0f} rows/s) | "
+                  f"peak RSS: {peak:,.1f} MB (after imports: {baseline:,.1f} MB) | file: {size:,.1f} MB")
+    return results
+
+_COLDSTART_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+from risk_score import RiskScoringEngine
+import xgboost
+imported = time.perf_counter()
+if sys.argv[1] == 'bundle':
+    from model_registry import ModelRegistry
+    engine = RiskScoringEngine.from_registry(ModelRegistry(sys.argv[2]))
+else:
+    engine = RiskScoringEngine()
+constructed = time.perf_counter()
+engine.calculate_risk_score(json.loads(sys.argv[3]))
+done = time.perf_counter()
+print(json.dumps([imported - start, constructed - imported, done - constructed]))
+"""
+
+def bench_coldstart(runs=5, registry_dir=None):
+    """
+    Cold start (imports + engine construction) and first-score latency for the
+    joblib pickles vs the native registry bundle, each in a fresh process.
+    """
+    from model_registry import ModelRegistry, REGISTRY_DIR
+    ensure_model_artifacts()
+    registry_dir = registry_dir or REGISTRY_DIR
+    if ModelRegistry(registry_dir).latest_version() is None:
+        import joblib
+        ModelRegistry(registry_dir).save(joblib.load('xgboost_fraud_model.pkl'), joblib.load('preprocessor.pkl'))
+
+    txn = json.dumps(generate_synthetic_data(1).iloc[0].to_dict(), default=str)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [os.path.dirname(os.path.abspath(__file__)),
+                                                                    os.environ.get('PYTHONPATH')])))
+    results = []
+    for source in ('pickle', 'bundle'):
+        timings = []
+        for _ in range(runs):
+            # A bare interpreter per run, so no module or artifact is already imported
+            out = subprocess.run([sys.executable, '-c', _COLDSTART_SCRIPT, source, registry_dir, txn],
+                                 env=env, capture_output=True, text=True, check=True).stdout
+            timings.append(json.loads(out.strip().splitlines()[-1]))
+        imports, construct, first_score = np.median(np.array(timings) * 1000, axis=0)
+        results.append({'source': source, 'imports_ms': imports, 'construct_ms': construct, 'first_score_ms': first_score})
+        print(f"{source:>7} | imports: {imports:,.0f} ms | construct: {construct:,.1f} ms | "
+              f"first score: {first_score:,.1f} ms | ready: {construct + first_score:,.1f} ms (median of {runs})")
+    return results
+
+RESULTS_FILE = os.getenv("FINSAFE_BENCH_RESULTS", "benchmark_results.jsonl")
+SUITE_STAGES = ('ingest', 'preprocess', 'train', 'score', 'export_parquet', 'export_csv')
+
+def _git_revision():
+    try:
+        root = os.path.dirname(os.path.abspath(__file__))
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=root, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return 'unknown'
+
+def _environment():
+    import platform
+    import xgboost as xgb
+    return {'host': platform.node(), 'cpus': os.cpu_count(), 'python': platform.python_version(),
+            'numpy': np.__version__, 'pandas': pd.__version__, 'xgboost': xgb.__version__}
+
+def _timed(func, repeat):
+    """Median wall time of `repeat` calls and the last return value."""
+    timings, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings)), result
+
+def bench_suite(rows=1000000, train_rows=200000, repeat=3, seed=42, batch_size=100000,
+                results_file=RESULTS_FILE, threshold=0.1):
+    """
+    End-to-end throughput on a seeded realistic dataset: ingest (Parquet read through
+    the loader), preprocess (fit_transform), train (XGBoost on `train_rows`), batch
+    score and export. Each stage is the median of `repeat` runs. Results are appended
+    to `results_file` with the git revision, and compared with the previous run on the
+    same host and parameters; drops beyond `threshold` are flagged.
+    Returns (results, regressions).
+    """
+    import joblib
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    import xgboost as xgb
+    from data_loader import iter_financial_batches
+    from export_to_excel import export_batches
+    from preprocessing import FinancialPreprocessor
+    from synthetic_data import SyntheticTransactionGenerator
+    from train_model import XGB_PARAMS
+
+    params = {'rows': rows, 'train_rows': train_rows, 'seed': seed, 'batch_size': batch_size}
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "transactions.parquet")
+        writer = None
+        for df in SyntheticTransactionGenerator(rows, seed=seed, chunk_rows=batch_size).iter_batches():
+            table = pa.Table.from_pandas(df, schema=writer.schema if writer else None, preserve_index=False)
+            writer = writer or pq.ParquetWriter(source, table.schema)
+            writer.write_table(table)
+        writer.close()
+
+        def ingest():
+            return sum(len(batch) for batch in iter_financial_batches(batch_size=batch_size, source_path=source,
+                                                                      use_cache=False))
+        seconds, _ = _timed(ingest, repeat)
+        results['ingest'] = rows / seconds
+
+        train_df = pq.read_table(source).slice(0, train_rows).to_pandas()
+        train_df['is_fraud'] = train_df['is_fraud'].astype(int)
+        preprocessor = FinancialPreprocessor()
+        seconds, clean = _timed(lambda: preprocessor.fit_transform(train_df, target_col='is_fraud'), repeat)
+        results['preprocess'] = len(train_df) / seconds
+
+        X, y = clean.drop(columns=['is_fraud']), clean['is_fraud']
+        seconds, model = _timed(lambda: xgb.XGBClassifier(**XGB_PARAMS).fit(X, y), repeat)
+        results['train'] = len(X) / seconds
+
+        model_path, preprocessor_path = os.path.join(tmp, "model.pkl"), os.path.join(tmp, "preprocessor.pkl")
+        joblib.dump(model, model_path)
+        joblib.dump(preprocessor, preprocessor_path)
+        engine = RiskScoringEngine(model_path=model_path, preprocessor_path=preprocessor_path)
+        score_df = pq.read_table(source).to_pandas()
+        seconds, _ = _timed(lambda: engine.score_batch(score_df, chunk_size=batch_size), repeat)
+        results['score'] = rows / seconds
+        del score_df
+
+        for fmt in ('parquet', 'csv'):
+            path = os.path.join(tmp, f"export.{fmt}")
+            seconds, _ = _timed(lambda: export_batches(
+                iter_financial_batches(batch_size=batch_size, source_path=source, use_cache=False), path, fmt=fmt), repeat)
+            results[f'export_{fmt}'] = rows / seconds
+
+    run = {'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"), 'revision': _git_revision(),
+           'environment': _environment(), 'params': params, 'rows_per_sec': results}
+    previous = [r for r in load_results(results_file)
+                if r['params'] == params and r['environment']['host'] == run['environment']['host']]
+    baseline = previous[-1] if previous else None
+
+    regressions = []
+    print(f"\nRevision {run['revision']} vs {baseline['revision'] + ' (' + baseline['timestamp'] + ')' if baseline else 'no baseline'}")
+    for stage, rate in results.items():
+        line = f"{stage:>15} | {rate:>12,.0f} rows/s"
+        if baseline and stage in baseline['rows_per_sec']:
+            change = rate / baseline['rows_per_sec'][stage] - 1
+            line += f" | {change:+.1%}"
+            if change < -threshold:
+                regressions.append(stage)
+                line += "  <-- REGRESSION"
+        print(line)
+
+    os.makedirs(os.path.dirname(os.path.abspath(results_file)), exist_ok=True)
+    with open(results_file, 'a') as f:
+        f.write(json.dumps(run) + "\n")
+    print(f"Results appended to {os.path.abspath(results_file)}")
+    return results, regressions
+
+def load_results(results_file=RESULTS_FILE):
+    if not os.path.exists(results_file):
+        return []
+    with open(results_file) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def show_history(results_file=RESULTS_FILE, last=10):
+    """
+    Prints rows/sec per stage for the last `last` suite runs, oldest first.
+    """
+    runs = load_results(results_file)[-last:]
+    if not runs:
+        print(f"No results in {results_file}. Run `python src/benchmark.py suite` first.")
+        return
+    print(f"{'revision':>20} {'rows':>10} " + " ".join(f"{stage:>14}" for stage in SUITE_STAGES))
+    for run in runs:
+        rates = " ".join(f"{run['rows_per_sec'].get(stage, float('nan')):>14,.0f}" for stage in SUITE_STAGES)
+        print(f"{run['revision'][:20]:>20} {run['params']['rows']:>10,} {rates}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="FinSafe performance benchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    scoring = subparsers.add_parser("scoring", help="Batch vs per-row risk scoring throughput")
+    scoring.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000], help="Row counts to score")
+    scoring.add_argument("--per-row-max", type=int, default=5000, help="Max rows timed on the per-row path")
+    scoring.add_argument("--chunk-size", type=int, default=100000, help="Rows per score_batch chunk")
+
+    explain = subparsers.add_parser("explain", help="Cost of batched per-feature explanations vs plain scoring")
+    explain.add_argument("--sizes", type=int, nargs="+", default=[100000, 1000000], help="Row counts to explain")
+    explain.add_argument("--exact-rows", type=int, default=1000, help="Rows timed with exact TreeSHAP")
+    explain.add_argument("--chunk-size", type=int, default=100000, help="Rows per chunk")
+
+    bucketing = subparsers.add_parser("bucketing", help="Vectorized risk bucketing throughput and SQLite parity")
+    bucketing.add_argument("--sizes", type=int, nargs="+", default=[1000000, 10000000], help="Row counts to bucket")
+    bucketing.add_argument("--sqlite-rows", type=int, default=200000, help="Rows used for the SQLite parity check")
+
+    analytics = subparsers.add_parser("analytics", help="ffinance.sql analyses on Arrow vs SQLite, with parity check")
+    analytics.add_argument("--rows", type=int, default=10000000, help="Seeded realistic rows to generate")
+    analytics.add_argument("--source", type=str, default=None, help="Parquet file to use instead of generated data")
+    analytics.add_argument("--sqlite-rows", type=int, default=200000, help="Rows loaded into SQLite for timing and parity")
+    analytics.add_argument("--seed", type=int, default=42, help="Generator seed")
+
+    service = subparsers.add_parser("service", help="Load test the micro-batching scoring service")
+    service.add_argument("--url", type=str, default=None, help="host:port of a running service (default: start one in-process)")
+    service.add_argument("--concurrency", type=int, default=64, help="Concurrent keep-alive clients")
+    service.add_argument("--requests", type=int, default=200, help="Requests per client")
+    service.add_argument("--max-batch-size", type=int, default=256, help="In-process service batch size")
+    service.add_argument("--max-latency-ms", type=float, default=5.0, help="In-process service flush deadline")
+
+    export = subparsers.add_parser("export", help="Streaming export throughput and peak memory")
+    export.add_argument("--rows", type=int, default=3000000, help="Rows to export")
+    export.add_argument("--formats", nargs="+", default=['parquet', 'csv', 'xlsx'], help="Formats to benchmark")
+    export.add_argument("--batch-size", type=int, default=50000, help="Rows per streamed chunk")
+
+    coldstart = subparsers.add_parser("coldstart", help="Startup and first-score latency: pickles vs registry bundle")
+    coldstart.add_argument("--runs", type=int, default=5, help="Fresh processes per artifact source")
+    coldstart.add_argument("--registry", type=str, default=None, help="Registry directory (default: models/)")
+
+    suite = subparsers.add_parser("suite", help="End-to-end throughput on seeded realistic data, tracked across revisions")
+    suite.add_argument("--rows", type=int, default=1000000, help="Rows in the generated dataset")
+    suite.add_argument("--train-rows", type=int, default=200000, help="Rows used for preprocess/train")
+    suite.add_argument("--repeat", type=int, default=3, help="Runs per stage (median is reported)")
+    suite.add_argument("--seed", type=int, default=42, help="Generator seed")
+    suite.add_argument("--results", type=str, default=RESULTS_FILE, help="JSON-lines results history")
+    suite.add_argument("--threshold", type=float, default=0.1, help="Flag throughput drops larger than this fraction")
+    suite.add_argument("--fail-on-regression", action="store_true", help="Exit non-zero if a stage regressed")
+
+    history = subparsers.add_parser("history", help="Show suite results across revisions")
+    history.add_argument("--results", type=str, default=RESULTS_FILE, help="JSON-lines results history")
+    history.add_argument("--last", type=int, default=10, help="Runs to show")
+
+    args = parser.parse_args()
+
+    if args.benchmark == "scoring":
+        bench_scoring(sizes=args.sizes, per_row_max=args.per_row_max, chunk_size=args.chunk_size)
+    elif args.benchmark == "explain":
+        bench_explain(sizes=args.sizes, exact_rows=args.exact_rows, chunk_size=args.chunk_size)
+    elif args.benchmark == "bucketing":
+        bench_bucketing(sizes=args.sizes, sqlite_rows=args.sqlite_rows)
+    elif args.benchmark == "analytics":
+        bench_analytics(rows=args.rows, source=args.source, sqlite_rows=args.sqlite_rows, seed=args.seed)
+    elif args.benchmark == "service":
+        bench_service(url=args.url, concurrency=args.concurrency, requests_per_client=args.requests,
+                      max_batch_size=args.max_batch_size, max_latency_ms=args.max_latency_ms)
+    elif args.benchmark == "export":
+        bench_export(rows=args.rows, formats=args.formats, batch_size=args.batch_size)
+    elif args.benchmark == "coldstart":
+        bench_coldstart(runs=args.runs, registry_dir=args.registry)
+    elif args.benchmark == "suite":
+        _, regressions = bench_suite(rows=args.rows, train_rows=args.train_rows, repeat=args.repeat, seed=args.seed,
+                                     results_file=args.results, threshold=args.threshold)
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+    elif args.benchmark == "history":
+        show_history(results_file=args.results, last=args.last)
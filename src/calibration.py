@@ -0,0 +1,129 @@
+import json
+import numpy as np
+
+CALIBRATION_METHODS = ('isotonic', 'platt')
+# Review/monitor targets for the cutoffs picked on the validation split
+PRECISION_TARGET = 0.9
+RECALL_TARGET = 0.8
+# Score cutoffs (0-100) used when a model has no calibration
+DEFAULT_CUTOFFS = {'high': 70.0, 'medium': 40.0}
+
+def _logit(prob):
+    prob = np.clip(np.asarray(prob, dtype='float64'), 1e-7, 1 - 1e-7)
+    return np.log(prob / (1 - prob))
+
+class Calibration:
+    """
+    Calibrated fraud probabilities and the score cutoffs picked from them.
+
+    Fitted on held-out rows: 'isotonic' learns a monotone step function of the raw
+    probability, 'platt' a logistic regression on its log-odds. Either is stored as
+    plain numbers (breakpoints or two coefficients) and applied with NumPy, so model
+    bundles stay pickle-free and scoring does not need scikit-learn.
+
+    Cutoffs are on the 0-100 risk score (100 x calibrated probability):
+    'high' is the lowest cutoff whose precision reaches the precision target (alerts
+    worth a manual review), 'medium' the highest whose recall still reaches the recall
+    target (accounts worth monitoring).
+    """
+    def __init__(self, method='isotonic', x=None, y=None, coef=(1.0, 0.0), cutoffs=None, stats=None):
+        if method not in CALIBRATION_METHODS:
+            raise ValueError(f"method must be one of {CALIBRATION_METHODS}")
+        self.method = method
+        self.x = np.asarray(x if x is not None else [0.0, 1.0], dtype='float64')
+        self.y = np.asarray(y if y is not None else [0.0, 1.0], dtype='float64')
+        self.coef = tuple(float(c) for c in coef)
+        self.cutoffs = dict(cutoffs or DEFAULT_CUTOFFS)
+        self.stats = stats or {}
+
+    @classmethod
+    def fit(cls, y_true, prob, method='isotonic', precision_target=PRECISION_TARGET, recall_target=RECALL_TARGET):
+        """
+        Fits the calibration map on validation labels and raw probabilities, then picks
+        the cutoffs on the calibrated probabilities. Returns None if the labels hold a
+        single class (nothing to calibrate against).
+        """
+        y_true = np.asarray(y_true).astype(int)
+        prob = np.asarray(prob, dtype='float64')
+        if len(np.unique(y_true)) < 2:
+            return None
+        if method == 'isotonic':
+            from sklearn.isotonic import IsotonicRegression
+            iso = IsotonicRegression(y_min=0.0, y_max=1.0, out_of_bounds='clip').fit(prob, y_true)
+            calibration = cls('isotonic', x=iso.X_thresholds_, y=iso.y_thresholds_)
+        elif method == 'platt':
+            from sklearn.linear_model import LogisticRegression
+            platt = LogisticRegression(C=1e6).fit(_logit(prob).reshape(-1, 1), y_true)
+            calibration = cls('platt', coef=(platt.coef_[0, 0], platt.intercept_[0]))
+        else:
+            raise ValueError(f"method must be one of {CALIBRATION_METHODS}")
+        calibration.cutoffs, calibration.stats = choose_cutoffs(y_true, calibration.transform(prob),
+                                                                precision_target, recall_target)
+        return calibration
+
+    def transform(self, prob):
+        """
+        Calibrated probabilities for an array of raw model probabilities.
+        """
+        if self.method == 'isotonic':
+            return np.interp(np.asarray(prob, dtype='float64'), self.x, self.y)
+        a, b = self.coef
+        return 1 / (1 + np.exp(-(a * _logit(prob) + b)))
+
+    def to_dict(self):
+        return {'method': self.method, 'x': self.x.tolist(), 'y': self.y.tolist(), 'coef': list(self.coef),
+                'cutoffs': self.cutoffs, 'stats': self.stats}
+
+    @classmethod
+    def from_dict(cls, data):
+        if not data:
+            return None
+        return cls(data['method'], data.get('x'), data.get('y'), data.get('coef', (1.0, 0.0)),
+                   data.get('cutoffs'), data.get('stats'))
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+def choose_cutoffs(y_true, prob, precision_target=PRECISION_TARGET, recall_target=RECALL_TARGET):
+    """
+    Picks 'high' and 'medium' score cutoffs (0-100) from validation labels and
+    probabilities. When a target is out of reach, 'high' falls back to the most precise
+    cutoff and 'medium' to the lowest one. Returns (cutoffs, stats) where stats holds
+    the precision and recall achieved at each cutoff.
+    """
+    from sklearn.metrics import precision_recall_curve
+    precision, recall, thresholds = precision_recall_curve(y_true, prob)
+    precision, recall = precision[:-1], recall[:-1]  # aligned with thresholds (ascending)
+
+    meets = np.flatnonzero(precision >= precision_target)
+    high = meets[0] if len(meets) else int(np.argmax(precision))
+    meets = np.flatnonzero(recall >= recall_target)
+    medium = min(meets[-1] if len(meets) else 0, high)
+
+    cutoffs = {'high': float(thresholds[high] * 100), 'medium': float(thresholds[medium] * 100)}
+    stats = {
+        'precision_target': precision_target, 'recall_target': recall_target,
+        'high_precision': float(precision[high]), 'high_recall': float(recall[high]),
+        'medium_precision': float(precision[medium]), 'medium_recall': float(recall[medium]),
+        'validation_rows': int(len(y_true)),
+    }
+    return cutoffs, stats
+
+def calibration_report(calibration):
+    """
+    Prints the cutoffs and the precision/recall they achieved on the validation split.
+    """
+    stats = calibration.stats
+    print(f"Calibration ({calibration.method}) on {stats.get('validation_rows', 0):,} validation rows:")
+    for level, metric in (('high', 'precision'), ('medium', 'recall')):
+        target = stats.get(f'{metric}_target', float('nan'))
+        missed = "" if stats.get(f'{level}_{metric}', 0) >= target else ", target not reached"
+        print(f"  {level:<6} score >= {calibration.cutoffs[level]:6.2f} ({metric} >= {target}{missed}): "
+              f"precision {stats.get(f'{level}_precision', float('nan')):.3f}, "
+              f"recall {stats.get(f'{level}_recall', float('nan')):.3f}")
@@ -1,22 +1,34 @@
 import pandas as pd
 from datasets import load_dataset
+import hashlib
 import os
+import re
 import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+from instrumentation import instrumented, row_count
 
 # Fix for Windows symlink warning/error
 os.environ["HF_HUB_DISABLE_SYMLINKS_WARNING"] = "1"
 
-def generate_synthetic_data(rows=1000):
-    """Generates synthetic data for testing."""
+DATASET_NAME = "electricsheepafrica/Nigerian-Financial-Transactions-and-Fraud-Detection-Dataset"
+CACHE_DIR = os.getenv("FINSAFE_CACHE_DIR", ".finsafe_cache")
+DEFAULT_BATCH_SIZE = 50000
+
+def generate_synthetic_data(rows=1000, start_index=0):
+    """Generates synthetic data for testing.
+    start_index offsets the generated account names so consecutive chunks stay unique."""
     print("Generating synthetic data...")
+    ids = range(start_index, start_index + rows)
     data = {
         'step': np.random.randint(1, 100, rows),
         'type': np.random.choice(['PAYMENT', 'TRANSFER', 'CASH_OUT', 'DEBIT', 'CASH_IN'], rows),
         'amount': np.random.uniform(10, 100000, rows),
-        'nameOrig': [f'C{i}' for i in range(rows)],
+        'nameOrig': [f'C{i}' for i in ids],
         'oldbalanceOrg': np.random.uniform(0, 100000, rows),
         'newbalanceOrig': np.random.uniform(0, 100000, rows),
-        'nameDest': [f'M{i}' for i in range(rows)],
+        'nameDest': [f'M{i}' for i in ids],
         'oldbalanceDest': np.random.uniform(0, 100000, rows),
         'newbalanceDest': np.random.uniform(0, 100000, rows),
         'isFraud': np.random.choice([0, 1], rows, p=[0.95, 0.05]),
@@ -24,36 +36,222 @@ def generate_synthetic_data(rows=1000):
     }
     return pd.DataFrame(data)
 
-def load_financial_data(limit=None, use_synthetic=False):
+def optimize_dtypes(df, max_categories=1000, category_ratio=0.5, float_tolerance=0.005):
+    """
+    Returns a memory-compact copy of a transactions frame:
+    - bool flags -> uint8
+    - integers -> the smallest signed type that holds them (int8..int32)
+    - floats -> float32 when every value round-trips within `float_tolerance`
+      (0.005 keeps kobo-exact amounts in float64 once they outgrow float32's precision)
+    - strings with at most `max_categories` distinct values (and at most `category_ratio`
+      of the rows) -> category; other strings (IDs, timestamps) -> Arrow-backed strings
+    """
+    out = {}
+    for col in df.columns:
+        values = df[col]
+        dtype = values.dtype
+        if pd.api.types.is_bool_dtype(dtype):
+            out[col] = values.astype('uint8')
+        elif pd.api.types.is_integer_dtype(dtype):
+            out[col] = pd.to_numeric(values, downcast='integer') if values.notna().all() else values
+        elif pd.api.types.is_float_dtype(dtype) and dtype != np.float32:
+            compact = values.astype('float32')
+            error = np.abs(compact.to_numpy(dtype='float64') - values.to_numpy(dtype='float64'))
+            out[col] = compact if np.nanmax(error, initial=0.0) <= float_tolerance else values
+        elif pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype):
+            # A sample rules out ID-like columns without hashing every row
+            sample = values.iloc[:100000]
+            distinct = sample.nunique(dropna=True)
+            if distinct <= max_categories:
+                distinct = values.nunique(dropna=True)
+            if distinct <= max_categories and distinct <= category_ratio * len(values):
+                out[col] = values.astype('category')
+            elif getattr(dtype, 'storage', None) == 'pyarrow':
+                out[col] = values
+            else:
+                out[col] = values.astype('string[pyarrow]')
+        else:
+            out[col] = values
+    return pd.DataFrame(out, index=df.index)
+
+def memory_report(before, after):
+    """
+    Per-column dtype and memory (MB) of a frame before and after optimize_dtypes, plus a TOTAL row.
+    """
+    mb_before = before.memory_usage(deep=True, index=False) / 1024**2
+    mb_after = after.memory_usage(deep=True, index=False) / 1024**2
+    report = pd.DataFrame({
+        'dtype_before': before.dtypes.astype(str),
+        'dtype_after': after.dtypes.astype(str),
+        'mb_before': mb_before,
+        'mb_after': mb_after,
+    })
+    report.loc['TOTAL'] = ['', '', mb_before.sum(), mb_after.sum()]
+    report['reduction'] = 1 - report['mb_after'] / report['mb_before'].where(report['mb_before'] > 0)
+    return report.round(3)
+
+def get_cache_path(dataset_name=DATASET_NAME, split="train", limit=None, cache_dir=None):
+    """
+    Returns the Parquet cache file for a (dataset, split, limit) combination.
+    """
+    safe_name = re.sub(r'[^A-Za-z0-9_.-]+', '_', dataset_name)
+    return os.path.join(cache_dir or CACHE_DIR, f"{safe_name}__{split}__{limit if limit else 'all'}.parquet")
+
+def source_cache_name(source_path):
+    """
+    Cache and stream key of a local file: its name, a hash of its absolute path (so
+    same-named files in different directories differ) and its size and modification
+    time in nanoseconds (so edits, even within the same second, invalidate the key).
+    """
+    stat = os.stat(source_path)
+    path_hash = hashlib.sha1(os.path.abspath(source_path).encode()).hexdigest()[:8]
+    return f"{os.path.basename(source_path)}-{path_hash}-{stat.st_size}-{stat.st_mtime_ns}"
+
+def _iter_file_batches(source_path, batch_size):
+    """Yields Arrow record batches from a local Parquet or CSV file."""
+    if source_path.endswith('.parquet'):
+        yield from pq.ParquetFile(source_path, memory_map=True).iter_batches(batch_size=batch_size)
+    else:
+        yield from pacsv.open_csv(source_path)
+
+def _iter_hub_batches(dataset_name, split, batch_size):
+    """Yields Arrow record batches streamed from the Hugging Face Hub."""
+    dataset = load_dataset(dataset_name, split=split, streaming=True).with_format("arrow")
+    for table in dataset.iter(batch_size=batch_size):
+        yield from table.to_batches()
+
+def _rebatch(batches, batch_size, limit=None):
+    """Re-slices a stream of record batches into exactly `batch_size` rows (last one may be short)."""
+    pending, pending_rows, emitted = [], 0, 0
+    for batch in batches:
+        if limit:
+            batch = batch.slice(0, limit - emitted - pending_rows)
+        pending.append(batch)
+        pending_rows += batch.num_rows
+        while pending_rows >= batch_size:
+            table = pa.Table.from_batches(pending).combine_chunks()
+            yield table.slice(0, batch_size).to_batches()[0]
+            emitted += batch_size
+            rest = table.slice(batch_size)
+            pending = rest.to_batches() if rest.num_rows else []
+            pending_rows = rest.num_rows
+        if limit and emitted + pending_rows >= limit:
+            break
+    if pending_rows:
+        yield pa.Table.from_batches(pending).combine_chunks().to_batches()[0]
+
+def iter_financial_batches(batch_size=DEFAULT_BATCH_SIZE, limit=None, use_synthetic=False, source_path=None,
+                           dataset_name=DATASET_NAME, split="train", use_cache=True, as_arrow=False,
+                           realistic=False, seed=42, store=None):
+    """
+    Streams the dataset in typed batches without materializing it.
+    Args:
+        batch_size (int): Rows per yielded batch.
+        limit (int, optional): Stop after this many rows. None streams everything.
+        use_synthetic (bool): If True, yield generated data instead.
+        source_path (str, optional): Local Parquet/CSV file to read instead of the Hub (works offline).
+        use_cache (bool): Serve from / populate the local Parquet cache keyed by dataset, split and limit.
+        as_arrow (bool): Yield pyarrow RecordBatches instead of pandas DataFrames.
+        realistic (bool): With use_synthetic, generate the real dataset's schema with
+                          power-law account activity (synthetic_data.py), seeded by `seed`.
+        store (AccountStore, optional): Also append every batch to this drill-down store
+                                        (account_store.py) as it streams past.
+    """
+    if store is not None:
+        for batch in iter_financial_batches(batch_size, limit, use_synthetic, source_path, dataset_name, split,
+                                            use_cache, as_arrow, realistic, seed):
+            store.append(batch)
+            yield batch
+        return
+    if use_synthetic and realistic:
+        from synthetic_data import SyntheticTransactionGenerator
+        generator = SyntheticTransactionGenerator(limit if limit else 1000, seed=seed, chunk_rows=batch_size)
+        for df in generator.iter_batches():
+            yield pa.RecordBatch.from_pandas(df, preserve_index=False) if as_arrow else df
+        return
+    if use_synthetic:
+        total = limit if limit else 1000
+        for start in range(0, total, batch_size):
+            df = generate_synthetic_data(rows=min(batch_size, total - start), start_index=start)
+            yield pa.RecordBatch.from_pandas(df, preserve_index=False) if as_arrow else df
+        return
+
+    if source_path is not None:
+        dataset_name = source_cache_name(source_path)
+    cache_file = get_cache_path(dataset_name, split, limit)
+
+    write_cache = use_cache and not os.path.exists(cache_file)
+    if use_cache and not write_cache:
+        batches = _rebatch(pq.ParquetFile(cache_file, memory_map=True).iter_batches(batch_size=batch_size), batch_size)
+    elif source_path is not None:
+        batches = _rebatch(_iter_file_batches(source_path, batch_size), batch_size, limit)
+    else:
+        batches = _rebatch(_iter_hub_batches(dataset_name, split, batch_size), batch_size, limit)
+
+    writer = None
+    tmp_file = cache_file + ".tmp"
+    completed = False
+    try:
+        for batch in batches:
+            if write_cache:
+                if writer is None:
+                    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+                    writer = pq.ParquetWriter(tmp_file, batch.schema)
+                writer.write_batch(batch)
+            yield batch if as_arrow else batch.to_pandas()
+        completed = True
+    finally:
+        if writer is not None:
+            writer.close()
+            # Only a fully consumed stream becomes a cache entry
+            if completed:
+                os.replace(tmp_file, cache_file)
+            else:
+                os.remove(tmp_file)
+
+def _optimized(df, report):
+    compact = optimize_dtypes(df)
+    if report:
+        print(memory_report(df, compact).to_string())
+    return compact
+
+@instrumented(rows=row_count)
+def load_financial_data(limit=None, use_synthetic=False, source_path=None, use_cache=True, optimize=True,
+                        report=False):
     """
     Loads the Nigerian Financial Transactions and Fraud Detection Dataset.
     Args:
         limit (int, optional): If set, only load this many rows using streaming. 
-                               Defaults to 10,000 to avoid crash on Windows.
+                               Defaults to 50,000 to avoid crash on Windows. 0 loads everything.
         use_synthetic (bool): If True, use generated data.
+        source_path (str, optional): Local Parquet/CSV file to load instead of the Hub.
+        use_cache (bool): Reuse the local Parquet cache; repeat loads are memory-mapped reads.
+        optimize (bool): Downcast to compact dtypes (see optimize_dtypes).
+        report (bool): Print per-column memory before/after optimization.
     """
     if limit is None:
         limit = 50000 # Safety default for Windows
 
     if use_synthetic:
-        return generate_synthetic_data(rows=limit if limit else 1000)
+        df = generate_synthetic_data(rows=limit if limit else 1000)
+        return _optimized(df, report) if optimize else df
 
     print("Loading dataset...")
     try:
-        if limit:
-            print(f"Streaming mode enabled: Loading first {limit} rows...")
-            dataset = load_dataset("electricsheepafrica/Nigerian-Financial-Transactions-and-Fraud-Detection-Dataset", split="train", streaming=True)
-            # Take first 'limit' rows
-            data_head = dataset.take(limit)
-            df = pd.DataFrame(list(data_head))
+        dataset_name = source_cache_name(source_path) if source_path is not None else DATASET_NAME
+        cache_file = get_cache_path(dataset_name, "train", limit)
+
+        if use_cache and os.path.exists(cache_file):
+            print(f"Reading cached dataset from {cache_file}...")
+            df = pq.read_table(cache_file, memory_map=True).to_pandas()
         else:
-            # Full load (downloads files)
-            dataset = load_dataset("electricsheepafrica/Nigerian-Financial-Transactions-and-Fraud-Detection-Dataset")
-            if 'train' in dataset:
-                df = dataset['train'].to_pandas()
-            else:
-                df = dataset[list(dataset.keys())[0]].to_pandas()
+            print(f"Streaming mode enabled: Loading {f'first {limit}' if limit else 'all'} rows...")
+            batches = list(iter_financial_batches(limit=limit or None, source_path=source_path,
+                                                  use_cache=use_cache, as_arrow=True))
+            df = pa.Table.from_batches(batches).to_pandas() if batches else pd.DataFrame()
             
+        if optimize:
+            df = _optimized(df, report)
         print(f"Dataset loaded successfully with shape: {df.shape}")
         return df
     except Exception as e:
@@ -61,7 +259,7 @@ def load_financial_data(limit=None, use_synthetic=False):
         return None
 
 if __name__ == "__main__":
-    df = load_financial_data()
+    df = load_financial_data(report=True)
     if df is not None:
         print(df.head())
         # Save a sample for quick inspection
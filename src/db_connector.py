@@ -1,17 +1,30 @@
 import pandas as pd
-from sqlalchemy import create_engine, event
+from sqlalchemy import create_engine, event, inspect, text, Index, MetaData, Table
 from urllib.parse import quote_plus
-from data_loader import load_financial_data
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from data_loader import iter_financial_batches, source_cache_name
+from instrumentation import instrumented, row_count
+from dedup import Deduplicator, source_key
+import argparse
+import hashlib
 import os
+import time
 from dotenv import load_dotenv
 
 # Load credentials from .env
 load_dotenv()
 
-def get_engine():
+UPLOAD_MODES = ('replace', 'append', 'upsert')
+
+def get_engine(url=None, pool_size=5):
     """
     Creates a SQLAlchemy engine for SQL Server.
+    Pass a SQLAlchemy `url` (e.g. sqlite:///local.db) to target another database instead.
     """
+    if url is not None:
+        return create_engine(url)
+
     server = os.getenv("DB_SERVER")
     database = os.getenv("DB_DATABASE")
     username = os.getenv("DB_USERNAME")
@@ -25,37 +38,229 @@ def get_engine():
         conn_str = f"DRIVER={{{driver}}};SERVER={server};DATABASE={database};UID={username};PWD={password};"
 
     params = quote_plus(conn_str)
-    engine = create_engine(f"mssql+pyodbc:///?odbc_connect={params}")
+    engine = create_engine(f"mssql+pyodbc:///?odbc_connect={params}", pool_size=pool_size)
     return engine
 
-def upload_to_sql(limit=5000, use_synthetic=True, table_name="NigerianTransactions"):
+def _enable_fast_executemany(engine):
+    # Optimize upload with fast_executemany (pyodbc only)
+    if engine.dialect.name != 'mssql':
+        return
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def receive_before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if executemany:
+            cursor.fast_executemany = True
+
+def _progress_table(table_name):
+    return f"{table_name}_load_progress"
+
+def _committed_chunks(engine, table_name, run_id):
+    """Chunk indices of `run_id` already committed to `table_name`."""
+    progress = _progress_table(table_name)
+    if not inspect(engine).has_table(progress):
+        return set()
+    with engine.connect() as conn:
+        rows = conn.execute(text(f"SELECT chunk_index FROM {progress} WHERE run_id = :run_id"), {'run_id': run_id})
+        return {row[0] for row in rows}
+
+def _clear_progress(engine, table_name, run_id):
+    """Forgets `run_id`'s committed chunks once the load is complete; resume is for interrupted loads."""
+    progress = _progress_table(table_name)
+    if not inspect(engine).has_table(progress):
+        return
+    with engine.begin() as conn:
+        conn.execute(text(f"DELETE FROM {progress} WHERE run_id = :run_id"), {'run_id': run_id})
+
+def _prepare_tables(engine, first_chunk, table_name, mode, key, run_id):
+    """Creates the target and progress tables before workers start writing."""
+    progress = _progress_table(table_name)
+    with engine.begin() as conn:
+        if mode == 'replace':
+            first_chunk.head(0).to_sql(table_name, conn, if_exists='replace', index=False)
+            if inspect(conn).has_table(progress):
+                conn.execute(text(f"DELETE FROM {progress} WHERE run_id = :run_id"), {'run_id': run_id})
+        elif not inspect(conn).has_table(table_name):
+            first_chunk.head(0).to_sql(table_name, conn, index=False)
+        pd.DataFrame({'run_id': pd.Series(dtype='str'), 'chunk_index': pd.Series(dtype='int64'),
+                      'row_count': pd.Series(dtype='int64')}).to_sql(progress, conn, if_exists='append', index=False)
+
+    if mode == 'upsert':
+        try:
+            table = Table(table_name, MetaData(), autoload_with=engine)
+            Index(f"ix_{table_name}_{key}", table.c[key]).create(engine, checkfirst=True)
+        except Exception as e:
+            print(f"Could not index '{key}' (upserts will scan the table): {e}")
+
+def _write_chunk(engine, chunk, chunk_index, table_name, mode, key, run_id):
+    """
+    Writes one chunk and records it in the progress table in the same transaction,
+    so a chunk is either fully committed and recorded or not at all.
     """
-    Loads data and uploads it to SQL Server in batches.
+    with engine.begin() as conn:
+        if mode == 'upsert':
+            chunk = chunk.drop_duplicates(subset=[key], keep='last')
+            staging = f"{table_name}_stage_{chunk_index}"
+            chunk.to_sql(staging, conn, if_exists='replace', index=False)
+            conn.execute(text(f"DELETE FROM {table_name} WHERE {key} IN (SELECT {key} FROM {staging})"))
+            columns = ", ".join(chunk.columns)
+            conn.execute(text(f"INSERT INTO {table_name} ({columns}) SELECT {columns} FROM {staging}"))
+            conn.execute(text(f"DROP TABLE {staging}"))
+        else:
+            chunk.to_sql(table_name, conn, if_exists='append', index=False)
+        conn.execute(text(f"INSERT INTO {_progress_table(table_name)} (run_id, chunk_index, row_count) "
+                          f"VALUES (:run_id, :chunk_index, :row_count)"),
+                     {'run_id': run_id, 'chunk_index': chunk_index, 'row_count': len(chunk)})
+    return len(chunk)
+
+def bulk_upload(batches, engine, table_name="NigerianTransactions", mode='append', key='transaction_id',
+                workers=4, run_id='default', resume=True, dedup=None, source=None):
+    """
+    Writes a stream of DataFrame chunks over a pool of connections in parallel.
+    Args:
+        batches: iterable of DataFrames (e.g. iter_financial_batches). Chunk order must be
+                 deterministic for resume to skip the right chunks.
+        engine: SQLAlchemy engine (SQL Server via get_engine(), or SQLite etc. for local runs).
+        mode (str): 'replace' recreates the table, 'append' inserts, 'upsert' replaces rows by `key`
+                    (applied on one connection, in stream order).
+        workers (int): Concurrent connections writing chunks.
+        run_id (str): Identifies this load in the progress table.
+        resume (bool): Skip chunks of `run_id` that were already committed by an interrupted
+                       load; a completed load clears its progress, so running it again writes everything.
+        dedup (Deduplicator, optional): Write only rows this target has not seen (dedup.py);
+                                        a chunk's keys are committed once it and every earlier
+                                        chunk are written.
+                                        Not allowed with 'upsert', which must see known keys.
+        source (str, optional): Stream key for the dedup high-water mark (see dedup.source_key).
+    Returns the number of rows written.
+    """
+    if mode not in UPLOAD_MODES:
+        raise ValueError(f"mode must be one of {UPLOAD_MODES}")
+    if dedup is not None and mode == 'upsert':
+        # Dedup drops every key seen before, so no row could ever be updated
+        raise ValueError("dedup cannot be combined with upsert; use append or replace")
+    if mode == 'upsert' and workers > 1:
+        # Chunks with overlapping keys on parallel connections could both insert; one
+        # connection applies them in stream order, so the last occurrence of a key wins
+        print("Upserts are applied on a single connection, in stream order")
+        workers = 1
+    _enable_fast_executemany(engine)
+
+    done = _committed_chunks(engine, table_name, run_id) if resume and mode != 'replace' else set()
+    if done:
+        print(f"Resuming run '{run_id}': skipping {len(done)} committed chunks")
+    if dedup is not None and mode == 'replace':
+        dedup.reset()
+
+    written, start, pending = 0, time.perf_counter(), set()
+    # One entry per filtered chunk, in stream order: its write future, or None if nothing to write
+    in_order = deque()
+
+    def commit_written():
+        # Record chunks' keys with the deduplicator once they, and every chunk before them, are stored
+        while in_order and (in_order[0] is None or (in_order[0].done() and in_order[0].exception() is None)):
+            in_order.popleft()
+            dedup.commit(1)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        try:
+            for chunk_index, chunk in enumerate(batches):
+                if dedup is not None:
+                    # Committed chunks are filtered too, so a resumed run re-learns their keys
+                    chunk = dedup.filter(chunk, source)
+                if chunk_index == 0:
+                    if mode == 'upsert' and key not in chunk.columns:
+                        raise ValueError(f"Upsert key '{key}' is not a column of the data")
+                    _prepare_tables(engine, chunk, table_name, mode, key, run_id)
+                if chunk_index in done or len(chunk) == 0:
+                    if dedup is not None:
+                        in_order.append(None)
+                        commit_written()
+                    continue
+                # Keep at most 2 chunks per worker in memory
+                if len(pending) >= workers * 2:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        written += future.result()
+                    print(f"Uploaded {written:,} rows ({written / (time.perf_counter() - start):,.0f} rows/s)")
+                future = pool.submit(_write_chunk, engine, chunk, chunk_index, table_name, mode, key, run_id)
+                pending.add(future)
+                if dedup is not None:
+                    in_order.append(future)
+                    commit_written()
+            for future in pending:
+                written += future.result()
+            if dedup is not None:
+                commit_written()
+        except Exception:
+            for future in pending:
+                future.cancel()
+            if dedup is not None:
+                # Keep the keys of chunks that did land; the high-water mark stops at the first that did not
+                wait(pending)
+                stored_prefix = True
+                while in_order:
+                    future = in_order.popleft()
+                    if future is None or (not future.cancelled() and future.exception() is None):
+                        dedup.commit(1, watermark=stored_prefix)
+                    else:
+                        dedup.discard(1)
+                        stored_prefix = False
+                dedup.rollback()
+            raise
+    _clear_progress(engine, table_name, run_id)
+    if dedup is not None:
+        dedup.report()
+
+    elapsed = time.perf_counter() - start
+    print(f"Uploaded {written:,} rows to '{table_name}' in {elapsed:.2f}s ({written / max(elapsed, 1e-9):,.0f} rows/s)")
+    return written
+
+@instrumented(rows=row_count)
+def upload_to_sql(limit=5000, use_synthetic=True, table_name="NigerianTransactions", mode='replace',
+                  workers=4, batch_size=10000, source_path=None, engine=None, run_id=None, dedup=False):
+    """
+    Streams data in batches and uploads it to SQL Server (or `engine`) in parallel.
+    With `dedup`, rows already uploaded to this table by earlier runs are skipped.
+    Returns the number of rows written (None on failure).
     """
     print(f"Loading data to upload (Limit: {limit}, Synthetic: {use_synthetic})...")
-    df = load_financial_data(limit=limit, use_synthetic=use_synthetic)
-    
-    if df is None:
-        return
+    batches = iter_financial_batches(batch_size=batch_size, limit=limit, use_synthetic=use_synthetic,
+                                     source_path=source_path)
 
     print(f"Connecting to database...")
     try:
-        engine = get_engine()
-        
-        # Optimize upload with fast_executemany
-        @event.listens_for(engine, "before_cursor_execute")
-        def receive_before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
-            if executemany:
-                cursor.fast_executemany = True
-
-        print(f"Uploading {len(df)} rows to table '{table_name}'...")
-        df.to_sql(table_name, engine, if_exists='replace', index=False, chunksize=1000)
+        engine = engine or get_engine(pool_size=workers)
+        print(f"Uploading to table '{table_name}' (mode: {mode}, workers: {workers})...")
+        # A file's run changes with its content, so an edited file is never skipped as resumed
+        source_name = source_cache_name(source_path) if source_path else ('synthetic' if use_synthetic else 'hub')
+        # One dedup state per database and table (str(url) masks the password)
+        target = f"{table_name}-{hashlib.sha1(str(engine.url).encode()).hexdigest()[:8]}"
+        written = bulk_upload(batches, engine, table_name=table_name, mode=mode, workers=workers,
+                    run_id=run_id or f"{source_name}-{limit}",
+                    # Generated data differs on every run, so its chunks cannot be matched for resume
+                    resume=not use_synthetic,
+                    dedup=Deduplicator(target) if dedup else None,
+                    source=source_key(source_path, use_synthetic))
         print("✅ Data uploaded successfully!")
-        
+        return written
+
     except Exception as e:
         print(f"❌ Error during database upload: {e}")
         print("\nTip: Make sure you have the 'ODBC Driver for SQL Server' installed and the server details correct in .env")
 
 if __name__ == "__main__":
-    # Note: This will fail until .env is populated with real details
-    upload_to_sql(limit=1000, use_synthetic=True)
+    parser = argparse.ArgumentParser(description="Upload transactions to SQL Server")
+    parser.add_argument("--limit", type=int, default=1000, help="Number of rows to upload")
+    parser.add_argument("--real", action="store_true", help="Use real data instead of synthetic")
+    parser.add_argument("--mode", choices=UPLOAD_MODES, default="replace", help="replace, append or upsert by transaction_id")
+    parser.add_argument("--workers", type=int, default=4, help="Parallel connections")
+    parser.add_argument("--batch-size", type=int, default=10000, help="Rows per chunk")
+    parser.add_argument("--url", type=str, default=None, help="SQLAlchemy URL to use instead of the .env SQL Server")
+    parser.add_argument("--source", type=str, default=None, help="Local Parquet/CSV file to upload instead of the Hub")
+    parser.add_argument("--dedup", action="store_true", help="Skip rows already uploaded to the table by earlier runs (append/replace only)")
+    args = parser.parse_args()
+
+    # Note: This will fail until .env is populated with real details (or --url is given)
+    upload_to_sql(limit=args.limit, use_synthetic=not (args.real or args.source), mode=args.mode, workers=args.workers,
+                  batch_size=args.batch_size, source_path=args.source, engine=get_engine(args.url) if args.url else None,
+                  dedup=args.dedup)
@@ -0,0 +1,345 @@
+import argparse
+import math
+import os
+import sqlite3
+import time
+from collections import deque
+import numpy as np
+import pandas as pd
+from data_loader import CACHE_DIR, DATASET_NAME, DEFAULT_BATCH_SIZE
+
+DEDUP_DIR = os.path.join(CACHE_DIR, "dedup")
+# Candidate column names for the real dataset and the synthetic (PaySim-style) schema
+ID_CANDIDATES = ['transaction_id']
+TIME_CANDIDATES = ['timestamp', 'step']
+DEFAULT_CAPACITY = 10000000
+DEFAULT_ERROR_RATE = 0.01
+# IDs per exact-check query (below SQLite's bound-parameter limit)
+LOOKUP_CHUNK = 500
+# Seconds a commit waits for another process's commit to finish
+LOCK_TIMEOUT = 60
+
+class BloomFilter:
+    """
+    Fixed-size bit array on disk (memory-mapped), sized for `capacity` keys at
+    `error_rate` false positives. Keys are 64-bit hashes; the k bit positions come from
+    double hashing their two 32-bit halves, all computed with NumPy for whole batches.
+    """
+    def __init__(self, path, capacity=DEFAULT_CAPACITY, error_rate=DEFAULT_ERROR_RATE):
+        self.capacity = int(capacity)
+        self.error_rate = error_rate
+        self.n_bits = int(math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.n_hashes = max(1, round(self.n_bits / self.capacity * math.log(2)))
+        self.path = path
+        mode = 'r+' if os.path.exists(path) and os.path.getsize(path) == (self.n_bits + 7) // 8 else 'w+'
+        self.bits = np.memmap(path, dtype=np.uint8, mode=mode, shape=((self.n_bits + 7) // 8,))
+
+    def _positions(self, hashes):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        low, high = hashes & np.uint64(0xFFFFFFFF), (hashes >> np.uint64(32)) | np.uint64(1)
+        steps = np.arange(self.n_hashes, dtype=np.uint64)
+        positions = (low[:, None] + steps[None, :] * high[:, None]) % np.uint64(self.n_bits)
+        return positions >> np.uint64(3), (np.uint8(1) << (positions & np.uint64(7)).astype(np.uint8))
+
+    def contains(self, hashes):
+        """Boolean array: False = definitely never added, True = probably added."""
+        if len(hashes) == 0:
+            return np.zeros(0, dtype=bool)
+        offsets, masks = self._positions(hashes)
+        return ((self.bits[offsets] & masks) != 0).all(axis=1)
+
+    def add(self, hashes):
+        if len(hashes):
+            offsets, masks = self._positions(hashes)
+            np.bitwise_or.at(self.bits, offsets.ravel(), masks.ravel())
+
+    def expected_fp_rate(self, count):
+        """False-positive probability after `count` distinct keys: (1 - e^(-kn/m))^k."""
+        return (1 - math.exp(-self.n_hashes * count / self.n_bits)) ** self.n_hashes
+
+    def flush(self):
+        self.bits.flush()
+
+def _hash(keys):
+    # Keys are mostly unique, so skip pandas' factorize-then-hash path
+    return pd.util.hash_array(np.asarray(keys), categorize=False).astype(np.uint64)
+
+class Deduplicator:
+    """
+    Remembers which transactions were already ingested into one target, so re-runs and
+    overlapping windows only pass on new rows.
+
+    Every key (transaction_id, or a hash of the whole row when the data has no ID) goes
+    into a Bloom filter and an exact SQLite ledger. A batch is checked against the
+    filter first: a miss means the row is new, and only the few hits are confirmed in
+    the ledger. Per source, the high-water mark records how many leading rows of its
+    stream were committed, so a re-run (or a grown file) skips that prefix without
+    ledger lookups. The skipped rows are still checked against the filter: committed
+    rows are always in it, so a miss means the source was rewritten, and its mark is
+    dropped for the rest of the run (a changed row that happens to be a filter false
+    positive, at `error_rate`, goes unnoticed). Memory is
+    bounded by the batches in flight; the filter is a memory-mapped file that is rebuilt
+    at twice the size from the ledger when its capacity is reached.
+
+    filter() only reads: it returns the new rows and keeps their keys pending. Call
+    commit() once those rows are stored; it records pending batches in stream order in
+    one short transaction. The key count, capacity and high-water marks live in the
+    ledger and are merged on commit, so several processes (e.g. dashboard sessions)
+    can share one target; two runs racing on the same new rows may both pass them on.
+    """
+    def __init__(self, name="default", directory=DEDUP_DIR, capacity=DEFAULT_CAPACITY,
+                 error_rate=DEFAULT_ERROR_RATE):
+        self.directory = os.path.join(directory, name)
+        os.makedirs(self.directory, exist_ok=True)
+        # Autocommit; writes take the database lock with BEGIN IMMEDIATE, which
+        # serializes commits across processes
+        self._conn = sqlite3.connect(os.path.join(self.directory, "seen.sqlite"), timeout=LOCK_TIMEOUT,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("BEGIN IMMEDIATE")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS seen (key PRIMARY KEY) WITHOUT ROWID")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS watermarks (source TEXT PRIMARY KEY, rows INTEGER, max_time)")
+        self._conn.executemany("INSERT OR IGNORE INTO meta VALUES (?, ?)",
+                               [('capacity', int(capacity)), ('error_rate', error_rate), ('count', 0)])
+        self._conn.execute("COMMIT")
+        self.bloom = None
+        self._sync()
+        self._pending = deque()
+        self._inflight = set()
+        self._positions = {}
+        self._marks = {}
+        self.stats = {'rows': 0, 'skipped': 0, 'duplicates': 0, 'new': 0, 'bloom_hits': 0,
+                      'false_positives': 0, 'seconds': 0.0}
+
+    def _meta(self, name):
+        return self._conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()[0]
+
+    @property
+    def count(self):
+        return self._meta('count')
+
+    def _bloom_path(self, capacity):
+        return os.path.join(self.directory, f"bloom-{capacity}.bin")
+
+    def _sync(self):
+        """(Re)opens the Bloom filter if another process rebuilt it at a larger capacity."""
+        capacity = self._meta('capacity')
+        if self.bloom is None or self.bloom.capacity != capacity:
+            self.bloom = BloomFilter(self._bloom_path(capacity), capacity, self._meta('error_rate'))
+
+    def _keys(self, batch):
+        id_col = next((col for col in ID_CANDIDATES if col in batch.columns), None)
+        if id_col is not None:
+            return batch[id_col].astype(str).to_numpy(dtype=object)
+        return pd.util.hash_pandas_object(batch, index=False).to_numpy().view(np.int64)
+
+    def _in_ledger(self, keys):
+        found = set()
+        for start in range(0, len(keys), LOOKUP_CHUNK):
+            chunk = keys[start:start + LOOKUP_CHUNK].tolist()
+            sql = f"SELECT key FROM seen WHERE key IN ({', '.join('?' * len(chunk))})"
+            found.update(row[0] for row in self._conn.execute(sql, chunk))
+        return np.fromiter((key in found for key in keys.tolist()), dtype=bool, count=len(keys))
+
+    def _watermark(self, source):
+        if source not in self._marks:
+            row = self._conn.execute("SELECT rows FROM watermarks WHERE source = ?", (source,)).fetchone()
+            self._marks[source] = row[0] if row else 0
+        return self._marks[source]
+
+    def filter(self, batch, source=None):
+        """
+        Returns the rows of `batch` (pandas) not seen before and keeps their keys pending
+        until commit(). With `source`, batches must be passed in stream order from the
+        stream's start.
+        """
+        start = time.perf_counter()
+        self._sync()
+        self.stats['rows'] += len(batch)
+        entry = {'source': source, 'position': None, 'max_time': None}
+        if source is not None:
+            position = self._positions.get(source, 0)
+            entry['position'] = self._positions[source] = position + len(batch)
+            skip = min(len(batch), max(0, self._watermark(source) - position))
+            if skip and not self.bloom.contains(_hash(self._keys(batch.iloc[:skip]))).all():
+                print(f"Source '{source}' changed since its high-water mark was recorded; checking every row")
+                self._marks[source] = 0
+                entry['rewound'] = True
+                skip = 0
+            self.stats['skipped'] += skip
+            batch = batch.iloc[skip:]
+            time_col = next((col for col in TIME_CANDIDATES if col in batch.columns), None)
+            if time_col and len(batch):
+                latest = batch[time_col].max()
+                entry['max_time'] = latest.item() if hasattr(latest, 'item') else str(latest)
+
+        keys = self._keys(batch)
+        first = ~pd.Series(keys).duplicated().to_numpy()
+        hashes = _hash(keys)
+        maybe = self.bloom.contains(hashes)
+        seen = np.zeros(len(keys), dtype=bool)
+        check = first & maybe
+        if check.any():
+            seen[check] = self._in_ledger(keys[check])
+        if self._inflight:
+            # Passed on by an earlier batch of this run that is not committed yet
+            seen |= np.fromiter((key in self._inflight for key in keys.tolist()), dtype=bool, count=len(keys))
+        new = first & ~seen
+        self.stats['bloom_hits'] += int(check.sum())
+        self.stats['false_positives'] += int((check & ~seen).sum())
+        self.stats['duplicates'] += int(len(keys) - new.sum())
+        self.stats['new'] += int(new.sum())
+
+        entry['keys'], entry['hashes'] = keys[new], hashes[new]
+        self._inflight.update(entry['keys'].tolist())
+        self._pending.append(entry)
+        self.stats['seconds'] += time.perf_counter() - start
+        return batch[new]
+
+    def commit(self, batches=None, watermark=True):
+        """
+        Records the keys and stream positions of the oldest `batches` pending filter()
+        calls (all of them by default), in one transaction. With watermark=False only the
+        keys are recorded (an earlier batch of the stream was not stored).
+        """
+        n = len(self._pending) if batches is None else min(batches, len(self._pending))
+        if n == 0:
+            return
+        entries = [self._pending.popleft() for _ in range(n)]
+        start = time.perf_counter()
+        keys = sorted(key for entry in entries for key in entry['keys'].tolist())
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._sync()
+            before = self._conn.total_changes
+            # Sorted inserts walk the ledger's B-tree in order instead of hopping between pages
+            self._conn.executemany("INSERT OR IGNORE INTO seen VALUES (?)", ((key,) for key in keys))
+            inserted = self._conn.total_changes - before
+            self._conn.execute("UPDATE meta SET value = value + ? WHERE name = 'count'", (inserted,))
+            for entry in entries:
+                self.bloom.add(entry['hashes'])
+                if watermark and entry['source'] is not None:
+                    if entry.get('rewound'):
+                        self._conn.execute("DELETE FROM watermarks WHERE source = ?", (entry['source'],))
+                    self._conn.execute(
+                        "INSERT INTO watermarks VALUES (?, ?, ?) ON CONFLICT(source) DO UPDATE SET "
+                        "rows = MAX(rows, excluded.rows), max_time = CASE WHEN max_time IS NULL OR "
+                        "excluded.max_time > max_time THEN excluded.max_time ELSE max_time END",
+                        (entry['source'], entry['position'], entry['max_time']))
+            self.bloom.flush()
+            if self.count > self.bloom.capacity:
+                self._grow()
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        finally:
+            self._inflight.difference_update(keys)
+        self.stats['seconds'] += time.perf_counter() - start
+
+    def _grow(self):
+        """Rebuilds the Bloom filter at twice its capacity from the exact ledger (inside commit)."""
+        old, capacity = self.bloom, self.bloom.capacity * 2
+        print(f"Bloom filter full; rebuilding for {capacity:,} keys")
+        self.bloom = BloomFilter(self._bloom_path(capacity), capacity, old.error_rate)
+        cursor = self._conn.execute("SELECT key FROM seen")
+        while True:
+            rows = cursor.fetchmany(DEFAULT_BATCH_SIZE)
+            if not rows:
+                break
+            keys = [row[0] for row in rows]
+            self.bloom.add(_hash(np.array(keys, dtype=object if isinstance(keys[0], str) else np.int64)))
+        self.bloom.flush()
+        self._conn.execute("UPDATE meta SET value = ? WHERE name = 'capacity'", (capacity,))
+        del old
+        try:
+            os.remove(self._bloom_path(capacity // 2))
+        except OSError:
+            pass  # still mapped by another process (Windows); left behind
+
+    def discard(self, batches=1):
+        """Drops the oldest `batches` pending filter() calls, whose rows were not stored."""
+        for _ in range(min(batches, len(self._pending))):
+            self._inflight.difference_update(self._pending.popleft()['keys'].tolist())
+
+    def rollback(self):
+        """Drops the pending batches; nothing they passed on is recorded."""
+        self._pending.clear()
+        self._inflight.clear()
+        self._positions = {}
+
+    def reset(self):
+        """Forgets everything, e.g. when the target table is recreated."""
+        self._conn.execute("BEGIN IMMEDIATE")
+        self._conn.execute("DELETE FROM seen")
+        self._conn.execute("DELETE FROM watermarks")
+        self._conn.execute("UPDATE meta SET value = 0 WHERE name = 'count'")
+        self._sync()
+        self.bloom.bits[:] = 0
+        self.bloom.flush()
+        self._conn.execute("COMMIT")
+        self.rollback()
+        self._marks = {}
+
+    def report(self):
+        """Prints rows passed/dropped, the observed and expected false-positive rate and throughput."""
+        s = self.stats
+        # A false positive is a new key the filter claimed to have seen
+        observed = s['false_positives'] / s['new'] if s['new'] else 0.0
+        rate = s['rows'] / s['seconds'] if s['seconds'] else float('nan')
+        count = self.count
+        print(f"Dedup: {s['rows']:,} rows in, {s['new']:,} new, {s['duplicates']:,} duplicates, "
+              f"{s['skipped']:,} skipped below high-water marks ({rate:,.0f} rows/s)")
+        print(f"  Bloom filter: {count:,} keys, {self.bloom.n_bits / 8 / 2 ** 20:.1f} MB, "
+              f"{s['bloom_hits']:,} exact checks, false-positive rate {observed:.4%} observed / "
+              f"{self.bloom.expected_fp_rate(count):.4%} expected")
+
+    def close(self):
+        self._conn.close()
+        self.bloom.flush()
+
+def source_key(source_path=None, use_synthetic=False, dataset_name=DATASET_NAME, split="train"):
+    """
+    High-water-mark key of a loader stream: a file's absolute path (so a file that grows
+    keeps its mark; rewrites are caught by Deduplicator.filter), or a Hub split.
+    None for generated data, which is not the same on every run.
+    """
+    if use_synthetic:
+        return None
+    if source_path is not None:
+        return os.path.abspath(source_path)
+    return f"{dataset_name}:{split}"
+
+def dedup_batches(batches, dedup, source=None):
+    """
+    Yields only the new rows of each batch, committing each batch once the consumer
+    has taken it.
+    """
+    for batch in batches:
+        new = dedup.filter(batch, source)
+        if len(new):
+            yield new
+        dedup.commit()
+
+if __name__ == "__main__":
+    from data_loader import iter_financial_batches
+    parser = argparse.ArgumentParser(description="Run a stream through the dedup stage and report what is new")
+    parser.add_argument("--source", type=str, default=None, help="Parquet/CSV file (default: the Hub dataset)")
+    parser.add_argument("--limit", type=int, default=None, help="Rows to read")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Rows per batch")
+    parser.add_argument("--name", type=str, default="default", help="Dedup state to use (one per ingestion target)")
+    parser.add_argument("--capacity", type=int, default=DEFAULT_CAPACITY, help="Keys the Bloom filter is sized for")
+    parser.add_argument("--no-watermark", action="store_true", help="Check every row instead of skipping the committed prefix")
+    parser.add_argument("--reset", action="store_true", help="Forget every seen key first")
+    args = parser.parse_args()
+
+    dedup = Deduplicator(args.name, capacity=args.capacity)
+    if args.reset:
+        dedup.reset()
+    source = None if args.no_watermark else source_key(args.source)
+    for _ in dedup_batches(iter_financial_batches(batch_size=args.batch_size, limit=args.limit,
+                                                  source_path=args.source, use_cache=False), dedup, source):
+        pass
+    dedup.report()
+    dedup.close()
@@ -0,0 +1,151 @@
+import argparse
+import numpy as np
+import pandas as pd
+
+# Features watched for drift, whichever of them the data carries
+KEY_FEATURES = ['amount_ngn', 'amount', 'velocity_score', 'spending_deviation_score', 'geo_anomaly_score',
+                'transaction_type', 'type', 'merchant_category', 'sender_persona', 'location']
+# Conventional PSI reading: < 0.1 stable, 0.1-0.2 moderate shift, > 0.2 significant shift
+PSI_ALERT = 0.2
+OTHER = '__other__'
+
+class DriftMonitor:
+    """
+    Running histograms of key features, compared with the Population Stability Index.
+
+    The first observed batch fixes the bins: quantile edges for numeric features and
+    the most frequent categories (plus an 'other' bucket) for categorical ones. After
+    that, observe() only adds counts, so memory is O(features x bins) however much
+    data streams through. Missing values have their own bucket.
+    """
+    def __init__(self, features=None, n_bins=10, max_categories=50):
+        self.features = features
+        self.n_bins = n_bins
+        self.max_categories = max_categories
+        self.bins = None    # {feature: ('numeric', edges) | ('categorical', categories)}
+        self.counts = {}    # {feature: int64 array, last slot = missing}
+        self._lookup = {}
+
+    def _fix_bins(self, df):
+        features = self.features or [col for col in KEY_FEATURES if col in df.columns]
+        self.bins = {}
+        for col in features:
+            if col not in df.columns:
+                continue
+            values = df[col]
+            if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+                quantiles = np.linspace(0, 1, self.n_bins + 1)[1:-1]
+                edges = np.unique(np.nanquantile(values.to_numpy(dtype='float64'), quantiles))
+                self.bins[col] = ('numeric', edges.tolist())
+            else:
+                top = values.dropna().astype(str).value_counts().index[:self.max_categories]
+                self.bins[col] = ('categorical', list(top) + [OTHER])
+        self.counts = {col: np.zeros(self._size(col), dtype=np.int64) for col in self.bins}
+
+    def _size(self, col):
+        kind, spec = self.bins[col]
+        # numeric: len(edges) + 1 intervals; categorical: categories incl. other; +1 missing
+        return (len(spec) + 1 if kind == 'numeric' else len(spec)) + 1
+
+    def _bucket(self, col, values):
+        kind, spec = self.bins[col]
+        missing = values.isna().to_numpy()
+        if kind == 'numeric':
+            numbers = pd.to_numeric(values, errors='coerce').to_numpy(dtype='float64')
+            buckets = np.searchsorted(np.asarray(spec), numbers, side='right')
+            missing = missing | np.isnan(numbers)
+        else:
+            index = self._lookup.get(col)
+            if index is None:
+                index = self._lookup[col] = pd.Index(spec)
+            buckets = index.get_indexer(values.astype(str))
+            buckets[buckets < 0] = len(spec) - 1 # other
+        buckets[missing] = self._size(col) - 1
+        return buckets
+
+    def observe(self, df):
+        """
+        Adds one batch of raw transactions to the histograms.
+        """
+        if len(df) == 0:
+            return self
+        if self.bins is None:
+            self._fix_bins(df)
+        for col in self.bins:
+            if col in df.columns:
+                self.counts[col] += np.bincount(self._bucket(col, df[col]), minlength=self._size(col))
+        return self
+
+    def new_window(self):
+        """
+        An empty monitor with the same bins, for collecting data to compare against this one.
+        """
+        window = DriftMonitor(self.features, self.n_bins, self.max_categories)
+        window.bins = self.bins
+        window.counts = {col: np.zeros_like(counts) for col, counts in self.counts.items()}
+        return window
+
+    def merge(self, other):
+        """
+        Adds another window's counts (same bins) into this one.
+        """
+        for col, counts in other.counts.items():
+            if col in self.counts:
+                self.counts[col] += counts
+        return self
+
+    def psi(self, current, eps=1e-4):
+        """
+        PSI of `current` (a window from new_window()) against this reference, per feature.
+        """
+        scores = {}
+        for col, expected in self.counts.items():
+            actual = current.counts.get(col)
+            if actual is None or actual.sum() == 0 or expected.sum() == 0:
+                continue
+            p = np.maximum(expected / expected.sum(), eps)
+            q = np.maximum(actual / actual.sum(), eps)
+            scores[col] = float(np.sum((q - p) * np.log(q / p)))
+        return scores
+
+    def to_dict(self):
+        return {
+            'features': self.features, 'n_bins': self.n_bins, 'max_categories': self.max_categories,
+            'bins': {col: [kind, spec] for col, (kind, spec) in (self.bins or {}).items()},
+            'counts': {col: counts.tolist() for col, counts in self.counts.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        monitor = cls(data.get('features'), data['n_bins'], data['max_categories'])
+        monitor.bins = {col: (kind, spec) for col, (kind, spec) in data['bins'].items()}
+        monitor.counts = {col: np.asarray(counts, dtype=np.int64) for col, counts in data['counts'].items()}
+        return monitor
+
+def drift_report(scores, threshold=PSI_ALERT):
+    """
+    Prints per-feature PSI (largest first) and returns True if any feature exceeds `threshold`.
+    """
+    for col, score in sorted(scores.items(), key=lambda item: -item[1]):
+        flag = "DRIFT" if score > threshold else ("shift" if score > threshold / 2 else "stable")
+        print(f"  {col:<26} PSI {score:6.3f}  {flag}")
+    return any(score > threshold for score in scores.values())
+
+if __name__ == "__main__":
+    from data_loader import iter_financial_batches
+    from model_registry import ModelRegistry
+    parser = argparse.ArgumentParser(description="PSI of new data against the latest model's training data")
+    parser.add_argument("--source", type=str, default=None, help="Parquet/CSV file of new transactions")
+    parser.add_argument("--limit", type=int, default=None, help="Rows to read")
+    parser.add_argument("--threshold", type=float, default=PSI_ALERT, help="PSI above which a feature has drifted")
+    args = parser.parse_args()
+
+    reference = ModelRegistry().get().manifest['metadata'].get('drift_reference')
+    if reference is None:
+        raise SystemExit("The latest model has no drift reference. Retrain it with train_model.py.")
+    reference = DriftMonitor.from_dict(reference)
+    window = reference.new_window()
+    for batch in iter_financial_batches(limit=args.limit, source_path=args.source,
+                                        use_synthetic=args.source is None):
+        window.observe(batch)
+    drift_report(reference.psi(window), args.threshold)
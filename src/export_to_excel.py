@@ -1,44 +1,154 @@
 import pandas as pd
-from data_loader import load_financial_data
+from data_loader import iter_financial_batches
+from instrumentation import instrumented, row_count
+from openpyxl import Workbook
+import pyarrow as pa
+import pyarrow.parquet as pq
 import argparse
 import os
 
+MAX_EXCEL_ROWS = 1048575 # Excel limit minus header
+EXPORT_FORMATS = ('xlsx', 'csv', 'parquet')
+MIME_TYPES = {
+    'xlsx': "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    'csv': "text/csv",
+    'parquet': "application/vnd.apache.parquet",
+}
+
+def _format_from_name(output):
+    ext = os.path.splitext(output)[1].lstrip('.').lower() if isinstance(output, str) else ''
+    return ext if ext in EXPORT_FORMATS else 'xlsx'
+
+def _write_xlsx(batches, output, sheet_prefix, max_rows):
+    """
+    Streams rows into a write-only workbook (rows are flushed to a temp file as
+    they are appended), starting a new sheet every `max_rows` data rows.
+    """
+    wb = Workbook(write_only=True)
+    ws, sheet_rows, sheets, header = None, max_rows, 0, None
+    for batch in batches:
+        header = list(batch.columns)
+        # Excel has no NaN; write empty cells instead
+        values = batch.astype(object).where(batch.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            if sheet_rows >= max_rows:
+                sheets += 1
+                ws = wb.create_sheet(sheet_prefix if sheets == 1 else f"{sheet_prefix}_{sheets}")
+                ws.append(header)
+                sheet_rows = 0
+            ws.append(row)
+            sheet_rows += 1
+    if ws is None:
+        wb.create_sheet(sheet_prefix).append(header or [])
+        sheets = 1
+    wb.save(output)
+    return sheets
+
+def _write_csv(batches, output):
+    header = True
+    opened = open(output, 'w', newline='', encoding='utf-8') if isinstance(output, str) else None
+    target = opened or output
+    try:
+        for batch in batches:
+            batch.to_csv(target, index=False, header=header)
+            header = False
+    finally:
+        if opened:
+            opened.close()
+
+def _write_parquet(batches, output):
+    writer = None
+    try:
+        for batch in batches:
+            table = pa.Table.from_pandas(batch, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(output, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+def export_batches(batches, output, fmt=None, sheet_name='FraudData', max_excel_rows=MAX_EXCEL_ROWS):
+    """
+    Writes an iterable of DataFrame batches to xlsx, csv or parquet with constant memory.
+    Args:
+        output: file path or binary/text buffer (csv needs a text buffer).
+        fmt (str, optional): 'xlsx', 'csv' or 'parquet'; inferred from the file extension if omitted.
+        max_excel_rows (int): data rows per sheet before rolling over to a new one (xlsx only).
+    Returns the number of rows written.
+    """
+    fmt = fmt or _format_from_name(output)
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format '{fmt}'. Use one of {EXPORT_FORMATS}")
+
+    counts = []
+    def counted(batches):
+        for batch in batches:
+            counts.append(len(batch))
+            yield batch
+
+    if fmt == 'xlsx':
+        sheets = _write_xlsx(counted(batches), output, sheet_name, max_excel_rows)
+        if sheets > 1:
+            print(f"Data exceeded the Excel row limit; split across {sheets} sheets.")
+    elif fmt == 'csv':
+        _write_csv(counted(batches), output)
+    else:
+        _write_parquet(counted(batches), output)
+    return sum(counts)
+
+def export_tables(tables, output):
+    """
+    Writes small result tables ({sheet name: DataFrame}, e.g. the analytics queries)
+    to one xlsx workbook, one sheet each. `output` is a file path or binary buffer.
+    """
+    wb = Workbook(write_only=True)
+    for name, table in tables.items():
+        ws = wb.create_sheet(str(name)[:31])  # Excel caps sheet names at 31 characters
+        ws.append([str(col) for col in table.columns])
+        values = table.astype(object).where(table.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            ws.append([value.item() if hasattr(value, 'item') else value for value in row])
+    if not tables:
+        wb.create_sheet('Analytics')
+    wb.save(output)
+
+@instrumented(rows=row_count)
+def export_data(limit=None, use_synthetic=False, output_file="fraud_data_export.xlsx", fmt=None,
+                batch_size=50000, source_path=None):
+    """
+    Streams data from the loader straight into an export file.
+    limit=None exports every row; xlsx output rolls over to new sheets past the Excel row limit.
+    """
+    print(f"Fetching data (Targeting: {limit if limit else 'all'} rows, Synthetic: {use_synthetic})...")
+    batches = iter_financial_batches(batch_size=batch_size, limit=limit, use_synthetic=use_synthetic,
+                                     source_path=source_path)
+    print(f"Exporting to {output_file}...")
+    try:
+        rows = export_batches(batches, output_file, fmt=fmt)
+        print(f"Success! {rows:,} rows saved at: {os.path.abspath(output_file)}")
+        return rows
+    except Exception as e:
+        print(f"Error during export: {e}")
+        return None
+
+@instrumented(rows=row_count)
 def export_data_to_excel(limit=None, use_synthetic=False, output_file="fraud_data_export.xlsx"):
     """
     Loads data and exports it to an Excel (.xlsx) file.
-    Note: Excel has a limit of 1,048,576 rows.
-    """
-    max_excel_rows = 1048575 # Excel limit minus header
-    
-    if limit is None or limit > max_excel_rows:
-        print(f"Note: Excel limit is 1,048,576 rows. Capping export at 1,048,575 rows.")
-        limit = max_excel_rows
-
-    print(f"Fetching data (Targeting: {limit} rows, Synthetic: {use_synthetic})...")
-    # We use streaming in load_financial_data via the limit parameter
-    df = load_financial_data(limit=limit, use_synthetic=use_synthetic)
-    
-    if df is not None:
-        if len(df) > max_excel_rows:
-            print(f"Trimming data to {max_excel_rows} rows for Excel compatibility.")
-            df = df.iloc[:max_excel_rows]
-            
-        print(f"Exporting {len(df)} rows to {output_file}...")
-        try:
-            # Using openpyxl engine
-            df.to_excel(output_file, index=False, engine='openpyxl')
-            print(f"Success! File saved at: {os.path.abspath(output_file)}")
-        except Exception as e:
-            print(f"Error during export: {e}")
-    else:
-        print("Failed to load data. Export aborted.")
+    Rows beyond Excel's 1,048,576-row sheet limit continue on additional sheets.
+    """
+    return export_data(limit=limit, use_synthetic=use_synthetic, output_file=output_file, fmt='xlsx')
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Export Financial Data to Excel")
-    parser.add_argument("--limit", type=int, default=1000, help="Number of rows to export")
+    parser = argparse.ArgumentParser(description="Export Financial Data to Excel, CSV or Parquet")
+    parser.add_argument("--limit", type=int, default=1000, help="Number of rows to export (0 for all)")
     parser.add_argument("--real", action="store_true", help="Use real data instead of synthetic")
-    parser.add_argument("--out", type=str, default="fraud_data_export.xlsx", help="Output filename")
-    
+    parser.add_argument("--out", type=str, default="fraud_data_export.xlsx", help="Output filename (.xlsx, .csv or .parquet)")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default=None, help="Output format (default: from extension)")
+    parser.add_argument("--batch-size", type=int, default=50000, help="Rows per streamed chunk")
+
     args = parser.parse_args()
-    
-    export_data_to_excel(limit=args.limit, use_synthetic=not args.real, output_file=args.out)
+
+    export_data(limit=args.limit or None, use_synthetic=not args.real, output_file=args.out, fmt=args.format,
+                batch_size=args.batch_size)
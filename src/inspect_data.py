@@ -1,11 +1,11 @@
-from datasets import load_dataset
-import pandas as pd
+from data_loader import load_financial_data
 
 def inspect_data():
     print("Streaming first 10,000 rows...")
-    dataset = load_dataset("electricsheepafrica/Nigerian-Financial-Transactions-and-Fraud-Detection-Dataset", split="train", streaming=True)
-    data_head = dataset.take(10000)
-    df = pd.DataFrame(list(data_head))
+    # Served from the local Parquet cache after the first run
+    df = load_financial_data(limit=10000)
+    if df is None:
+        return
     
     print("Columns:", df.columns)
     if 'is_fraud' in df.columns:
@@ -0,0 +1,254 @@
+import atexit
+import cProfile
+import functools
+import json
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Instrumentation is off unless FINSAFE_METRICS (or enable()) names an output file.
+# Output ending in .prom is written as Prometheus text, anything else as JSON lines.
+# FINSAFE_PROFILE=cprofile|tracemalloc additionally captures profiles per stage.
+PROFILE_MODES = ('cprofile', 'tracemalloc')
+
+_enabled = False
+_output = None
+_profile = None
+_profile_dir = None
+_log = None
+# Whether enable() started tracemalloc (and so disable() should stop it)
+_started_tracemalloc = False
+_totals = {}
+_local = threading.local()
+_lock = threading.Lock()
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (NaN if unavailable)."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KB, macOS reports bytes
+        return peak / 1024**2 if sys.platform == 'darwin' else peak / 1024
+    except ImportError:
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / 1024**2
+        except Exception:
+            return float('nan')
+
+def enable(output, profile=None, profile_dir="profiles"):
+    """
+    Starts recording stages to `output` (.prom for Prometheus text, otherwise JSON lines).
+    profile: None, 'cprofile' (one .prof file per outermost stage in `profile_dir`) or
+             'tracemalloc' (bytes allocated per stage).
+    """
+    global _enabled, _output, _profile, _profile_dir, _log, _started_tracemalloc
+    if profile not in (None,) + PROFILE_MODES:
+        raise ValueError(f"profile must be one of {PROFILE_MODES}")
+    disable()
+    _output, _profile, _profile_dir = output, profile, profile_dir
+    if not output.endswith('.prom'):
+        _log = open(output, 'a', buffering=1)
+    if profile == 'tracemalloc' and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _started_tracemalloc = True
+    _enabled = True
+
+def disable():
+    """
+    Stops recording and flushes the output file. tracemalloc is stopped only if
+    enable() started it.
+    """
+    global _enabled, _log, _started_tracemalloc
+    if not _enabled:
+        return
+    _enabled = False
+    flush()
+    if _log is not None:
+        _log.close()
+        _log = None
+    if _started_tracemalloc:
+        tracemalloc.stop()
+        _started_tracemalloc = False
+
+def is_enabled():
+    return _enabled
+
+class StageRecord:
+    """
+    Measurements for one stage run. Set `rows` inside the block to report throughput.
+    """
+    __slots__ = ('name', 'rows', 'seconds', 'allocated_bytes', 'peak_rss_mb', '_traced_peak')
+
+    def __init__(self, name, rows=None):
+        self.name = name
+        self.rows = rows
+        self.seconds = None
+        self.allocated_bytes = None
+        self.peak_rss_mb = None
+        self._traced_peak = 0
+
+_NOOP = StageRecord('disabled')
+
+@contextmanager
+def stage(name, rows=None):
+    """
+    Times a block as pipeline stage `name`. Yields a StageRecord whose `rows` may be set.
+    Costs one flag check when instrumentation is disabled.
+    """
+    if not _enabled:
+        yield _NOOP
+        return
+
+    record = StageRecord(name, rows)
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    parent = stack[-1] if stack else None
+
+    tracing = _profile == 'tracemalloc' and tracemalloc.is_tracing()
+    if tracing:
+        traced_start, peak_before = tracemalloc.get_traced_memory()
+        # reset_peak() is global: remember the parent's peak so far before resetting it
+        if parent is not None:
+            parent._traced_peak = max(parent._traced_peak, peak_before)
+        tracemalloc.reset_peak()
+    profiler = None
+    if _profile == 'cprofile' and not stack:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    stack.append(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record.seconds = time.perf_counter() - start
+        stack.pop()
+        if profiler is not None:
+            profiler.disable()
+            os.makedirs(_profile_dir, exist_ok=True)
+            safe_name = re.sub(r'[^A-Za-z0-9_.-]+', '_', name)
+            profiler.dump_stats(os.path.join(_profile_dir, f"{safe_name}-{os.getpid()}-{time.time_ns()}.prof"))
+        if tracing:
+            peak = max(tracemalloc.get_traced_memory()[1], record._traced_peak)
+            record.allocated_bytes = max(peak - traced_start, 0)
+            if parent is not None:
+                parent._traced_peak = max(parent._traced_peak, peak)
+        record.peak_rss_mb = peak_rss_mb()
+        _record(record)
+
+def current():
+    """
+    The innermost running stage's record (a throwaway record when disabled),
+    so instrumented functions can report `rows` themselves.
+    """
+    stack = getattr(_local, 'stack', None) if _enabled else None
+    return stack[-1] if stack else StageRecord('detached')
+
+def row_count(result):
+    """
+    `rows` helper for functions returning a sized object, a count or None.
+    """
+    if result is None:
+        return None
+    return len(result) if hasattr(result, '__len__') else int(result)
+
+def instrumented(name=None, rows=None):
+    """
+    Decorator form of stage(). `rows` is an optional callable mapping the
+    function's return value to the number of rows it processed.
+    """
+    def decorator(func):
+        stage_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with stage(stage_name) as record:
+                result = func(*args, **kwargs)
+                if rows is not None:
+                    try:
+                        record.rows = rows(result)
+                    except Exception:
+                        record.rows = None
+                return result
+        return wrapper
+    return decorator
+
+def _record(record):
+    with _lock:
+        totals = _totals.setdefault(record.name, {'calls': 0, 'seconds': 0.0, 'rows': 0,
+                                                  'allocated_bytes': 0, 'peak_rss_mb': 0.0})
+        totals['calls'] += 1
+        totals['seconds'] += record.seconds
+        totals['rows'] += record.rows or 0
+        totals['allocated_bytes'] += record.allocated_bytes or 0
+        totals['peak_rss_mb'] = max(totals['peak_rss_mb'], record.peak_rss_mb)
+        if _log is not None:
+            _log.write(json.dumps({
+                'ts': time.time(), 'pid': os.getpid(), 'stage': record.name,
+                'seconds': round(record.seconds, 6), 'rows': record.rows,
+                'allocated_bytes': record.allocated_bytes, 'peak_rss_mb': round(record.peak_rss_mb, 1),
+            }) + "\n")
+
+def snapshot():
+    """
+    Per-stage totals recorded so far: {stage: {'calls', 'seconds', 'rows', 'allocated_bytes', 'peak_rss_mb'}}.
+    """
+    with _lock:
+        return {name: dict(totals) for name, totals in _totals.items()}
+
+def prometheus_text():
+    """
+    Renders the per-stage totals in the Prometheus text exposition format.
+    """
+    metrics = [
+        ('finsafe_stage_calls_total', 'counter', 'Times the stage ran', 'calls', 1),
+        ('finsafe_stage_seconds_total', 'counter', 'Wall time spent in the stage', 'seconds', 1),
+        ('finsafe_stage_rows_total', 'counter', 'Rows processed by the stage', 'rows', 1),
+        ('finsafe_stage_allocated_bytes_total', 'counter', 'Bytes allocated in the stage (tracemalloc mode)', 'allocated_bytes', 1),
+        ('finsafe_stage_peak_rss_bytes', 'gauge', 'Process peak RSS when the stage finished', 'peak_rss_mb', 1024**2),
+    ]
+    totals = snapshot()
+    lines = []
+    for metric, kind, help_text, key, scale in metrics:
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for name in sorted(totals):
+            lines.append(f'{metric}{{stage="{name}"}} {totals[name][key] * scale:g}')
+    return "\n".join(lines) + "\n"
+
+def flush():
+    """
+    Writes the Prometheus file (atomically) or flushes the JSON-lines log.
+    """
+    if _output is None:
+        return
+    if _output.endswith('.prom'):
+        tmp_file = f"{_output}.{os.getpid()}.tmp"
+        with open(tmp_file, 'w') as f:
+            f.write(prometheus_text())
+        os.replace(tmp_file, _output)
+    elif _log is not None:
+        _log.flush()
+
+atexit.register(disable)
+
+if os.getenv("FINSAFE_METRICS"):
+    enable(os.environ["FINSAFE_METRICS"], profile=os.getenv("FINSAFE_PROFILE") or None,
+           profile_dir=os.getenv("FINSAFE_PROFILE_DIR", "profiles"))
+
+if __name__ == "__main__":
+    import argparse
+    import pstats
+    parser = argparse.ArgumentParser(description="Summarise a cProfile capture")
+    parser.add_argument("profile", type=str, help=".prof file written in cprofile mode")
+    parser.add_argument("--top", type=int, default=25, help="Functions to show")
+    args = parser.parse_args()
+    pstats.Stats(args.profile).sort_stats("cumulative").print_stats(args.top)
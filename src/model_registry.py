@@ -0,0 +1,145 @@
+import json
+import os
+import shutil
+import threading
+import time
+import numpy as np
+import xgboost as xgb
+from preprocessing import FinancialPreprocessor
+
+REGISTRY_DIR = os.getenv("FINSAFE_MODEL_DIR", "models")
+MODEL_FILE = "model.ubj"
+PREPROCESSOR_FILE = "preprocessor.npz"
+MANIFEST_FILE = "manifest.json"
+LATEST_FILE = "LATEST"
+
+class ModelBundle:
+    """
+    One versioned artifact: a native XGBoost booster (UBJ) plus the preprocessor
+    spec as plain arrays. Files are read lazily on first access.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, MANIFEST_FILE)) as f:
+            self.manifest = json.load(f)
+        self.version = self.manifest['version']
+        self._booster = None
+        self._preprocessor = None
+        self._lock = threading.Lock()
+
+    @property
+    def booster(self):
+        if self._booster is None:
+            with self._lock:
+                if self._booster is None:
+                    booster = xgb.Booster()
+                    booster.load_model(os.path.join(self.path, MODEL_FILE))
+                    self._booster = booster
+        return self._booster
+
+    @property
+    def preprocessor(self):
+        if self._preprocessor is None:
+            with self._lock:
+                if self._preprocessor is None:
+                    with np.load(os.path.join(self.path, PREPROCESSOR_FILE), allow_pickle=False) as arrays:
+                        preprocessor = FinancialPreprocessor.from_spec(self.manifest['preprocessor'], dict(arrays))
+                    preprocessor.compile()
+                    self._preprocessor = preprocessor
+        return self._preprocessor
+
+    def load(self):
+        """
+        Forces both artifacts into memory (e.g. before a hot swap).
+        """
+        self.booster, self.preprocessor
+        return self
+
+class ModelRegistry:
+    """
+    Directory of versioned model bundles:
+        <root>/<version>/{model.ubj, preprocessor.npz, manifest.json}
+        <root>/LATEST   (name of the active version)
+    Versions are written to a temporary directory and renamed into place, and
+    LATEST is replaced atomically, so readers never see a partial bundle.
+    """
+    def __init__(self, root=REGISTRY_DIR):
+        self.root = root
+
+    def save(self, model, preprocessor, version=None, metadata=None, promote=True):
+        """
+        Writes a new bundle from a trained model (XGBClassifier or Booster) and a
+        fitted FinancialPreprocessor. Returns the version name.
+        """
+        booster = model.get_booster() if hasattr(model, 'get_booster') else model
+        version = version or time.strftime("%Y%m%d-%H%M%S")
+        base, suffix = version, 1
+        while os.path.exists(os.path.join(self.root, version)):
+            suffix += 1
+            version = f"{base}-{suffix}"
+
+        meta, arrays = preprocessor.to_spec()
+        manifest = {
+            'version': version,
+            'created_at': time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'xgboost_version': xgb.__version__,
+            'preprocessor': meta,
+            'metadata': metadata or {},
+        }
+
+        os.makedirs(self.root, exist_ok=True)
+        tmp_dir = os.path.join(self.root, f".tmp-{version}")
+        os.makedirs(tmp_dir)
+        try:
+            booster.save_model(os.path.join(tmp_dir, MODEL_FILE))
+            np.savez(os.path.join(tmp_dir, PREPROCESSOR_FILE), **arrays)
+            with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w') as f:
+                json.dump(manifest, f, indent=2)
+            os.replace(tmp_dir, os.path.join(self.root, version))
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        if promote:
+            self.promote(version)
+        print(f"Saved model bundle '{version}' to {os.path.abspath(self.root)}")
+        return version
+
+    def promote(self, version):
+        """
+        Makes `version` the one returned by latest_version().
+        """
+        if not os.path.exists(os.path.join(self.root, version, MANIFEST_FILE)):
+            raise ValueError(f"Unknown model version '{version}'")
+        tmp_file = os.path.join(self.root, f".{LATEST_FILE}.tmp")
+        with open(tmp_file, 'w') as f:
+            f.write(version)
+        os.replace(tmp_file, os.path.join(self.root, LATEST_FILE))
+
+    def versions(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root)
+                      if os.path.exists(os.path.join(self.root, name, MANIFEST_FILE)))
+
+    def latest_version(self):
+        try:
+            with open(os.path.join(self.root, LATEST_FILE)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def get(self, version=None):
+        """
+        Returns the (lazily loaded) bundle for `version`, or the latest one.
+        """
+        version = version or self.latest_version()
+        if version is None:
+            raise ValueError(f"No model versions in {os.path.abspath(self.root)}. Train one with train_model.py.")
+        return ModelBundle(os.path.join(self.root, version))
+
+if __name__ == "__main__":
+    registry = ModelRegistry()
+    latest = registry.latest_version()
+    for version in registry.versions():
+        print(f"{'*' if version == latest else ' '} {version}")
@@ -2,12 +2,40 @@ import pandas as pd
 import numpy as np
 from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.model_selection import train_test_split
+from instrumentation import instrumented, row_count
+
+# Code written by transform() for categories the encoders never saw during fit
+UNKNOWN_CATEGORY_CODE = -1
+
+def _column_roles(df, target_col=None):
+    """
+    Splits columns into (categorical, numerical) lists in frame order. Accepts the
+    compact dtypes produced by data_loader.optimize_dtypes (category, Arrow strings,
+    int8-int32, uint8 flags, float32) as well as object/int64/float64.
+    """
+    cat_cols, num_cols = [], []
+    for col, dtype in df.dtypes.items():
+        if col == target_col:
+            continue
+        if pd.api.types.is_numeric_dtype(dtype):
+            num_cols.append(col)
+        elif isinstance(dtype, pd.CategoricalDtype) or pd.api.types.is_object_dtype(dtype) \
+                or pd.api.types.is_string_dtype(dtype):
+            cat_cols.append(col)
+    return cat_cols, num_cols
 
 class FinancialPreprocessor:
     def __init__(self):
         self.scaler = StandardScaler()
         self.label_encoders = {}
+        # Categories folded in by update() after fitting, per column, in the order they were
+        # added; their codes follow the encoder's classes_, which stay as sklearn fitted them
+        self.added_categories = {}
+        self.feature_names = None
+        self._compiled = None
+        self._stream_state = None
         
+    @instrumented(rows=row_count)
     def fit_transform(self, df, target_col='fraud_status'):
         """
         Preprocesses the dataframe: cleans, encodes, and scales.
@@ -26,26 +54,238 @@ class FinancialPreprocessor:
         for col in bool_cols:
             df_clean[col] = df_clean[col].astype(int)
         
-        # Identify categorical and numerical columns
-        cat_cols = df_clean.select_dtypes(include=['object', 'category']).columns
-        num_cols = df_clean.select_dtypes(include=['int64', 'float64']).columns
-        
-        # Remove target from numerical columns if present
-        if target_col in num_cols:
-            num_cols = num_cols.drop(target_col)
+        # Identify categorical and numerical columns (the target is neither)
+        cat_cols, num_cols = _column_roles(df_clean, target_col)
             
         # Encode categorical variables
         for col in cat_cols:
             le = LabelEncoder()
             df_clean[col] = le.fit_transform(df_clean[col].astype(str))
             self.label_encoders[col] = le
+        self.added_categories = {}
             
         # Scale numerical variables
         if len(num_cols) > 0:
             df_clean[num_cols] = self.scaler.fit_transform(df_clean[num_cols])
+
+        # Remember the output column order so transform() can reproduce it
+        self.feature_names = [col for col in df_clean.columns if col != target_col]
+        self._compiled = None
             
         return df_clean
 
+    def partial_fit(self, df, target_col='fraud_status', max_categories=100000):
+        """
+        Updates the scaler statistics and encoder vocabularies from one batch so the
+        preprocessor can be fitted on data that does not fit in memory.
+        Column roles are fixed by the first batch; call finalize() after the last one.
+        Categorical columns whose vocabulary exceeds `max_categories` (IDs and the like)
+        are dropped from the features so memory stays bounded.
+        """
+        batch = df.drop(columns=[col for col in ('fraud_type', target_col) if col in df.columns])
+
+        # Convert boolean columns to integer, as in fit_transform
+        bool_cols = batch.select_dtypes(include=['bool']).columns
+        if len(bool_cols) > 0:
+            batch = batch.astype({col: int for col in bool_cols})
+
+        state = self._stream_state
+        if state is None:
+            cat_cols, num_cols = _column_roles(batch)
+            state = self._stream_state = {
+                'columns': list(batch.columns),
+                'num_cols': num_cols,
+                'vocab': {col: set() for col in cat_cols},
+                'dropped': [],
+            }
+
+        for col in list(state['vocab']):
+            vocab = state['vocab'][col]
+            vocab.update(batch[col].dropna().astype(str).unique())
+            if len(vocab) > max_categories:
+                print(f"Dropping high-cardinality column '{col}' (> {max_categories} categories)")
+                del state['vocab'][col]
+                state['dropped'].append(col)
+
+        if state['num_cols']:
+            self.scaler.partial_fit(batch[state['num_cols']])
+        return self
+
+    def finalize(self):
+        """
+        Turns the statistics gathered by partial_fit() into fitted encoders.
+        """
+        state = self._stream_state
+        if state is None:
+            raise ValueError("partial_fit() has not been called.")
+
+        self.label_encoders = {}
+        for col, vocab in state['vocab'].items():
+            le = LabelEncoder()
+            le.classes_ = np.array(sorted(vocab), dtype=object)
+            self.label_encoders[col] = le
+        self.added_categories = {}
+
+        self.feature_names = [col for col in state['columns'] if col not in state['dropped']]
+        self._stream_state = None
+        self._compiled = None
+        return self
+
+    def update(self, df, max_categories=100000):
+        """
+        Folds a batch of new data into an already fitted preprocessor without refitting.
+        Unseen categories are appended to `added_categories`, so existing codes keep their
+        values (until a vocabulary reaches `max_categories`; later newcomers stay
+        UNKNOWN_CATEGORY_CODE), and the scaler's running mean/variance absorb the batch.
+        The sklearn encoders are left as fitted. Returns the number of categories added.
+        """
+        added = 0
+        for col in self.label_encoders:
+            vocabulary = self.vocabulary(col)
+            if col not in df.columns or len(vocabulary) >= max_categories:
+                continue
+            values = pd.Index(df[col].dropna().astype(str).unique())
+            new = values[vocabulary.get_indexer(values) < 0]
+            new = np.asarray(sorted(new), dtype=object)[:max_categories - len(vocabulary)]
+            if len(new):
+                self.added_categories[col] = np.concatenate([self.added_categories.get(col, new[:0]), new])
+                added += len(new)
+
+        scaled_cols = getattr(self.scaler, 'feature_names_in_', None)
+        if scaled_cols is not None and all(col in df.columns for col in scaled_cols):
+            batch = df[list(scaled_cols)].apply(pd.to_numeric, errors='coerce').astype('float64').dropna()
+            if len(batch):
+                self.scaler.partial_fit(batch)
+        self._compiled = None
+        return added
+
+    def vocabulary(self, col):
+        """
+        Every category of `col` in code order: the encoder's classes_, then those added by update().
+        """
+        classes = np.asarray(self.label_encoders[col].classes_, dtype=object)
+        added = getattr(self, 'added_categories', {}).get(col)
+        return pd.Index(classes if added is None else np.concatenate([classes, added]))
+
+    def compile(self):
+        """
+        Builds the lookup tables used by transform() from the fitted scaler and encoders.
+        Each encoder becomes a hashed category->code index and the scaler becomes
+        per-column mean/scale pairs. The result is cached until the next fit.
+        """
+        if getattr(self, '_compiled', None) is not None:
+            return self._compiled
+        if getattr(self, 'feature_names', None) is None:
+            raise ValueError("Preprocessor has not been fitted (or predates transform support). Retrain with train_model.py.")
+
+        encoders = {}
+        for col in self.label_encoders:
+            index = self.vocabulary(col)
+            index.get_indexer(index[:1]) # Build the hash table once up front
+            encoders[col] = index
+
+        scaling = {}
+        scaled_cols = getattr(self.scaler, 'feature_names_in_', None)
+        if scaled_cols is not None:
+            for col, mean, scale in zip(scaled_cols, self.scaler.mean_, self.scaler.scale_):
+                scaling[col] = (np.float32(mean), np.float32(scale))
+
+        self._compiled = {'encoders': encoders, 'scaling': scaling}
+        return self._compiled
+
+    def transform(self, df):
+        """
+        Applies the fitted encoders and scaler to new data without refitting.
+        Writes straight into a preallocated float32 matrix whose columns follow
+        `feature_names`. Rows are never dropped: missing columns/values are NaN
+        (treated as missing by XGBoost) and unseen categories get UNKNOWN_CATEGORY_CODE.
+        """
+        tables = self.compile()
+        out = np.empty((len(df), len(self.feature_names)), dtype=np.float32, order='F')
+
+        for j, col in enumerate(self.feature_names):
+            dest = out[:, j]
+            if col not in df.columns:
+                dest[:] = np.nan
+                continue
+
+            values = df[col]
+            if col in tables['encoders']:
+                encoder = tables['encoders'][col]
+                if isinstance(values.dtype, pd.CategoricalDtype):
+                    # Look each category up once and broadcast through the codes
+                    lookup = encoder.get_indexer(values.cat.categories.astype(str))
+                    codes = values.cat.codes.to_numpy()
+                    dest[:] = np.where(codes >= 0, lookup[codes], UNKNOWN_CATEGORY_CODE)
+                else:
+                    # get_indexer marks misses with -1, i.e. UNKNOWN_CATEGORY_CODE
+                    dest[:] = encoder.get_indexer(values.astype(str))
+                continue
+
+            if not pd.api.types.is_numeric_dtype(values):
+                values = pd.to_numeric(values, errors='coerce')
+            dest[:] = values.to_numpy(dtype=np.float32, na_value=np.nan)
+            if col in tables['scaling']:
+                mean, scale = tables['scaling'][col]
+                dest -= mean
+                dest /= scale
+
+        return out
+
+    def __getstate__(self):
+        # Lookup tables are rebuilt lazily after unpickling
+        state = self.__dict__.copy()
+        state['_compiled'] = None
+        return state
+
+    def to_spec(self):
+        """
+        Exports the fitted state as plain arrays (no pickling needed):
+        a metadata dict plus a dict of NumPy arrays for the scaler and encoders.
+        """
+        if getattr(self, 'feature_names', None) is None:
+            raise ValueError("Preprocessor has not been fitted.")
+        scaled_cols = getattr(self.scaler, 'feature_names_in_', None)
+        meta = {
+            'feature_names': list(self.feature_names),
+            'categorical': list(self.label_encoders),
+            'scaled': [str(col) for col in scaled_cols] if scaled_cols is not None else [],
+        }
+        arrays = {f"classes__{col}": np.asarray(le.classes_, dtype=str) for col, le in self.label_encoders.items()}
+        arrays.update({f"added__{col}": np.asarray(added, dtype=str)
+                       for col, added in getattr(self, 'added_categories', {}).items()})
+        if meta['scaled']:
+            arrays['scaler__mean'] = self.scaler.mean_
+            arrays['scaler__var'] = self.scaler.var_
+            arrays['scaler__scale'] = self.scaler.scale_
+            arrays['scaler__n_samples_seen'] = np.asarray(self.scaler.n_samples_seen_)
+        return meta, arrays
+
+    @classmethod
+    def from_spec(cls, meta, arrays):
+        """
+        Rebuilds a fitted preprocessor from to_spec() output.
+        """
+        preprocessor = cls()
+        preprocessor.feature_names = list(meta['feature_names'])
+        for col in meta['categorical']:
+            le = LabelEncoder()
+            le.classes_ = np.asarray(arrays[f"classes__{col}"], dtype=object)
+            preprocessor.label_encoders[col] = le
+            if f"added__{col}" in arrays:
+                preprocessor.added_categories[col] = np.asarray(arrays[f"added__{col}"], dtype=object)
+        if meta['scaled']:
+            scaler = preprocessor.scaler
+            scaler.feature_names_in_ = np.asarray(meta['scaled'], dtype=object)
+            scaler.n_features_in_ = len(meta['scaled'])
+            scaler.mean_ = np.asarray(arrays['scaler__mean'])
+            scaler.var_ = np.asarray(arrays['scaler__var'])
+            scaler.scale_ = np.asarray(arrays['scaler__scale'])
+            n_seen = np.asarray(arrays['scaler__n_samples_seen'])
+            # Keep a NumPy scalar: StandardScaler.partial_fit reads its .shape
+            scaler.n_samples_seen_ = n_seen[()] if n_seen.ndim == 0 else n_seen
+        return preprocessor
+
     def preprocess_and_split(self, df, target_col='fraud_status', test_size=0.2, random_state=42):
         """
         Preprocesses the data and splits it into train and test sets.
@@ -71,3 +311,4 @@ if __name__ == "__main__":
     X_train, X_test, y_train, y_test = preprocessor.preprocess_and_split(df)
     print("Train shape:", X_train.shape)
     print("Test shape:", X_test.shape)
+    print("Transformed new rows:\n", preprocessor.transform(pd.DataFrame({'amount': [150.0], 'merchant': ['Z']})))
@@ -0,0 +1,166 @@
+import json
+import os
+import sqlite3
+import pandas as pd
+import numpy as np
+
+SQL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ffinance.sql')
+
+# Tri-tier bucketing from ffinance.sql. Segments are checked in order; within a
+# segment the conditions are OR'ed; rows matching nothing fall to the default.
+DEFAULT_RULES = {
+    'segments': [
+        {'name': 'High Risk', 'any': [
+            {'column': 'velocity_score', 'op': '>', 'value': 15},
+            {'column': 'spending_deviation_score', 'op': '>', 'value': 3.0},
+            {'column': 'geo_anomaly_score', 'op': '>', 'value': 0.8},
+        ]},
+        {'name': 'Medium Risk', 'any': [
+            {'column': 'velocity_score', 'op': 'between', 'value': [10, 15]},
+            {'column': 'spending_deviation_score', 'op': 'between', 'value': [1.5, 3.0]},
+        ]},
+    ],
+    'default': 'Low Risk'
+}
+
+_OPS = {
+    '>': np.greater,
+    '>=': np.greater_equal,
+    '<': np.less,
+    '<=': np.less_equal,
+    '==': np.equal,
+}
+_SQL_OPS = {'>': '>', '>=': '>=', '<': '<', '<=': '<=', '==': '='}
+
+class RiskRules:
+    """
+    Vectorized equivalent of the SQL CASE risk bucketing.
+    Each condition becomes a boolean NumPy mask; segments are resolved with
+    np.select in a single pass. Missing columns and NaN never match, like NULL in SQL.
+    """
+    def __init__(self, rules=None):
+        rules = rules or DEFAULT_RULES
+        self.segments = rules['segments']
+        self.default = rules.get('default', 'Low Risk')
+        self.labels = [segment['name'] for segment in self.segments] + [self.default]
+        for segment in self.segments:
+            for cond in segment['any']:
+                if cond['op'] != 'between' and cond['op'] not in _OPS:
+                    raise ValueError(f"Unsupported operator '{cond['op']}' in segment '{segment['name']}'")
+
+    @classmethod
+    def from_json(cls, path):
+        """
+        Loads thresholds from a JSON file with the same layout as DEFAULT_RULES.
+        """
+        with open(path) as f:
+            return cls(json.load(f))
+
+    @property
+    def columns(self):
+        return sorted({cond['column'] for segment in self.segments for cond in segment['any']})
+
+    @staticmethod
+    def _mask(values, cond):
+        if cond['op'] == 'between':
+            low, high = cond['value']
+            return (values >= low) & (values <= high)
+        return _OPS[cond['op']](values, cond['value'])
+
+    def segment_codes(self, df):
+        """
+        Returns an int8 array of indices into `labels`, one per row.
+        """
+        n = len(df)
+        arrays = {}
+        for col in self.columns:
+            if col in df.columns:
+                arrays[col] = pd.to_numeric(df[col], errors='coerce').to_numpy(dtype='float64')
+            else:
+                arrays[col] = np.full(n, np.nan)
+
+        conditions = []
+        for segment in self.segments:
+            mask = np.zeros(n, dtype=bool)
+            for cond in segment['any']:
+                mask |= self._mask(arrays[cond['column']], cond)
+            conditions.append(mask)
+
+        choices = np.arange(len(self.segments), dtype=np.int8)
+        return np.select(conditions, choices, default=np.int8(len(self.segments))).astype(np.int8)
+
+    def assign(self, df):
+        """
+        Returns the risk segment of every row as a pandas Categorical.
+        """
+        return pd.Categorical.from_codes(self.segment_codes(df), categories=self.labels)
+
+    def to_sql_case(self):
+        """
+        Renders the rules as a SQL CASE expression (useful for config-driven rules).
+        """
+        lines = ["CASE"]
+        for segment in self.segments:
+            parts = []
+            for cond in segment['any']:
+                if cond['op'] == 'between':
+                    parts.append(f"{cond['column']} BETWEEN {cond['value'][0]} AND {cond['value'][1]}")
+                else:
+                    parts.append(f"{cond['column']} {_SQL_OPS[cond['op']]} {cond['value']}")
+            lines.append(f"    WHEN {' OR '.join(parts)} THEN '{segment['name']}'")
+        lines.append(f"    ELSE '{self.default}'")
+        lines.append("END")
+        return "\n".join(lines)
+
+def load_bucketing_query(sql_path=SQL_PATH):
+    """
+    Returns the risk bucketing SELECT statement from ffinance.sql.
+    """
+    with open(sql_path) as f:
+        statements = f.read().split(';')
+    for statement in statements:
+        if 'risk_segment' in statement:
+            # Drop comment lines so the statement runs on its own
+            return "\n".join(line for line in statement.splitlines() if not line.strip().startswith('--'))
+    raise ValueError(f"No risk bucketing query found in {sql_path}")
+
+def check_sqlite_parity(df, rules=None, query=None):
+    """
+    Runs the SQL bucketing query on an in-memory SQLite copy of `df` and compares
+    it with the vectorized rules. Returns the number of mismatching rows.
+    """
+    rules = rules or RiskRules()
+    query = query or load_bucketing_query()
+    table = df[['transaction_id', 'amount_ngn', 'is_fraud'] + rules.columns]
+
+    with sqlite3.connect(':memory:') as conn:
+        table.to_sql('finance', conn, index=False)
+        sql_result = pd.read_sql_query(query, conn)
+
+    native = pd.Series(rules.assign(table), index=table.index).astype(str).to_numpy()
+    mismatches = int((sql_result['risk_segment'].to_numpy() != native).sum())
+    print(f"SQLite parity: {len(df) - mismatches:,}/{len(df):,} rows match")
+    return mismatches
+
+def sample_scores(rows, seed=42):
+    """
+    Random behavioral scores around the bucketing thresholds, including exact
+    boundary values and NULLs, for parity checks and benchmarks.
+    """
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'transaction_id': np.arange(rows),
+        'amount_ngn': rng.uniform(10, 500000, rows).round(2),
+        'velocity_score': rng.integers(0, 25, rows).astype('float64'),
+        'spending_deviation_score': rng.choice([0.5, 1.5, 2.2, 3.0, 3.5, 5.0], rows) + rng.choice([0.0, 0.01], rows),
+        'geo_anomaly_score': rng.uniform(0, 1, rows).round(2),
+        'is_fraud': rng.integers(0, 2, rows),
+    })
+    for col in ['velocity_score', 'spending_deviation_score', 'geo_anomaly_score']:
+        df.loc[rng.random(rows) < 0.01, col] = np.nan
+    return df
+
+if __name__ == "__main__":
+    rules = RiskRules()
+    print(rules.to_sql_case())
+    check_sqlite_parity(sample_scores(100000))
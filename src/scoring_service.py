@@ -0,0 +1,221 @@
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from risk_score import RiskScoringEngine
+from model_registry import ModelRegistry
+
+class MicroBatcher:
+    """
+    Queues single transactions and scores them together.
+    A batch is flushed to RiskScoringEngine.score_batch as soon as it holds
+    `max_batch_size` rows or its oldest row has waited `max_latency_ms`.
+    Each caller awaits a future resolved with its own score.
+    """
+    def __init__(self, engine, max_batch_size=256, max_latency_ms=5.0, latency_window=10000):
+        self.engine = engine
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency_ms / 1000
+        self._queue = None
+        self._worker = None
+        # One scoring thread keeps the event loop free to collect the next batch
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._latencies = deque(maxlen=latency_window)
+        self._batch_sizes = Counter()
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        self._executor.shutdown(wait=False)
+
+    async def score(self, transaction):
+        """
+        Scores one transaction (dict) through the batch path.
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((transaction, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self):
+        item = await self._queue.get()
+        batch = [item]
+        deadline = item[2] + self.max_latency
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        # Take whatever else is already waiting without blocking
+        while len(batch) < self.max_batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            transactions = [txn for txn, _, _ in batch]
+            try:
+                scores = await loop.run_in_executor(self._executor, self.engine.score_batch, transactions)
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            now = time.perf_counter()
+            self._batch_sizes[len(batch)] += 1
+            for (_, future, enqueued), score in zip(batch, scores):
+                self._latencies.append(now - enqueued)
+                if not future.done():
+                    future.set_result(float(score))
+
+    def stats(self):
+        """
+        Latency percentiles (ms, over the recent window) and a power-of-two batch-size histogram.
+        """
+        latencies = np.array(self._latencies) * 1000
+        histogram = Counter()
+        for size, count in self._batch_sizes.items():
+            histogram[1 << (size - 1).bit_length()] += count
+        return {
+            'requests': len(latencies),
+            'latency_ms': {
+                'p50': float(np.percentile(latencies, 50)) if len(latencies) else None,
+                'p99': float(np.percentile(latencies, 99)) if len(latencies) else None,
+            },
+            'batches': sum(self._batch_sizes.values()),
+            'batch_size_histogram': {f"<={bucket}": histogram[bucket] for bucket in sorted(histogram)},
+        }
+
+def _http_response(status, body):
+    payload = json.dumps(body).encode()
+    head = f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n"
+    return head.encode() + payload
+
+class ScoringServer:
+    """
+    Minimal asyncio HTTP/1.1 server (keep-alive) in front of a MicroBatcher.
+        POST /score    body: transaction JSON object -> {"score": float}
+        GET  /metrics  -> latency and batch-size statistics
+        GET  /health   -> {"status": "ok"}
+    """
+    def __init__(self, batcher, host='127.0.0.1', port=8080):
+        self.batcher = batcher
+        self.host = host
+        self.port = port
+        self._server = None
+
+    async def start(self):
+        await self.batcher.start()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        print(f"Scoring service listening on http://{self.host}:{self.port}")
+
+    async def watch_registry(self, interval=5.0):
+        """
+        Polls the model registry and hot-swaps the engine when a new version is promoted.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await loop.run_in_executor(None, self.batcher.engine.refresh)
+            except Exception as e:
+                print(f"Model refresh failed: {e}")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        await self.batcher.stop()
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode().split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    key, _, value = line.decode().partition(':')
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                writer.write(await self._route(method, path, body))
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method, path, body):
+        if method == 'POST' and path == '/score':
+            try:
+                transaction = json.loads(body)
+            except json.JSONDecodeError as e:
+                return _http_response("400 Bad Request", {'error': str(e)})
+            if not isinstance(transaction, dict):
+                return _http_response("400 Bad Request", {'error': 'Expected a JSON object'})
+            try:
+                score = await self.batcher.score(transaction)
+            except Exception as e:
+                # A failed batch fails every request in it; answer rather than drop the connection
+                return _http_response("500 Internal Server Error", {'error': str(e)})
+            return _http_response("200 OK", {'score': score})
+        if method == 'GET' and path == '/metrics':
+            return _http_response("200 OK", self.batcher.stats())
+        if method == 'GET' and path == '/health':
+            return _http_response("200 OK", {'status': 'ok'})
+        return _http_response("404 Not Found", {'error': f"No route for {method} {path}"})
+
+async def serve(host='127.0.0.1', port=8080, max_batch_size=256, max_latency_ms=5.0,
+                model_path='xgboost_fraud_model.pkl', preprocessor_path='preprocessor.pkl', registry_dir=None,
+                refresh_interval=5.0):
+    # Artifacts are loaded once for the lifetime of the service (or hot-swapped from the registry)
+    if registry_dir:
+        engine = RiskScoringEngine.from_registry(ModelRegistry(registry_dir))
+    else:
+        engine = RiskScoringEngine(model_path=model_path, preprocessor_path=preprocessor_path)
+    server = ScoringServer(MicroBatcher(engine, max_batch_size, max_latency_ms), host, port)
+    await server.start()
+    watcher = asyncio.create_task(server.watch_registry(refresh_interval)) if registry_dir else None
+    try:
+        await asyncio.Event().wait()
+    finally:
+        if watcher is not None:
+            watcher.cancel()
+        await server.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-batching risk scoring service")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Interface to bind")
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on")
+    parser.add_argument("--max-batch-size", type=int, default=256, help="Flush a batch at this many rows")
+    parser.add_argument("--max-latency-ms", type=float, default=5.0, help="Flush a batch after its oldest row waited this long")
+    parser.add_argument("--registry", type=str, default=None, help="Serve from this model registry directory with hot reload")
+    parser.add_argument("--refresh-interval", type=float, default=5.0, help="Seconds between registry checks")
+    args = parser.parse_args()
+
+    asyncio.run(serve(args.host, args.port, args.max_batch_size, args.max_latency_ms,
+                      registry_dir=args.registry, refresh_interval=args.refresh_interval))
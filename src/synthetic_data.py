@@ -0,0 +1,180 @@
+import argparse
+import numpy as np
+import pandas as pd
+
+# Value sets for the real dataset's schema
+TRANSACTION_TYPES = ['transfer', 'payment', 'withdrawal', 'deposit', 'airtime', 'bill_payment']
+TRANSACTION_TYPE_WEIGHTS = [0.34, 0.28, 0.14, 0.10, 0.08, 0.06]
+MERCHANT_CATEGORIES = ['groceries', 'utilities', 'transport', 'electronics', 'fashion', 'restaurants',
+                       'airtime', 'betting', 'health', 'education', 'fuel', 'entertainment']
+LOCATIONS = ['Lagos', 'Abuja', 'Kano', 'Port Harcourt', 'Ibadan', 'Enugu', 'Kaduna', 'Benin City',
+             'Onitsha', 'Jos', 'Ilorin', 'Aba']
+LOCATION_WEIGHTS = [0.30, 0.14, 0.10, 0.09, 0.08, 0.06, 0.05, 0.05, 0.04, 0.03, 0.03, 0.03]
+DEVICES = ['mobile', 'web', 'pos', 'atm', 'ussd']
+CHANNELS = ['app', 'card', 'bank_transfer', 'ussd', 'qr']
+# Persona: (share of accounts, median amount in NGN, lognormal sigma)
+PERSONAS = {
+    'student': (0.20, 4000, 0.9),
+    'salary_earner': (0.35, 15000, 1.0),
+    'trader': (0.20, 45000, 1.2),
+    'business_owner': (0.10, 150000, 1.3),
+    'retiree': (0.10, 8000, 0.8),
+    'high_net_worth': (0.05, 600000, 1.4),
+}
+FRAUD_TYPES = ['account_takeover', 'card_not_present', 'social_engineering', 'sim_swap', 'identity_theft']
+# Relative transaction intensity per hour of day (quiet nights, busy evenings)
+HOURLY_INTENSITY = np.array([0.20, 0.12, 0.08, 0.06, 0.08, 0.20, 0.50, 0.90, 1.20, 1.30, 1.30, 1.30,
+                             1.40, 1.30, 1.20, 1.20, 1.30, 1.50, 1.60, 1.50, 1.20, 0.90, 0.60, 0.35])
+
+class SyntheticTransactionGenerator:
+    """
+    Seeded generator for the real dataset's schema (amount_ngn, merchant_category,
+    sender_persona, is_night_txn, ... is_fraud) at any scale.
+
+    - Account activity follows a power law (Zipf weights over `n_accounts`), so a
+      few accounts carry long histories and most transact rarely.
+    - Timestamps rise through `days` days with a day/night cycle; rows are
+      generated in time order, so chunks can be streamed or generated in parallel.
+    - Each account has a persona (amount scale) and a home location.
+    - Fraud is more likely at night, at high velocity/deviation and away from
+      home, scaled so the expected rate is `fraud_rate`.
+
+    Chunk `i` depends only on (seed, chunk_rows, i), so any chunk of a 100M-row
+    dataset can be regenerated on its own, in any order or in parallel.
+    """
+    def __init__(self, total_rows, seed=42, n_accounts=None, zipf_exponent=1.1, start="2024-01-01",
+                 days=30, fraud_rate=0.02, chunk_rows=1000000):
+        self.total_rows = int(total_rows)
+        self.seed = seed
+        self.n_accounts = int(n_accounts or max(1000, self.total_rows // 50))
+        self.start = np.datetime64(start, 's')
+        self.span_seconds = days * 86400
+        self.fraud_rate = fraud_rate
+        self.chunk_rows = chunk_rows
+
+        rng = np.random.default_rng([seed, 0xACC])
+        # Zipf weights assigned to accounts in random order
+        weights = rng.permutation(np.arange(1, self.n_accounts + 1, dtype='float64') ** -zipf_exponent)
+        self._account_cdf = np.cumsum(weights / weights.sum())
+        # Expected transactions per account over the whole span
+        self._account_rate = weights / weights.sum() * self.total_rows
+
+        shares = np.array([share for share, _, _ in PERSONAS.values()])
+        self._persona = rng.choice(len(PERSONAS), self.n_accounts, p=shares / shares.sum()).astype('int8')
+        self._home = rng.choice(len(LOCATIONS), self.n_accounts, p=LOCATION_WEIGHTS).astype('int8')
+        self._persona_median = np.array([median for _, median, _ in PERSONAS.values()], dtype='float64')
+        self._persona_sigma = np.array([sigma for _, _, sigma in PERSONAS.values()], dtype='float64')
+
+        # Inverse CDF of the hourly intensity over the whole span
+        hours = int(np.ceil(self.span_seconds / 3600))
+        hour_of_day = (np.arange(hours) + self.start.astype('datetime64[h]').astype('int64')) % 24
+        intensity = HOURLY_INTENSITY[hour_of_day]
+        self._hour_cdf = np.concatenate([[0.0], np.cumsum(intensity) / intensity.sum()])
+
+    def _timestamps(self, rng, first_row, rows):
+        # Row positions map to quantiles of the intensity curve, so time keeps rising across chunks
+        quantiles = (first_row + np.sort(rng.random(rows)) * rows) / self.total_rows
+        hour = np.clip(np.searchsorted(self._hour_cdf, quantiles, side='right') - 1, 0, len(self._hour_cdf) - 2)
+        within = (quantiles - self._hour_cdf[hour]) / np.maximum(self._hour_cdf[hour + 1] - self._hour_cdf[hour], 1e-18)
+        seconds = np.minimum((hour + within) * 3600, self.span_seconds - 1)
+        return self.start + seconds.astype('int64').astype('timedelta64[s]')
+
+    def chunk(self, index, rows=None):
+        """
+        Generates chunk `index` (rows [index * chunk_rows, ...)) as a DataFrame.
+        """
+        first_row = index * self.chunk_rows
+        rows = min(rows or self.chunk_rows, self.total_rows - first_row)
+        if rows <= 0:
+            return pd.DataFrame()
+        rng = np.random.default_rng([self.seed, index + 1])
+
+        sender = np.minimum(np.searchsorted(self._account_cdf, rng.random(rows)), self.n_accounts - 1)
+        receiver = np.minimum(np.searchsorted(self._account_cdf, rng.random(rows)), self.n_accounts - 1)
+        stamps = self._timestamps(rng, first_row, rows)
+        hour = (stamps.astype('datetime64[h]').astype('int64') % 24)
+        day_of_month = (stamps.astype('datetime64[D]') - stamps.astype('datetime64[M]')).astype('int64') + 1
+
+        persona = self._persona[sender]
+        amount = np.exp(np.log(self._persona_median[persona]) + self._persona_sigma[persona] * rng.standard_normal(rows))
+        away = rng.random(rows) < 0.06
+        location = np.where(away, rng.integers(0, len(LOCATIONS), rows), self._home[sender])
+
+        # Behavioral scores as shipped with the real dataset
+        rate_per_day = self._account_rate[sender] / max(self.span_seconds / 86400, 1)
+        velocity = rng.poisson(np.minimum(rate_per_day, 40) + 1).astype('float64')
+        deviation = np.abs(rng.standard_t(4, rows))
+        geo = np.where(away & (location != self._home[sender]), rng.uniform(0.6, 1.0, rows), rng.beta(1, 12, rows))
+        since_last = rng.exponential(86400 / np.maximum(rate_per_day, 1 / 30))
+        is_night = (hour >= 22) | (hour < 5)
+        is_salary_week = day_of_month >= 25
+
+        # Relative fraud risk, normalised so the expected rate is fraud_rate
+        risk = np.exp(1.2 * is_night + 0.08 * np.minimum(velocity, 30) + 0.6 * np.minimum(deviation, 5)
+                      + 2.5 * (geo > 0.8) + 0.4 * (amount > 200000))
+        is_fraud = rng.random(rows) < np.minimum(self.fraud_rate * risk / risk.mean(), 0.95)
+        fraud_type = np.where(is_fraud, np.array(FRAUD_TYPES, dtype=object)[rng.integers(0, len(FRAUD_TYPES), rows)], None)
+
+        ids = np.arange(first_row, first_row + rows)
+        return pd.DataFrame({
+            'transaction_id': np.char.add('TXN', np.char.zfill(ids.astype(str), 12)).astype(object),
+            'timestamp': np.datetime_as_string(stamps, unit='s').astype(object),
+            'sender_account': np.char.add('ACC', np.char.zfill(sender.astype(str), 9)).astype(object),
+            'receiver_account': np.char.add('ACC', np.char.zfill(receiver.astype(str), 9)).astype(object),
+            'amount_ngn': np.round(amount, 2),
+            'transaction_type': np.array(TRANSACTION_TYPES, dtype=object)[
+                rng.choice(len(TRANSACTION_TYPES), rows, p=TRANSACTION_TYPE_WEIGHTS)],
+            'merchant_category': np.array(MERCHANT_CATEGORIES, dtype=object)[rng.integers(0, len(MERCHANT_CATEGORIES), rows)],
+            'location': np.array(LOCATIONS, dtype=object)[location],
+            'device_used': np.array(DEVICES, dtype=object)[rng.integers(0, len(DEVICES), rows)],
+            'payment_channel': np.array(CHANNELS, dtype=object)[rng.integers(0, len(CHANNELS), rows)],
+            'sender_persona': np.array(list(PERSONAS), dtype=object)[persona],
+            'time_since_last_transaction': np.round(since_last, 1),
+            'velocity_score': velocity,
+            'spending_deviation_score': np.round(deviation, 4),
+            'geo_anomaly_score': np.round(geo, 4),
+            'is_night_txn': is_night,
+            'is_salary_week': is_salary_week,
+            'is_fraud': is_fraud,
+            'fraud_type': fraud_type,
+        })
+
+    def iter_batches(self):
+        """
+        Yields the whole dataset as DataFrames of `chunk_rows` rows.
+        """
+        for index in range(-(-self.total_rows // self.chunk_rows)):
+            yield self.chunk(index)
+
+def generate_realistic_data(rows=1000, seed=42, **kwargs):
+    """
+    Generates `rows` transactions in the real dataset's schema (see SyntheticTransactionGenerator).
+    """
+    generator = SyntheticTransactionGenerator(rows, seed=seed, chunk_rows=max(rows, 1), **kwargs)
+    return generator.chunk(0)
+
+if __name__ == "__main__":
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    parser = argparse.ArgumentParser(description="Write a seeded synthetic transactions dataset to Parquet")
+    parser.add_argument("--rows", type=int, default=1000000, help="Rows to generate (chunks of --batch-size)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    parser.add_argument("--accounts", type=int, default=None, help="Distinct accounts (default: rows / 50)")
+    parser.add_argument("--days", type=int, default=30, help="Days covered by the timestamps")
+    parser.add_argument("--fraud-rate", type=float, default=0.02, help="Expected fraud rate")
+    parser.add_argument("--batch-size", type=int, default=1000000, help="Rows per generated chunk / row group")
+    parser.add_argument("--out", type=str, default="synthetic_transactions.parquet", help="Output Parquet file")
+    args = parser.parse_args()
+
+    generator = SyntheticTransactionGenerator(args.rows, seed=args.seed, n_accounts=args.accounts, days=args.days,
+                                              fraud_rate=args.fraud_rate, chunk_rows=args.batch_size)
+    writer, written = None, 0
+    for batch in generator.iter_batches():
+        # Reuse the first chunk's schema so an all-null fraud_type chunk still matches
+        table = pa.Table.from_pandas(batch, schema=writer.schema if writer else None, preserve_index=False)
+        writer = writer or pq.ParquetWriter(args.out, table.schema)
+        writer.write_table(table)
+        written += len(batch)
+        print(f"Generated {written:,} / {args.rows:,} rows")
+    if writer is not None:
+        writer.close()
@@ -3,10 +3,63 @@ import numpy as np
 import xgboost as xgb
 from sklearn.metrics import classification_report, accuracy_score
 import joblib
-from data_loader import load_financial_data
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+import pyarrow.parquet as pq
+from data_loader import load_financial_data, iter_financial_batches, CACHE_DIR, DEFAULT_BATCH_SIZE
 from preprocessing import FinancialPreprocessor
+from model_registry import ModelRegistry
+from instrumentation import instrumented, stage, current, peak_rss_mb
+from drift import DriftMonitor, PSI_ALERT, drift_report
+from calibration import Calibration, calibration_report, CALIBRATION_METHODS, PRECISION_TARGET, RECALL_TARGET
 
-def train_fraud_model(limit=10000, use_synthetic=True):
+TARGET_CANDIDATES = ['isFraud', 'is_fraud', 'Class']
+XGB_PARAMS = {
+    'n_estimators': 100,
+    'learning_rate': 0.1,
+    'max_depth': 5,
+    'eval_metric': 'logloss'
+}
+# Written beside the pickles; bundles carry the same data in their manifest
+CALIBRATION_FILE = 'calibration.json'
+
+def load_params(path):
+    """
+    Overrides XGB_PARAMS with a JSON config, e.g. best_params.json written by tune.py.
+    """
+    with open(path) as f:
+        XGB_PARAMS.update(json.load(f))
+    print(f"Using XGBoost parameters from {path}: {XGB_PARAMS}")
+    return XGB_PARAMS
+
+def _booster_params():
+    """XGB_PARAMS for xgb.train (everything but the tree count, which is num_boost_round)."""
+    params = {key: value for key, value in XGB_PARAMS.items() if key != 'n_estimators'}
+    return dict(params, objective='binary:logistic', tree_method='hist')
+
+def _fit_calibration(y_test, prob, method='isotonic', precision_target=PRECISION_TARGET, recall_target=RECALL_TARGET):
+    """
+    Calibrates the validation split's probabilities and picks the score cutoffs
+    (see calibration.Calibration). Returns the Calibration, or None when disabled or
+    the split holds a single class; a stale calibration.json is removed in that case.
+    """
+    calibration = Calibration.fit(y_test, prob, method, precision_target, recall_target) if method else None
+    if calibration is None:
+        if method:
+            print("Validation split holds a single class; skipping calibration.")
+        if os.path.exists(CALIBRATION_FILE):
+            os.remove(CALIBRATION_FILE)
+        return None
+    calibration_report(calibration)
+    calibration.save(CALIBRATION_FILE)
+    return calibration
+
+@instrumented()
+def train_fraud_model(limit=10000, use_synthetic=True, calibration='isotonic', precision_target=PRECISION_TARGET,
+                      recall_target=RECALL_TARGET):
     print("Starting model training pipeline...")
     
     # 1. Load Data
@@ -29,6 +82,7 @@ def train_fraud_model(limit=10000, use_synthetic=True):
             return None, None
             
     print(f"Using target column: {target_col}")
+    current().rows = len(df)
     
     # Ensure target is integer (0/1) if it's boolean or other
     try:
@@ -36,18 +90,15 @@ def train_fraud_model(limit=10000, use_synthetic=True):
     except:
         pass
 
+    # Reference histograms for the drift monitor that triggers incremental retraining
+    reference = DriftMonitor().observe(df)
+
     preprocessor = FinancialPreprocessor()
     X_train, X_test, y_train, y_test = preprocessor.preprocess_and_split(df, target_col=target_col)
     
     # 3. Train Model
     print("Training XGBoost model...")
-    model = xgb.XGBClassifier(
-        n_estimators=100,
-        learning_rate=0.1,
-        max_depth=5,
-        use_label_encoder=False,
-        eval_metric='logloss'
-    )
+    model = xgb.XGBClassifier(use_label_encoder=False, **XGB_PARAMS)
     
     model.fit(X_train, y_train)
     
@@ -56,14 +107,322 @@ def train_fraud_model(limit=10000, use_synthetic=True):
     print("Model Evaluation:")
     print(classification_report(y_test, y_pred))
     print(f"Accuracy: {accuracy_score(y_test, y_pred)}")
+
+    # Calibrated probabilities and score cutoffs from the validation split
+    calibration = _fit_calibration(y_test, model.predict_proba(X_test)[:, 1], calibration,
+                                   precision_target, recall_target)
     
     # 5. Save Artifacts
     print("Saving model and preprocessor...")
     joblib.dump(model, 'xgboost_fraud_model.pkl')
     joblib.dump(preprocessor, 'preprocessor.pkl')
+    # Versioned native bundle for fast cold starts and hot reload
+    ModelRegistry().save(model, preprocessor, metadata={'target_col': target_col,
+                                                        'drift_reference': reference.to_dict(),
+                                                        'calibration': calibration.to_dict() if calibration else None})
     
     return model, preprocessor
 
+@contextmanager
+def _phase(name):
+    """Prints wall time and peak RSS (so far) for a training phase and records it as a stage."""
+    start = time.perf_counter()
+    with stage(f"train_fraud_model_out_of_core.{name}") as record:
+        yield record
+    print(f"[{name}] wall time: {time.perf_counter() - start:.2f}s | peak RSS: {peak_rss_mb():,.1f} MB")
+
+def _holdout_mask(rows, batch_index, test_size, random_state):
+    """Deterministic per-batch test split, identical on every pass over the data."""
+    return np.random.default_rng([random_state, batch_index]).random(rows) < test_size
+
+def _labelled_batches(make_batches, target_col):
+    """Yields (batch_index, batch, labels), skipping rows without a label."""
+    for batch_index, batch in enumerate(make_batches()):
+        batch = batch[batch[target_col].notna()]
+        yield batch_index, batch, batch[target_col].astype(int).to_numpy()
+
+class _TrainBatchIter(xgb.DataIter):
+    """Feeds preprocessed training batches to XGBoost's external-memory DMatrix."""
+    def __init__(self, make_batches, preprocessor, target_col, test_size, random_state, cache_prefix):
+        self._make_batches = make_batches
+        self._preprocessor = preprocessor
+        self._target_col = target_col
+        self._test_size = test_size
+        self._random_state = random_state
+        self._batches = None
+        super().__init__(cache_prefix=cache_prefix)
+
+    def reset(self):
+        self._batches = None
+
+    def next(self, input_data):
+        if self._batches is None:
+            self._batches = _labelled_batches(self._make_batches, self._target_col)
+        for batch_index, batch, y in self._batches:
+            train = ~_holdout_mask(len(batch), batch_index, self._test_size, self._random_state)
+            if not train.any():
+                continue
+            X = self._preprocessor.transform(batch)
+            input_data(data=X[train], label=y[train])
+            return True
+        return False
+
+def _spool_synthetic(limit, batch_size):
+    """Writes synthetic batches to Parquet so every training pass sees the same rows."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = os.path.join(CACHE_DIR, f"synthetic_training__{limit}.parquet")
+    writer = None
+    for batch in iter_financial_batches(batch_size=batch_size, limit=limit, use_synthetic=True, as_arrow=True):
+        if writer is None:
+            writer = pq.ParquetWriter(path, batch.schema)
+        writer.write_batch(batch)
+    if writer is not None:
+        writer.close()
+    return path
+
+@instrumented()
+def train_fraud_model_out_of_core(limit=None, use_synthetic=False, source_path=None,
+                                  batch_size=DEFAULT_BATCH_SIZE, test_size=0.2, random_state=42,
+                                  calibration='isotonic', precision_target=PRECISION_TARGET,
+                                  recall_target=RECALL_TARGET):
+    """
+    Trains the fraud model without holding the dataset in memory.
+    Pass 1 fits the preprocessor from running statistics (partial_fit), pass 2 builds an
+    external-memory quantile DMatrix from chunked batches, pass 3 evaluates on the
+    held-out rows. Peak memory depends on batch_size, not on the dataset size.
+    """
+    print("Starting out-of-core model training pipeline...")
+
+    if use_synthetic:
+        with _phase("spool synthetic data"):
+            source_path = _spool_synthetic(limit if limit else 1000, batch_size)
+    # Hub streams go through the Parquet cache so later passes are local reads
+    make_batches = lambda: iter_financial_batches(batch_size=batch_size, limit=limit, source_path=source_path,
+                                                  use_cache=source_path is None)
+
+    # 1. Fit preprocessor in a streaming pass
+    preprocessor = FinancialPreprocessor()
+    reference = DriftMonitor()
+    target_col = None
+    rows = 0
+    with _phase("fit preprocessor") as phase:
+        for batch in make_batches():
+            if target_col is None:
+                target_col = next((col for col in TARGET_CANDIDATES if col in batch.columns), None)
+                if target_col is None:
+                    print(f"Target column not found. Available: {batch.columns}")
+                    return None, None
+                print(f"Using target column: {target_col}")
+            preprocessor.partial_fit(batch, target_col=target_col)
+            reference.observe(batch)
+            rows += len(batch)
+        if target_col is None:
+            print("Failed to load data.")
+            return None, None
+        preprocessor.finalize()
+        phase.rows = rows
+    current().rows = rows
+    print(f"Fitted preprocessor on {rows:,} rows")
+
+    # 2. Train from external memory
+    params = _booster_params()
+    with tempfile.TemporaryDirectory() as cache_dir:
+        data_iter = _TrainBatchIter(make_batches, preprocessor, target_col, test_size, random_state,
+                                    cache_prefix=os.path.join(cache_dir, "dmatrix"))
+        with _phase("build external-memory DMatrix"):
+            if hasattr(xgb, 'ExtMemQuantileDMatrix'):
+                dtrain = xgb.ExtMemQuantileDMatrix(data_iter)
+            else:
+                dtrain = xgb.DMatrix(data_iter)
+        print("Training XGBoost model...")
+        with _phase("train"):
+            booster = xgb.train(params, dtrain, num_boost_round=XGB_PARAMS['n_estimators'])
+        del dtrain
+
+    # 3. Evaluate on the held-out rows of each batch
+    y_test, y_prob = [], []
+    with _phase("evaluate"):
+        for batch_index, batch, y in _labelled_batches(make_batches, target_col):
+            test = _holdout_mask(len(batch), batch_index, test_size, random_state)
+            if not test.any():
+                continue
+            prob = booster.inplace_predict(preprocessor.transform(batch)[test], validate_features=False)
+            y_test.append(y[test].astype(np.int8))
+            y_prob.append(prob)
+    y_test, y_prob = np.concatenate(y_test), np.concatenate(y_prob)
+    y_pred = (y_prob > 0.5).astype(np.int8)
+    print("Model Evaluation:")
+    print(classification_report(y_test, y_pred))
+    print(f"Accuracy: {accuracy_score(y_test, y_pred)}")
+    calibration = _fit_calibration(y_test, y_prob, calibration, precision_target, recall_target)
+
+    # 4. Save Artifacts (same format as the in-memory pipeline)
+    print("Saving model and preprocessor...")
+    model = xgb.XGBClassifier(**XGB_PARAMS)
+    model.load_model(bytearray(booster.save_raw(raw_format='json')))
+    joblib.dump(model, 'xgboost_fraud_model.pkl')
+    joblib.dump(preprocessor, 'preprocessor.pkl')
+    # Versioned native bundle for fast cold starts and hot reload
+    ModelRegistry().save(model, preprocessor, metadata={'target_col': target_col,
+                                                        'drift_reference': reference.to_dict(),
+                                                        'calibration': calibration.to_dict() if calibration else None})
+
+    return model, preprocessor
+
+def _float32_cut(threshold, mean, scale):
+    """
+    The smallest raw float32 value that (x - mean) / scale maps exactly onto `threshold`
+    in float32, as FinancialPreprocessor.transform computes it. Hist split conditions
+    are transformed data values, so ties (integer velocities, rounded amounts) must
+    map back exactly for `x < threshold` to keep its meaning.
+    """
+    raw = np.float32(float(threshold) * float(scale) + float(mean))
+    candidates, below, above = [raw], raw, raw
+    for _ in range(4):
+        below = np.nextafter(below, np.float32(-np.inf))
+        above = np.nextafter(above, np.float32(np.inf))
+        candidates += [below, above]
+    # Several raw values can round onto the threshold; the split boundary is the smallest
+    return min((value for value in candidates if (value - mean) / scale == threshold), default=raw)
+
+def _remap_scaled_thresholds(booster, feature_names, before, after):
+    """
+    Returns a copy of `booster` whose split thresholds on scaled features are moved
+    from the `before` scaling to the `after` one ({column: (float32 mean, float32 scale)},
+    as in FinancialPreprocessor.compile()). Scaling is affine and increasing, so the
+    existing trees make the same decisions (to float32 precision) on inputs transformed
+    with the updated scaler.
+    """
+    remap = {j: (before[col], after[col]) for j, col in enumerate(feature_names) if col in before and col in after}
+    model = json.loads(booster.save_raw(raw_format='json'))
+    for tree in model['learner']['gradient_booster']['model']['trees']:
+        conditions = tree['split_conditions']
+        for node, (feature, left) in enumerate(zip(tree['split_indices'], tree['left_children'])):
+            # Leaves (left == -1) store their value in split_conditions
+            if left != -1 and feature in remap:
+                (m1, s1), (m2, s2) = remap[feature]
+                raw = _float32_cut(np.float32(conditions[node]), m1, s1)
+                conditions[node] = float((raw - m2) / s2)
+    remapped = xgb.Booster()
+    remapped.load_model(bytearray(json.dumps(model).encode()))
+    return remapped
+
+@instrumented()
+def train_fraud_model_incremental(limit=None, use_synthetic=False, source_path=None, batch_size=DEFAULT_BATCH_SIZE,
+                                  num_boost_round=20, psi_threshold=PSI_ALERT, force=False, test_size=0.2,
+                                  random_state=42, registry=None, calibration='isotonic',
+                                  precision_target=PRECISION_TARGET, recall_target=RECALL_TARGET):
+    """
+    Continues training the registry's latest model on new data only.
+    Pass 1 streams the new batches through a drift monitor (PSI against the histograms
+    recorded when the model was trained) and folds them into the encoder vocabularies
+    and scaler statistics (FinancialPreprocessor.update). Unless a key feature drifted
+    beyond `psi_threshold` (or `force`), training stops there.
+    Pass 2 adds `num_boost_round` trees on the new batches, boosting from the saved
+    booster; existing split thresholds are remapped to the updated scaler first.
+    Returns (model, preprocessor), or (None, None) when no retraining was needed.
+    """
+    print("Starting incremental training...")
+    registry = registry or ModelRegistry()
+    try:
+        bundle = registry.get()
+    except ValueError as e:
+        print(f"{e}")
+        return None, None
+    booster, preprocessor = bundle.booster, bundle.preprocessor
+    metadata = bundle.manifest.get('metadata', {})
+    target_col = metadata.get('target_col')
+    reference = DriftMonitor.from_dict(metadata['drift_reference']) if metadata.get('drift_reference') else None
+
+    if use_synthetic:
+        with _phase("spool synthetic data"):
+            source_path = _spool_synthetic(limit if limit else 1000, batch_size)
+    make_batches = lambda: iter_financial_batches(batch_size=batch_size, limit=limit, source_path=source_path,
+                                                  use_cache=source_path is None)
+
+    # 1. Drift check and preprocessor update in one streaming pass
+    before = dict(preprocessor.compile()['scaling'])
+    window = reference.new_window() if reference else DriftMonitor()
+    rows, added = 0, 0
+    with _phase("drift check and preprocessor update") as phase:
+        for batch in make_batches():
+            target_col = target_col or next((col for col in TARGET_CANDIDATES if col in batch.columns), None)
+            window.observe(batch)
+            added += preprocessor.update(batch)
+            rows += len(batch)
+        phase.rows = rows
+    current().rows = rows
+    if rows == 0 or target_col is None:
+        print("No labelled data to train on.")
+        return None, None
+
+    scores = reference.psi(window) if reference else {}
+    print(f"Drift on {rows:,} new rows (PSI vs model {bundle.version}):")
+    drifted = drift_report(scores, psi_threshold)
+    if not reference:
+        print("  model has no drift reference; retraining")
+    elif not drifted and not force:
+        print(f"No feature drifted beyond PSI {psi_threshold}; keeping model {bundle.version}.")
+        return None, None
+    print(f"Added {added:,} categories to the encoder vocabularies")
+
+    # 2. Boost from the saved model on the new batches only
+    booster = _remap_scaled_thresholds(booster, preprocessor.feature_names, before,
+                                       preprocessor.compile()['scaling'])
+    params = _booster_params()
+    with tempfile.TemporaryDirectory() as cache_dir:
+        data_iter = _TrainBatchIter(make_batches, preprocessor, target_col, test_size, random_state,
+                                    cache_prefix=os.path.join(cache_dir, "dmatrix"))
+        with _phase("build delta DMatrix"):
+            dtrain = xgb.DMatrix(data_iter)
+            # Boosters fitted on DataFrames check that the new data carries their feature names
+            dtrain.feature_names = booster.feature_names
+        print(f"Adding {num_boost_round} trees to {booster.num_boosted_rounds()} existing ones...")
+        with _phase("train"):
+            booster = xgb.train(params, dtrain, num_boost_round=num_boost_round, xgb_model=booster)
+        del dtrain
+
+    # 3. Evaluate on the held-out rows of the new data
+    y_test, y_prob = [], []
+    with _phase("evaluate"):
+        for batch_index, batch, y in _labelled_batches(make_batches, target_col):
+            test = _holdout_mask(len(batch), batch_index, test_size, random_state)
+            if not test.any():
+                continue
+            prob = booster.inplace_predict(preprocessor.transform(batch)[test], validate_features=False)
+            y_test.append(y[test].astype(np.int8))
+            y_prob.append(prob)
+    fitted = None
+    if y_test:
+        y_test, y_prob = np.concatenate(y_test), np.concatenate(y_prob)
+        y_pred = (y_prob > 0.5).astype(np.int8)
+        print("Model Evaluation (new data):")
+        print(classification_report(y_test, y_pred, zero_division=0))
+        print(f"Accuracy: {accuracy_score(y_test, y_pred)}")
+        # The added trees change the raw probabilities, so recalibrate on the new holdout
+        fitted = _fit_calibration(y_test, y_prob, calibration, precision_target, recall_target)
+    else:
+        # The parent's calibration.json does not fit the new trees; remove it like the bundle's
+        print("No held-out rows in the new data; saving the model uncalibrated.")
+        fitted = _fit_calibration(None, None, method=None)
+
+    # 4. Save Artifacts; the drift reference now covers the new data as well
+    print("Saving model and preprocessor...")
+    model = xgb.XGBClassifier(**XGB_PARAMS)
+    model.load_model(bytearray(booster.save_raw(raw_format='json')))
+    joblib.dump(model, 'xgboost_fraud_model.pkl')
+    joblib.dump(preprocessor, 'preprocessor.pkl')
+    registry.save(model, preprocessor, metadata={
+        'target_col': target_col,
+        'parent_version': bundle.version,
+        'incremental_rows': rows,
+        'drift_psi': scores,
+        'drift_reference': (reference.merge(window) if reference else window).to_dict(),
+        'calibration': fitted.to_dict() if fitted else None,
+    })
+
+    return model, preprocessor
+
 import argparse
 
 if __name__ == "__main__":
@@ -71,6 +430,18 @@ if __name__ == "__main__":
     parser.add_argument("--use-real", action="store_true", help="Use real dataset from Hugging Face instead of synthetic data")
     parser.add_argument("--limit", type=int, default=10000, help="Limit number of rows for training (default: 10000)")
     parser.add_argument("--no-limit", action="store_true", help="Train on full dataset (overrides --limit)")
+    parser.add_argument("--out-of-core", action="store_true", help="Stream batches into an external-memory DMatrix (bounded memory)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Rows per batch in out-of-core mode")
+    parser.add_argument("--source", type=str, default=None, help="Local Parquet/CSV file to train on in out-of-core or incremental mode")
+    parser.add_argument("--incremental", action="store_true", help="Continue boosting the latest registry model on new data if it drifted")
+    parser.add_argument("--rounds", type=int, default=20, help="Trees to add in incremental mode")
+    parser.add_argument("--psi-threshold", type=float, default=PSI_ALERT, help="PSI above which incremental mode retrains")
+    parser.add_argument("--force", action="store_true", help="Retrain incrementally even without drift")
+    parser.add_argument("--params", type=str, default=None, help="JSON file of XGBoost parameters (e.g. from tune.py)")
+    parser.add_argument("--calibration", choices=CALIBRATION_METHODS + ('none',), default='isotonic',
+                        help="Probability calibration fitted on the validation split")
+    parser.add_argument("--precision-target", type=float, default=PRECISION_TARGET, help="Precision the 'high' score cutoff must reach")
+    parser.add_argument("--recall-target", type=float, default=RECALL_TARGET, help="Recall the 'medium' score cutoff must keep")
     
     args = parser.parse_args()
     
@@ -82,5 +453,19 @@ if __name__ == "__main__":
         
     print(f"Configuration: Real Data={args.use_real}, Limit={limit if limit else 'All'}")
     
+    if args.params:
+        load_params(args.params)
+    calibration = dict(calibration=None if args.calibration == 'none' else args.calibration,
+                       precision_target=args.precision_target, recall_target=args.recall_target)
+
     # Train
-    train_fraud_model(limit=limit, use_synthetic=use_synthetic)
+    if args.incremental:
+        train_fraud_model_incremental(limit=limit, use_synthetic=use_synthetic and args.source is None,
+                                      source_path=args.source, batch_size=args.batch_size,
+                                      num_boost_round=args.rounds, psi_threshold=args.psi_threshold, force=args.force,
+                                      **calibration)
+    elif args.out_of_core:
+        train_fraud_model_out_of_core(limit=limit, use_synthetic=use_synthetic and args.source is None,
+                                      source_path=args.source, batch_size=args.batch_size, **calibration)
+    else:
+        train_fraud_model(limit=limit, use_synthetic=use_synthetic, **calibration)
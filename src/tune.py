@@ -0,0 +1,291 @@
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import re
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.metrics import average_precision_score
+from sklearn.model_selection import StratifiedKFold
+from data_loader import iter_financial_batches, CACHE_DIR, DATASET_NAME, DEFAULT_BATCH_SIZE, source_cache_name
+from preprocessing import FinancialPreprocessor
+from train_model import TARGET_CANDIDATES, XGB_PARAMS, _labelled_batches, _spool_synthetic
+
+FOLD_SCHEMES = ('stratified', 'time')
+TIME_CANDIDATES = ['timestamp', 'step']
+CACHE_MANIFEST = "folds.json"
+# Rows predicted when timing batch latency, and single-row calls timed per trial
+LATENCY_ROWS = 10000
+LATENCY_CALLS = 200
+# Completed trials needed before the running median can prune others
+PRUNE_AFTER = 4
+
+# Memory-mapped fold cache, opened once per worker process by _init_worker
+_DATA = None
+
+def _cache_dir(source_key, limit, folds, scheme, seed):
+    safe_key = re.sub(r'[^A-Za-z0-9_.-]+', '_', source_key)
+    return os.path.join(CACHE_DIR, "tuning", f"{safe_key}__{limit if limit else 'all'}__{scheme}{folds}__seed{seed}")
+
+def build_fold_cache(limit=None, use_synthetic=False, source_path=None, batch_size=DEFAULT_BATCH_SIZE,
+                     folds=3, scheme='stratified', seed=42):
+    """
+    Preprocesses the data once into a memory-mapped float32 matrix (X.npy), labels (y.npy)
+    and per-fold train/validation row indices, and returns the cache directory.
+    scheme: 'stratified' (class-balanced shuffled folds) or 'time' (expanding window:
+            fold i trains on the first i+1 time blocks and validates on the next one).
+    The cache is keyed by source, limit and fold layout; a complete cache (its manifest
+    is written last) is reused as is, so re-runs skip loading and preprocessing.
+    """
+    if scheme not in FOLD_SCHEMES:
+        raise ValueError(f"scheme must be one of {FOLD_SCHEMES}")
+    source_key = source_cache_name(source_path) if source_path else ("synthetic" if use_synthetic else DATASET_NAME)
+    cache_dir = _cache_dir(source_key, limit, folds, scheme, seed)
+    if os.path.exists(os.path.join(cache_dir, CACHE_MANIFEST)):
+        print(f"Reusing cached folds in {cache_dir}")
+        return cache_dir
+
+    if use_synthetic and source_path is None:
+        source_path = _spool_synthetic(limit if limit else 1000, batch_size)
+    make_batches = lambda: iter_financial_batches(batch_size=batch_size, limit=limit, source_path=source_path,
+                                                  use_cache=source_path is None)
+
+    # Pass 1: fit the preprocessor from running statistics and count labelled rows
+    start = time.perf_counter()
+    preprocessor = FinancialPreprocessor()
+    target_col, time_col, rows = None, None, 0
+    for batch in make_batches():
+        if target_col is None:
+            target_col = next((col for col in TARGET_CANDIDATES if col in batch.columns), None)
+            if target_col is None:
+                raise ValueError(f"Target column not found. Available: {list(batch.columns)}")
+            time_col = next((col for col in TIME_CANDIDATES if col in batch.columns), None)
+        preprocessor.partial_fit(batch, target_col=target_col)
+        rows += int(batch[target_col].notna().sum())
+    if target_col is None:
+        raise ValueError("No data to tune on.")
+    preprocessor.finalize()
+    if scheme == 'time' and time_col is None:
+        raise ValueError(f"Time-based folds need one of {TIME_CANDIDATES}")
+
+    # Pass 2: encode straight into memory-mapped arrays
+    tmp_dir = cache_dir + ".tmp"
+    os.makedirs(tmp_dir, exist_ok=True)
+    X = np.lib.format.open_memmap(os.path.join(tmp_dir, "X.npy"), mode='w+', dtype=np.float32,
+                                  shape=(rows, len(preprocessor.feature_names)))
+    y = np.empty(rows, dtype=np.int8)
+    times = [] if scheme == 'time' else None
+    offset = 0
+    for _, batch, labels in _labelled_batches(make_batches, target_col):
+        X[offset:offset + len(batch)] = preprocessor.transform(batch)
+        y[offset:offset + len(batch)] = labels
+        if times is not None:
+            stamps = batch[time_col]
+            times.append(stamps.to_numpy() if pd.api.types.is_numeric_dtype(stamps) else stamps.astype(str).to_numpy())
+        offset += len(batch)
+    X.flush()
+    del X
+    np.save(os.path.join(tmp_dir, "y.npy"), y)
+
+    if scheme == 'stratified':
+        splitter = StratifiedKFold(n_splits=folds, shuffle=True, random_state=seed)
+        splits = list(splitter.split(np.zeros(rows), y))
+    else:
+        # ISO timestamps sort as strings; steps sort as numbers
+        order = np.argsort(np.concatenate(times), kind='stable')
+        blocks = np.array_split(order, folds + 1)
+        splits = [(np.sort(np.concatenate(blocks[:i + 1])), np.sort(blocks[i + 1])) for i in range(folds)]
+    for i, (train_idx, valid_idx) in enumerate(splits):
+        np.save(os.path.join(tmp_dir, f"fold{i}_train.npy"), train_idx.astype(np.int64))
+        np.save(os.path.join(tmp_dir, f"fold{i}_valid.npy"), valid_idx.astype(np.int64))
+
+    with open(os.path.join(tmp_dir, CACHE_MANIFEST), 'w') as f:
+        json.dump({'rows': rows, 'features': preprocessor.feature_names, 'target_col': target_col,
+                   'fraud_rate': float(y.mean()), 'folds': folds, 'scheme': scheme, 'seed': seed}, f, indent=2)
+    # Only a fully written cache gets the final name
+    os.replace(tmp_dir, cache_dir)
+    print(f"Cached {rows:,} encoded rows and {folds} {scheme} folds in {cache_dir} "
+          f"({time.perf_counter() - start:.1f}s)")
+    return cache_dir
+
+def sample_params(rng, fraud_rate):
+    """
+    Draws one configuration. scale_pos_weight covers no reweighting, the square root of
+    the negative/positive ratio and the full ratio, for the class imbalance.
+    """
+    imbalance = (1 - fraud_rate) / max(fraud_rate, 1e-6)
+    return {
+        'max_depth': int(rng.integers(3, 10)),
+        'learning_rate': float(math.exp(rng.uniform(math.log(0.02), math.log(0.3)))),
+        'min_child_weight': float(math.exp(rng.uniform(0, math.log(20)))),
+        'subsample': float(rng.uniform(0.6, 1.0)),
+        'colsample_bytree': float(rng.uniform(0.5, 1.0)),
+        'reg_lambda': float(math.exp(rng.uniform(math.log(0.1), math.log(10)))),
+        'scale_pos_weight': float(rng.choice([1.0, math.sqrt(imbalance), imbalance])),
+    }
+
+def baseline_params():
+    """The configuration train_model.py uses today, as a tunable-params dict."""
+    return {key: value for key, value in XGB_PARAMS.items() if key not in ('n_estimators', 'eval_metric')}
+
+def _init_worker(cache_dir, threads):
+    global _DATA
+    with open(os.path.join(cache_dir, CACHE_MANIFEST)) as f:
+        meta = json.load(f)
+    _DATA = {
+        'X': np.load(os.path.join(cache_dir, "X.npy"), mmap_mode='r'),
+        'y': np.load(os.path.join(cache_dir, "y.npy"), mmap_mode='r'),
+        'folds': [(np.load(os.path.join(cache_dir, f"fold{i}_train.npy"), mmap_mode='r'),
+                   np.load(os.path.join(cache_dir, f"fold{i}_valid.npy"), mmap_mode='r'))
+                  for i in range(meta['folds'])],
+        'threads': threads,
+    }
+
+def _latency(booster, X):
+    """(microseconds per row in one batch call, median single-row call in microseconds)."""
+    rows = X[:LATENCY_ROWS]
+    start = time.perf_counter()
+    booster.inplace_predict(rows, validate_features=False)
+    batch_us = (time.perf_counter() - start) / max(len(rows), 1) * 1e6
+    single = []
+    for i in range(min(LATENCY_CALLS, len(rows))):
+        start = time.perf_counter()
+        booster.inplace_predict(rows[i:i + 1], validate_features=False)
+        single.append(time.perf_counter() - start)
+    return batch_us, statistics.median(single) * 1e6 if single else float('nan')
+
+def _run_trial(trial_id, params, prune_medians, max_rounds, early_stopping):
+    """
+    Cross-validates one configuration over the cached folds with early stopping on
+    PR-AUC. After each fold the running mean is compared with the median of completed
+    trials at the same fold (prune_medians); a trial below it stops early as pruned.
+    """
+    X, y, threads = _DATA['X'], _DATA['y'], _DATA['threads']
+    train_params = dict(params, objective='binary:logistic', tree_method='hist', eval_metric='aucpr',
+                        nthread=threads, seed=trial_id)
+    scores, rounds, pruned = [], [], False
+    start = time.perf_counter()
+    for fold, (train_idx, valid_idx) in enumerate(_DATA['folds']):
+        dtrain = xgb.QuantileDMatrix(X[train_idx], label=y[train_idx], nthread=threads)
+        X_valid = np.ascontiguousarray(X[valid_idx])
+        dvalid = xgb.QuantileDMatrix(X_valid, label=y[valid_idx], ref=dtrain, nthread=threads)
+        booster = xgb.train(train_params, dtrain, num_boost_round=max_rounds, evals=[(dvalid, 'valid')],
+                            early_stopping_rounds=early_stopping, verbose_eval=False)
+        best = booster.best_iteration if early_stopping else booster.num_boosted_rounds() - 1
+        prob = booster.inplace_predict(X_valid, iteration_range=(0, best + 1), validate_features=False)
+        scores.append(float(average_precision_score(y[valid_idx], prob)))
+        rounds.append(best + 1)
+        if fold < len(prune_medians) and fold < len(_DATA['folds']) - 1 and np.mean(scores) < prune_medians[fold]:
+            pruned = True
+            break
+    fit_seconds = time.perf_counter() - start
+    # Latency of a model with the trial's tree count, on validation rows
+    best_model = booster[: rounds[-1]]
+    batch_us, single_us = _latency(best_model, X_valid)
+    return {
+        'trial': trial_id, 'params': params, 'fold_pr_auc': scores, 'pr_auc': float(np.mean(scores)),
+        'pr_auc_std': float(np.std(scores)), 'n_estimators': int(round(np.mean(rounds))), 'pruned': pruned,
+        'fit_seconds': fit_seconds, 'batch_us_per_row': batch_us, 'single_row_us': single_us,
+    }
+
+def _prune_medians(completed, folds):
+    """Per-fold median running-mean PR-AUC of the completed, unpruned trials."""
+    finished = [trial['fold_pr_auc'] for trial in completed if not trial['pruned']]
+    if len(finished) < PRUNE_AFTER:
+        return []
+    return [statistics.median(np.mean(scores[:fold + 1]) for scores in finished) for fold in range(folds)]
+
+def tune(limit=None, use_synthetic=False, source_path=None, batch_size=DEFAULT_BATCH_SIZE, trials=30, folds=3,
+         scheme='stratified', workers=None, max_rounds=400, early_stopping=30, seed=42, out_dir="tuning"):
+    """
+    Random search over XGBoost configurations on cached, memory-mapped CV folds.
+    Trials run `workers` at a time in separate processes, each with an equal share of the
+    cores. Trial 0 is the current train_model.py configuration, for comparison.
+    Writes <out_dir>/trials.jsonl (every trial) and <out_dir>/best_params.json (the best
+    unpruned trial, in train_model.py's XGB_PARAMS format: python src/train_model.py
+    --params tuning/best_params.json). Returns the list of trial results.
+    """
+    cache_dir = build_fold_cache(limit, use_synthetic, source_path, batch_size, folds, scheme, seed)
+    with open(os.path.join(cache_dir, CACHE_MANIFEST)) as f:
+        meta = json.load(f)
+    workers = max(1, min(workers or os.cpu_count(), trials))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    rng = np.random.default_rng(seed)
+    candidates = [baseline_params()] + [sample_params(rng, meta['fraud_rate']) for _ in range(trials - 1)]
+
+    print(f"Running {trials} trials on {meta['rows']:,} rows ({meta['fraud_rate']:.2%} fraud), "
+          f"{folds} {scheme} folds, {workers} workers x {threads} threads...")
+    completed, start = [], time.perf_counter()
+    # Fresh interpreters: forking after XGBoost's OpenMP pool has started is unsafe
+    ctx = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                             initargs=(cache_dir, threads)) as pool:
+        pending, next_trial = set(), 0
+        while next_trial < len(candidates) or pending:
+            # Keep every worker busy; each new trial gets the latest pruning medians
+            while next_trial < len(candidates) and len(pending) < workers:
+                # Trial 0 reproduces the current configuration exactly: fixed tree count, no early stopping
+                rounds, stopping = (XGB_PARAMS['n_estimators'], None) if next_trial == 0 else (max_rounds, early_stopping)
+                pending.add(pool.submit(_run_trial, next_trial, candidates[next_trial],
+                                        _prune_medians(completed, folds), rounds, stopping))
+                next_trial += 1
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                trial = future.result()
+                completed.append(trial)
+                print(f"Trial {trial['trial']:>3}: PR-AUC {trial['pr_auc']:.4f} +/- {trial['pr_auc_std']:.4f} "
+                      f"({trial['n_estimators']} trees, {trial['fit_seconds']:.1f}s)"
+                      f"{' pruned' if trial['pruned'] else ''}")
+    elapsed = time.perf_counter() - start
+
+    completed.sort(key=lambda trial: trial['trial'])
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, "trials.jsonl"), 'w') as f:
+        for trial in completed:
+            f.write(json.dumps(dict(trial, cache=cache_dir)) + "\n")
+
+    finished = [trial for trial in completed if not trial['pruned']]
+    best = max(finished, key=lambda trial: trial['pr_auc'])
+    best_params = dict(best['params'], n_estimators=best['n_estimators'], eval_metric='aucpr')
+    with open(os.path.join(out_dir, "best_params.json"), 'w') as f:
+        json.dump(best_params, f, indent=2)
+
+    print(f"\n{len(completed)} trials in {elapsed:.1f}s ({sum(t['pruned'] for t in completed)} pruned)")
+    print(f"{'trial':>5} {'PR-AUC':>8} {'+/-':>7} {'trees':>6} {'depth':>5} {'lr':>6} {'spw':>6} "
+          f"{'batch us/row':>12} {'1-row us':>9}")
+    baseline = completed[0]
+    shown = sorted(finished, key=lambda trial: -trial['pr_auc'])[:10]
+    for trial in shown + ([baseline] if baseline not in shown else []):
+        params = trial['params']
+        label = f"{trial['trial']:>5}" if trial['trial'] else " base"
+        print(f"{label} {trial['pr_auc']:>8.4f} {trial['pr_auc_std']:>7.4f} {trial['n_estimators']:>6} "
+              f"{params['max_depth']:>5} {params['learning_rate']:>6.3f} {params.get('scale_pos_weight', 1):>6.1f} "
+              f"{trial['batch_us_per_row']:>12.2f} {trial['single_row_us']:>9.0f}")
+    print(f"Best trial {best['trial']}: PR-AUC {best['pr_auc']:.4f} vs {baseline['pr_auc']:.4f} for the current "
+          f"configuration; saved to {os.path.join(out_dir, 'best_params.json')}")
+    return completed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel XGBoost hyperparameter search on cached CV folds")
+    parser.add_argument("--use-real", action="store_true", help="Use the real dataset instead of synthetic data")
+    parser.add_argument("--source", type=str, default=None, help="Local Parquet/CSV file to tune on")
+    parser.add_argument("--limit", type=int, default=None, help="Rows to use (default: all)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Rows per preprocessing batch")
+    parser.add_argument("--trials", type=int, default=30, help="Configurations to try (the first is the current one)")
+    parser.add_argument("--folds", type=int, default=3, help="Cross-validation folds")
+    parser.add_argument("--scheme", choices=FOLD_SCHEMES, default='stratified', help="Fold layout")
+    parser.add_argument("--workers", type=int, default=None, help="Parallel trials (default: all cores)")
+    parser.add_argument("--max-rounds", type=int, default=400, help="Boosting rounds before early stopping")
+    parser.add_argument("--early-stopping", type=int, default=30, help="Rounds without PR-AUC improvement to stop")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for folds and sampled configurations")
+    parser.add_argument("--out", type=str, default="tuning", help="Directory for trials.jsonl and best_params.json")
+    args = parser.parse_args()
+
+    tune(limit=args.limit, use_synthetic=not args.use_real and args.source is None, source_path=args.source,
+         batch_size=args.batch_size, trials=args.trials, folds=args.folds, scheme=args.scheme, workers=args.workers,
+         max_rounds=args.max_rounds, early_stopping=args.early_stopping, seed=args.seed, out_dir=args.out)
@@ -0,0 +1,30 @@
+import os
+import sys
+
+# The modules live flat in src/ and import each other by name
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import shutil
+import joblib
+import numpy as np
+import pytest
+import xgboost as xgb
+
+@pytest.fixture(scope="session")
+def model_dir(tmp_path_factory):
+    """Pickles and calibration of a small model trained on synthetic data."""
+    from train_model import train_fraud_model
+    directory = tmp_path_factory.mktemp("model")
+    with pytest.MonkeyPatch.context() as patch:
+        patch.chdir(directory)
+        train_fraud_model(limit=5000, use_synthetic=True)
+    return directory
+
+@pytest.fixture(scope="session")
+def broken_model_dir(model_dir, tmp_path_factory):
+    """The same preprocessor with a model fitted on two features, which cannot score its output."""
+    directory = tmp_path_factory.mktemp("broken_model")
+    shutil.copy(model_dir / 'preprocessor.pkl', directory)
+    model = xgb.XGBClassifier(n_estimators=2).fit(np.random.rand(20, 2), np.arange(20) % 2)
+    joblib.dump(model, directory / 'xgboost_fraud_model.pkl')
+    return directory
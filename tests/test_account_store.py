@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+from account_store import AccountStore
+from data_loader import generate_synthetic_data
+
+@pytest.fixture
+def transactions():
+    return pd.DataFrame({
+        'transaction_id': [f"T{i}" for i in range(6)],
+        'timestamp': ['2024-01-01 08:00', '2024-01-02 09:00', '2024-01-03 10:00',
+                      '2024-01-04 11:00', '2024-01-05 12:00', '2024-01-06 13:00'],
+        'sender_account': ['A', 'B', 'A', 'C', 'A', 'B'],
+        'receiver_account': ['B', 'A', 'C', 'A', 'B', 'C'],
+        'merchant_category': ['food', 'fuel', 'food', 'food', None, 'fuel'],
+        'amount_ngn': [100.0, 200.0, np.nan, 400.0, 500.0, 600.0],
+    })
+
+@pytest.fixture
+def store(tmp_path):
+    account_store = AccountStore(str(tmp_path / "store.sqlite"))
+    yield account_store
+    account_store.close()
+
+def test_account_and_merchant_queries(store, transactions):
+    assert store.append(transactions.head(4)) == 4
+    assert store.append(transactions) == 2  # the first four are already stored
+    assert store.count() == 6
+
+    sent = store.last_transactions('A', n=2)
+    assert list(sent['transaction_id']) == ['T4', 'T2']
+    both = store.last_transactions('A', n=3, include_received=True)
+    assert list(both['transaction_id']) == ['T4', 'T3', 'T2']
+    assert np.isnan(store.last_transactions('A')['amount_ngn'][1])
+
+    food = store.merchant_transactions('food', start='2024-01-02', end='2024-01-04')
+    assert list(food['transaction_id']) == ['T2']
+    assert list(store.merchant_transactions('fuel', limit=1)['transaction_id']) == ['T5']
+    assert store.distinct('merchant') == ['food', 'fuel']
+    assert store.distinct('sender') == ['A', 'B', 'C']
+
+def test_rows_without_an_id_are_keyed_by_their_values(store):
+    np.random.seed(2)
+    df = generate_synthetic_data(rows=300)
+    assert store.append(df) == 300
+    # Same rows with other dtypes (as from a CSV round trip) are recognised
+    assert store.append(df.astype({'step': 'float64', 'isFraud': 'int32'})) == 0
+    assert store.count() == 300
+    account = df['nameOrig'].iloc[0]
+    rows = store.last_transactions(account)
+    assert 'row_key' not in rows.columns
+    assert len(rows) == (df['nameOrig'] == account).sum()
+    with pytest.raises(ValueError):
+        store.merchant_transactions('food')
+
+def test_reopened_store_keeps_its_schema(tmp_path, transactions):
+    path = str(tmp_path / "store.sqlite")
+    first = AccountStore(path)
+    first.append(transactions)
+    first.close()
+    reopened = AccountStore(path)
+    assert reopened.roles['merchant'] == 'merchant_category' and reopened.count() == 6
+    assert reopened.append(transactions[['amount_ngn']].rename(columns={'amount_ngn': 'other'})) == 0
+    reopened.close()
@@ -0,0 +1,30 @@
+import copy
+import pyarrow as pa
+import pytest
+from analytics import FinanceAnalytics, check_sql_parity
+from risk_rules import DEFAULT_RULES, RiskRules
+from synthetic_data import SyntheticTransactionGenerator
+
+@pytest.fixture(scope="module")
+def transactions():
+    return next(iter(SyntheticTransactionGenerator(50000, seed=3).iter_batches()))
+
+def test_analyses_match_ffinance_sql(transactions):
+    assert all(check_sql_parity(transactions).values())
+
+def test_parity_with_null_labels(transactions):
+    df = transactions.copy()
+    df['is_fraud'] = df['is_fraud'].astype(object)
+    df.loc[df.sample(11, random_state=0).index, 'is_fraud'] = None
+    assert all(check_sql_parity(df).values())
+
+def test_parity_catches_drifted_rules(transactions):
+    rules = copy.deepcopy(DEFAULT_RULES)
+    rules['segments'][0]['any'][0]['value'] = 20
+    assert not check_sql_parity(transactions, rules=RiskRules(rules))['risk_bucketing']
+
+def test_empty_source(transactions):
+    results = FinanceAnalytics(pa.Table.from_pandas(transactions.head(0), preserve_index=False)).run_all()
+    assert results['fraud_distribution'].empty
+    assert results['merchant_risk'].empty
+    assert results['risk_segment_summary']['total_txns'].sum() == 0
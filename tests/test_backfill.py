@@ -0,0 +1,59 @@
+import glob
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import data_loader
+from backfill import backfill, plan_shards
+from data_loader import generate_synthetic_data
+from risk_score import RiskScoringEngine
+
+def _write_source(path, rows=400, row_group_size=50):
+    np.random.seed(3)
+    df = generate_synthetic_data(rows=rows)
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), path, row_group_size=row_group_size)
+    return df
+
+def test_plan_shards_covers_every_row_group_in_order(tmp_path):
+    path = str(tmp_path / "source.parquet")
+    _write_source(path, rows=400)
+    assert plan_shards(path, 4) == [[0, 1], [2, 3], [4, 5], [6, 7]]
+    _write_source(path, rows=450)
+    plan = plan_shards(path, 4)
+    assert len(plan) <= 4 and [index for shard in plan for index in shard] == list(range(9))
+
+def test_backfill_writes_one_scored_part_per_shard(model_dir, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # no calibration.json here: workers score uncalibrated
+    source = str(tmp_path / "source.parquet")
+    df = _write_source(source)
+    out = tmp_path / "out"
+    out.mkdir()
+    (out / "part-00009.parquet").write_bytes(b"stale")
+
+    summary = backfill(source, output_dir=str(out), workers=2, chunk_size=30, shards_per_worker=2,
+                       model_path=str(model_dir / 'xgboost_fraud_model.pkl'),
+                       preprocessor_path=str(model_dir / 'preprocessor.pkl'))
+    parts = sorted(glob.glob(str(out / "part-*.parquet")))
+    assert [p[-13:] for p in parts] == [f"{i:05d}.parquet" for i in range(4)]
+    assert sum(stats['rows'] for stats in summary.values()) == len(df)
+
+    scored = pd.concat([pd.read_parquet(p) for p in parts], ignore_index=True)
+    pd.testing.assert_frame_equal(scored[df.columns], df)
+    engine = RiskScoringEngine(model_path=str(model_dir / 'xgboost_fraud_model.pkl'),
+                               preprocessor_path=str(model_dir / 'preprocessor.pkl'), calibration_path=None)
+    assert np.allclose(scored['risk_score'], engine.score_batch(df), atol=1e-3)
+    assert list(scored['risk_segment']) == list(engine.risk_segments(df))
+
+def test_csv_input_is_spooled_to_parquet_first(model_dir, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(data_loader, 'CACHE_DIR', str(tmp_path / "cache"))
+    source = str(tmp_path / "source.csv")
+    np.random.seed(3)
+    generate_synthetic_data(rows=300).to_csv(source, index=False)
+
+    summary = backfill(source, output_dir=str(tmp_path / "out"), workers=1, chunk_size=100, shards_per_worker=3,
+                       model_path=str(model_dir / 'xgboost_fraud_model.pkl'),
+                       preprocessor_path=str(model_dir / 'preprocessor.pkl'))
+    assert sum(stats['rows'] for stats in summary.values()) == 300
+    assert len(glob.glob(str(tmp_path / "out" / "part-*.parquet"))) == 3
+    assert glob.glob(str(tmp_path / "cache" / "*.parquet"))
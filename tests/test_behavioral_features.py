@@ -0,0 +1,92 @@
+import threading
+import numpy as np
+import pandas as pd
+import pytest
+from behavioral_features import BehavioralFeatureStore
+from risk_score import RiskScoringEngine
+
+@pytest.fixture
+def history():
+    return pd.DataFrame({
+        'sender_account': ['A', 'A', 'B', 'A', 'B', 'A'],
+        'amount_ngn': [1000.0, 1200.0, 50.0, 900.0, 55.0, 250000.0],
+        'timestamp': pd.to_datetime(['2024-01-01 08:00', '2024-01-01 09:00', '2024-01-01 10:00',
+                                     '2024-01-02 07:00', '2024-01-03 12:00', '2024-01-03 12:30']),
+        'location': ['Lagos', 'Lagos', 'Abuja', 'Lagos', 'Abuja', 'Kano'],
+    })
+
+@pytest.fixture
+def incoming():
+    return pd.DataFrame({
+        'sender_account': ['A', 'C', 'A'],
+        'amount_ngn': [300000.0, 10.0, 5000.0],
+        'timestamp': pd.to_datetime(['2024-01-03 13:00', '2024-01-03 13:05', '2024-01-03 13:10']),
+        'location': ['Kano', 'Enugu', 'Lagos'],
+    })
+
+def test_lookup_matches_update_without_changing_state(history, incoming):
+    store = BehavioralFeatureStore(capacity=2)
+    store.update_batch(history)
+    first = store.lookup_batch(incoming)
+    assert first.equals(store.lookup_batch(incoming))
+
+    reference = BehavioralFeatureStore(capacity=2)
+    reference.update_batch(history)
+    assert first.equals(reference.update_batch(incoming))
+    # The looked-up store continues exactly as if the lookups never happened
+    assert store.update_batch(incoming).equals(first)
+    assert store._slots == reference._slots and store._locations == reference._locations
+
+def test_scoring_reads_the_store_and_ingest_updates_it(history, incoming):
+    store = BehavioralFeatureStore()
+    engine = RiskScoringEngine(model_path=None, feature_store=store)
+    engine.ingest(history)
+    before = store.lookup_batch(incoming)
+    engine.risk_segments(incoming)
+    engine.risk_segments(incoming)
+    assert store.lookup_batch(incoming).equals(before)
+
+    engine.ingest(incoming)
+    assert np.array_equal(store.lookup_batch(incoming.head(1))['velocity_score'], [4.0])
+
+def test_missing_accounts_and_amounts(history):
+    df = history.copy()
+    df['sender_account'] = df['sender_account'].astype(object)
+    df.loc[[2, 4], 'sender_account'] = None
+    df.loc[1, 'amount_ngn'] = np.nan
+
+    bulk = BehavioralFeatureStore().compute_features(df)
+    streamed = BehavioralFeatureStore().update_batch(df)
+    assert np.allclose(bulk, streamed, equal_nan=True)
+    assert bulk.loc[[2, 4]].isna().all().all() and bulk.drop(index=[2, 4]).notna().all().all()
+    # The missing amount leaves A's spending baseline intact
+    assert bulk.loc[3, 'spending_deviation_score'] > 0
+
+    store = BehavioralFeatureStore()
+    store.load_history(df)
+    assert list(store._slots) == ['A']
+    assert np.isfinite(store._ewm_mean[store._slots['A']])
+
+def test_concurrent_lookups_do_not_clobber_updates():
+    rng = np.random.default_rng(1)
+    n = 4000
+    df = pd.DataFrame({'sender_account': rng.choice(list('ABCDEFGH'), n),
+                       'amount_ngn': rng.lognormal(8, 1, n),
+                       'timestamp': pd.Timestamp('2024-01-01') + pd.to_timedelta(np.arange(n) * 60, unit='s'),
+                       'location': rng.choice(['Lagos', 'Kano', 'Abuja'], n)})
+    store, reference = BehavioralFeatureStore(), BehavioralFeatureStore()
+    expected = reference.update_batch(df)
+
+    done = threading.Event()
+    def look_up():
+        while not done.is_set():
+            store.lookup_batch(df.sample(50, random_state=int(rng.integers(1000))))
+    reader = threading.Thread(target=look_up)
+    reader.start()
+    try:
+        streamed = pd.concat([store.update_batch(df.iloc[start:start + 20]) for start in range(0, n, 20)])
+    finally:
+        done.set()
+        reader.join()
+    assert streamed.equals(expected)
+    assert store.lookup_batch(df.tail(5)).equals(reference.lookup_batch(df.tail(5)))
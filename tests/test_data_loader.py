@@ -0,0 +1,20 @@
+import os
+from data_loader import source_cache_name
+
+def test_source_cache_name_separates_same_named_files(tmp_path):
+    first, second = tmp_path / "a" / "transactions.csv", tmp_path / "b" / "transactions.csv"
+    for path in (first, second):
+        path.parent.mkdir()
+        path.write_text("amount\n1\n")
+        os.utime(path, ns=(1_700_000_000_000_000_000, 1_700_000_000_000_000_000))
+    assert source_cache_name(str(first)) != source_cache_name(str(second))
+    assert source_cache_name(str(first)) == source_cache_name(os.path.relpath(first))
+
+def test_source_cache_name_changes_on_sub_second_edits(tmp_path):
+    path = tmp_path / "transactions.csv"
+    path.write_text("amount\n1\n")
+    os.utime(path, ns=(1_700_000_000_100_000_000, 1_700_000_000_100_000_000))
+    before = source_cache_name(str(path))
+    path.write_text("amount\n2\n")
+    os.utime(path, ns=(1_700_000_000_900_000_000, 1_700_000_000_900_000_000))
+    assert source_cache_name(str(path)) != before
@@ -0,0 +1,50 @@
+import os
+import pandas as pd
+import pytest
+import data_loader
+from db_connector import bulk_upload, get_engine, upload_to_sql
+
+def _chunks(n, rows=10, fail_at=None):
+    for i in range(n):
+        if i == fail_at:
+            raise RuntimeError("connection lost")
+        yield pd.DataFrame({'transaction_id': range(i * rows, (i + 1) * rows), 'amount': float(i)})
+
+def _table(engine, name="NigerianTransactions"):
+    return pd.read_sql(f"SELECT * FROM {name} ORDER BY transaction_id", engine)
+
+@pytest.fixture
+def engine(tmp_path):
+    return get_engine(f"sqlite:///{tmp_path / 'load.db'}")
+
+def test_resume_skips_only_chunks_of_an_interrupted_load(engine):
+    with pytest.raises(RuntimeError):
+        bulk_upload(_chunks(4, fail_at=2), engine, workers=1, run_id='run')
+    landed = len(_table(engine))
+    assert 0 < landed < 40
+
+    assert bulk_upload(_chunks(4), engine, workers=1, run_id='run') == 40 - landed
+    assert _table(engine)['transaction_id'].tolist() == list(range(40))
+    # The completed load cleared its progress, so the same run is written again in full
+    assert bulk_upload(_chunks(4), engine, workers=1, run_id='run') == 40
+
+def test_upsert_replaces_rows_by_key(engine):
+    bulk_upload(_chunks(2), engine, mode='upsert', workers=4, run_id='first')
+    update = pd.DataFrame({'transaction_id': [5, 5, 30], 'amount': [7.0, 8.0, 9.0]})
+    assert bulk_upload([update], engine, mode='upsert', run_id='second') == 2
+    table = _table(engine).set_index('transaction_id')['amount']
+    assert len(table) == 21 and table[5] == 8.0 and table[30] == 9.0
+
+def test_upsert_needs_the_key_column(engine):
+    with pytest.raises(ValueError):
+        bulk_upload([pd.DataFrame({'amount': [1.0]})], engine, mode='upsert')
+
+def test_reloading_an_edited_file_is_not_skipped(engine, tmp_path, monkeypatch):
+    monkeypatch.setattr(data_loader, 'CACHE_DIR', str(tmp_path / 'cache'))
+    path = tmp_path / 'f.csv'
+    for amounts, mtime in (([1, 2], 1_700_000_000), ([10, 20], 1_700_000_100)):
+        path.write_text("transaction_id,amount\n" + "".join(f"{i},{a}\n" for i, a in enumerate(amounts)))
+        os.utime(path, (mtime, mtime))
+        assert upload_to_sql(limit=100, use_synthetic=False, mode='upsert', workers=1, source_path=str(path),
+                             engine=engine) == 2
+    assert _table(engine)['amount'].tolist() == [10.0, 20.0]
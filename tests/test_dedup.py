@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+from dedup import BloomFilter, Deduplicator, _hash, dedup_batches, source_key
+
+def _batches(start, stop, size=100):
+    for first in range(start, stop, size):
+        ids = np.arange(first, min(first + size, stop))
+        yield pd.DataFrame({'transaction_id': [f"T{i}" for i in ids], 'amount': ids * 1.5, 'step': ids // 10})
+
+def _ids(frames):
+    return [key for frame in frames for key in frame['transaction_id']]
+
+@pytest.fixture
+def dedup(tmp_path):
+    deduplicator = Deduplicator("target", directory=str(tmp_path), capacity=1000)
+    yield deduplicator
+    deduplicator.close()
+
+def test_bloom_filter_has_no_false_negatives(tmp_path):
+    bloom = BloomFilter(str(tmp_path / "bloom.bin"), capacity=10000, error_rate=0.01)
+    hashes = _hash(np.array([f"T{i}" for i in range(10000)], dtype=object))
+    bloom.add(hashes)
+    assert bloom.contains(hashes).all()
+    others = _hash(np.array([f"X{i}" for i in range(10000)], dtype=object))
+    assert bloom.contains(others).mean() < 0.03
+
+def test_overlapping_windows_pass_each_row_once(dedup, tmp_path):
+    first = _ids(dedup_batches(_batches(0, 500), dedup))
+    second = _ids(dedup_batches(_batches(300, 800), dedup))
+    assert first == [f"T{i}" for i in range(500)]
+    assert second == [f"T{i}" for i in range(500, 800)]
+    assert dedup.count == 800
+    # The ledger is shared with other instances of the same target, and outgrows the filter
+    again = Deduplicator("target", directory=str(tmp_path))
+    assert _ids(dedup_batches(_batches(0, 1200), again)) == [f"T{i}" for i in range(800, 1200)]
+    assert again.count == 1200 and again.bloom.capacity >= 1200
+    again.close()
+
+def test_grown_file_skips_its_committed_prefix(dedup, tmp_path):
+    source = source_key(str(tmp_path / "transactions.csv"))
+    list(dedup_batches(_batches(0, 500), dedup, source))
+    grown = Deduplicator("target", directory=str(tmp_path))
+    assert _ids(dedup_batches(_batches(0, 700), grown, source)) == [f"T{i}" for i in range(500, 700)]
+    assert grown.stats['skipped'] == 500 and grown.stats['bloom_hits'] == 0
+    grown.close()
+
+def test_rewritten_file_is_checked_in_full(dedup, tmp_path):
+    source = source_key(str(tmp_path / "transactions.csv"))
+    list(dedup_batches(_batches(0, 500), dedup, source))
+    rewritten = Deduplicator("target", directory=str(tmp_path))
+    # Same length, but the rows are other transactions
+    assert _ids(dedup_batches(_batches(1000, 1500), rewritten, source)) == [f"T{i}" for i in range(1000, 1500)]
+    assert rewritten.stats['skipped'] == 0
+    rewritten.close()
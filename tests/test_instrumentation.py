@@ -0,0 +1,17 @@
+import tracemalloc
+import instrumentation
+
+def test_disable_leaves_a_callers_tracemalloc_running(tmp_path):
+    tracemalloc.start()
+    try:
+        instrumentation.enable(str(tmp_path / "metrics.jsonl"), profile='tracemalloc')
+        instrumentation.disable()
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
+
+def test_disable_stops_the_tracemalloc_it_started(tmp_path):
+    instrumentation.enable(str(tmp_path / "metrics.jsonl"), profile='tracemalloc')
+    assert tracemalloc.is_tracing()
+    instrumentation.disable()
+    assert not tracemalloc.is_tracing()
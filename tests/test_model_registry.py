@@ -0,0 +1,49 @@
+import os
+import joblib
+import numpy as np
+import pytest
+from data_loader import generate_synthetic_data
+from model_registry import ModelRegistry
+from risk_score import RiskScoringEngine
+
+@pytest.fixture
+def trained(model_dir):
+    return joblib.load(model_dir / 'xgboost_fraud_model.pkl'), joblib.load(model_dir / 'preprocessor.pkl')
+
+def test_save_promote_and_reload(tmp_path, trained):
+    model, preprocessor = trained
+    registry = ModelRegistry(str(tmp_path))
+    assert registry.latest_version() is None
+
+    assert registry.save(model, preprocessor, version='v1') == 'v1'
+    assert registry.save(model, preprocessor, version='v1', promote=False) == 'v1-2'
+    assert registry.latest_version() == 'v1' and registry.versions() == ['v1', 'v1-2']
+    registry.promote('v1-2')
+    assert registry.latest_version() == 'v1-2'
+    with pytest.raises(ValueError):
+        registry.promote('v9')
+    assert sorted(os.listdir(tmp_path)) == ['LATEST', 'v1', 'v1-2']
+
+    df = generate_synthetic_data(rows=200)
+    bundle = registry.get('v1')
+    X = preprocessor.transform(df)
+    assert np.array_equal(bundle.preprocessor.transform(df), X)
+    assert np.allclose(bundle.booster.inplace_predict(X), model.predict_proba(X)[:, 1])
+
+def test_refresh_hot_swaps_to_the_promoted_version(tmp_path, trained):
+    model, preprocessor = trained
+    registry = ModelRegistry(str(tmp_path))
+    registry.save(model, preprocessor, version='v1')
+    engine = RiskScoringEngine.from_registry(registry)
+    df = generate_synthetic_data(rows=200)
+    before = engine.score_batch(df)
+    assert not engine.refresh()
+
+    # Fewer trees, same features: a version that scores differently
+    registry.save(model.get_booster()[:3], preprocessor, version='v2', promote=False)
+    assert not engine.refresh() and engine.version == 'v1'
+    registry.promote('v2')
+    assert engine.refresh() and engine.version == 'v2'
+    after = engine.score_batch(df)
+    assert not np.allclose(after, before)
+    assert np.allclose(after, RiskScoringEngine.from_registry(registry, 'v2').score_batch(df))
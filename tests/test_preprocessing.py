@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+from preprocessing import FinancialPreprocessor, UNKNOWN_CATEGORY_CODE
+
+def _fitted():
+    preprocessor = FinancialPreprocessor()
+    preprocessor.fit_transform(pd.DataFrame({'amount': [100.0, 200.0, 500.0, 20.0],
+                                             'merchant': ['M', 'B', 'M', 'K'],
+                                             'fraud_status': [0, 0, 1, 0]}))
+    return preprocessor
+
+def test_update_keeps_codes_and_leaves_the_sklearn_encoder_as_fitted():
+    preprocessor = _fitted()
+    rows = pd.DataFrame({'amount': [1.0] * 4, 'merchant': ['B', 'K', 'M', 'A']})
+    before = preprocessor.transform(rows)[:, 1]
+    assert before[3] == UNKNOWN_CATEGORY_CODE
+
+    assert preprocessor.update(pd.DataFrame({'amount': [50.0, 60.0], 'merchant': ['Z', 'A']})) == 2
+    after = preprocessor.transform(rows)[:, 1]
+    assert np.array_equal(after[:3], before[:3])
+    assert after[3] == 3  # 'A' follows the three fitted classes and sorts before 'Z'
+
+    encoder = preprocessor.label_encoders['merchant']
+    assert list(encoder.classes_) == ['B', 'K', 'M']
+    assert list(encoder.transform(['M', 'B'])) == [2, 0]
+    assert list(preprocessor.vocabulary('merchant')) == ['B', 'K', 'M', 'A', 'Z']
+
+def test_added_categories_survive_the_spec_round_trip():
+    preprocessor = _fitted()
+    preprocessor.update(pd.DataFrame({'amount': [50.0], 'merchant': ['Z']}))
+    restored = FinancialPreprocessor.from_spec(*preprocessor.to_spec())
+    rows = pd.DataFrame({'amount': [5.0, 7.0], 'merchant': ['Z', 'B']})
+    assert np.array_equal(restored.transform(rows), preprocessor.transform(rows))
@@ -0,0 +1,14 @@
+import copy
+from risk_rules import DEFAULT_RULES, RiskRules, check_sqlite_parity, load_bucketing_query, sample_scores
+
+def test_rules_match_ffinance_sql():
+    # Seeded scores around every threshold, exact boundary values and NULLs
+    assert check_sqlite_parity(sample_scores(50000, seed=7)) == 0
+
+def test_parity_catches_drifted_rules():
+    rules = copy.deepcopy(DEFAULT_RULES)
+    rules['segments'][0]['any'][0]['value'] = 20
+    assert check_sqlite_parity(sample_scores(5000, seed=7), rules=RiskRules(rules)) > 0
+
+def test_bucketing_query_is_found():
+    assert 'risk_segment' in load_bucketing_query()
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+from behavioral_features import BehavioralFeatureStore
+from data_loader import generate_synthetic_data
+from risk_score import HIGH_VALUE_POINTS, MODEL_POINTS, RiskScoringEngine
+
+def _engine(directory, calibrated=True, **kwargs):
+    return RiskScoringEngine(model_path=str(directory / 'xgboost_fraud_model.pkl'),
+                             preprocessor_path=str(directory / 'preprocessor.pkl'),
+                             calibration_path=str(directory / 'calibration.json') if calibrated else None, **kwargs)
+
+def test_explaining_scored_rows_leaves_the_store_unchanged(model_dir):
+    np.random.seed(5)
+    df = generate_synthetic_data(rows=2000)
+    df['nameOrig'] = df['nameOrig'].str[:3]  # a few accounts with many transactions each
+    store = BehavioralFeatureStore()
+    engine = _engine(model_dir, feature_store=store)
+    engine.ingest(df.head(1000))
+    before = store.lookup_batch(df)
+
+    scores = engine.score_batch(df)
+    explained = engine.explain_batch(df)
+    assert store.lookup_batch(df).equals(before)
+    # Contributions are float32, so their sum can differ from the scored margin in the last digits
+    assert np.allclose(explained['risk_score'].to_numpy(), scores, atol=1e-2)
+
+def test_model_errors_are_raised_not_replaced_by_rule_scores(broken_model_dir):
+    engine = _engine(broken_model_dir)
+    assert engine.model is not None
+    with pytest.raises(ValueError, match="Number of columns"):
+        engine.score_batch(generate_synthetic_data(rows=10))
+
+def test_high_value_points_apply_only_without_calibration(model_dir):
+    txn = {'amount': 500000.0, 'type': 'TRANSFER'}
+    calibrated = _engine(model_dir)
+    uncalibrated = _engine(model_dir, calibrated=False)
+    assert calibrated.calibration is not None and uncalibrated.calibration is None
+
+    X = calibrated._prepare_features(pd.DataFrame([txn]), calibrated._active())
+    prob = calibrated._predict_proba(X, calibrated._active())
+    assert calibrated.calculate_risk_score(txn) == pytest.approx(calibrated.calibration.transform(prob)[0] * 100)
+    assert uncalibrated.calculate_risk_score(txn) == pytest.approx(HIGH_VALUE_POINTS + prob[0] * MODEL_POINTS)
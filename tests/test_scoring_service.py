@@ -0,0 +1,51 @@
+import asyncio
+import json
+from risk_score import RiskScoringEngine
+from scoring_service import MicroBatcher, ScoringServer
+
+class _FailingEngine:
+    def score_batch(self, transactions):
+        raise ValueError("model cannot handle the input")
+
+async def _post_score(port, body):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f"POST /score HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    status = await reader.readline()
+    headers = {}
+    while (line := await reader.readline()) not in (b'\r\n', b''):
+        key, _, value = line.decode().partition(':')
+        headers[key.strip().lower()] = value.strip()
+    payload = json.loads(await reader.readexactly(int(headers['content-length'])))
+    writer.close()
+    return status.decode().split(' ', 2)[1], payload
+
+def _score_once(engine, body=b'{"amount": 5}'):
+    async def run():
+        server = ScoringServer(MicroBatcher(engine, max_latency_ms=1), port=0)
+        await server.start()
+        try:
+            return await _post_score(server.port, body)
+        finally:
+            await server.stop()
+    return asyncio.run(run())
+
+def test_scoring_error_returns_500():
+    status, payload = _score_once(_FailingEngine())
+    assert status == '500'
+    assert payload == {'error': "model cannot handle the input"}
+
+def test_broken_model_returns_500(broken_model_dir):
+    engine = RiskScoringEngine(model_path=str(broken_model_dir / 'xgboost_fraud_model.pkl'),
+                               preprocessor_path=str(broken_model_dir / 'preprocessor.pkl'), calibration_path=None)
+    status, payload = _score_once(engine, b'{"amount": 500000, "type": "TRANSFER"}')
+    assert status == '500'
+    assert "Number of columns" in payload['error']
+
+def test_working_model_returns_score(model_dir):
+    engine = RiskScoringEngine(model_path=str(model_dir / 'xgboost_fraud_model.pkl'),
+                               preprocessor_path=str(model_dir / 'preprocessor.pkl'),
+                               calibration_path=str(model_dir / 'calibration.json'))
+    status, payload = _score_once(engine, b'{"amount": 500000, "type": "TRANSFER"}')
+    assert status == '200'
+    assert 0 <= payload['score'] <= 100
@@ -0,0 +1,13 @@
+import os
+from model_registry import ModelRegistry
+from train_model import CALIBRATION_FILE, train_fraud_model, train_fraud_model_incremental
+
+def test_incremental_without_holdout_drops_the_parent_calibration(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    train_fraud_model(limit=5000, use_synthetic=True)
+    assert os.path.exists(CALIBRATION_FILE)
+
+    model, _ = train_fraud_model_incremental(limit=2000, use_synthetic=True, force=True, test_size=0)
+    assert model is not None
+    assert not os.path.exists(CALIBRATION_FILE)
+    assert ModelRegistry().get().manifest['metadata']['calibration'] is None